@@ -2,43 +2,73 @@
 import os
 import logging
 import json
+from contextlib import closing
 from pathlib import Path
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-# ... (phần code logging và load API key giữ nguyên) ...
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [AI_AGENT] [%(levelname)s] - %(message)s")
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY không được thiết lập trong tệp .env")
-genai.configure(api_key=API_KEY)
-# ...
+from concurrent.futures import ThreadPoolExecutor
+from context_engine import ProjectIndex, compact_history
+import code_patch
+from streaming_json import EnvelopeParser, StreamAbort
+from llm_client import get_client
+import metrics
+from log_setup import setup_logging
+
+setup_logging("AI_AGENT")
+# API key chỉ được đọc khi llm_client tạo backend Gemini lần đầu (backend "stub" không cần key)
 
 APP_FILE = Path("app/application.py")
 PLANNER_PROMPT_FILE = Path("app/prompts/planner_prompt.txt")
+CONTEXT_TOKEN_BUDGET = 6000 # Ngân sách token cho phần ngữ cảnh dự án trong mỗi prompt
+STREAMING_ENABLED = os.getenv("LLM_STREAMING", "1") == "1" # Stream phản hồi và phân tích tăng dần
+PLANNER_KEYS = {"plan"}
+EVOLUTION_KEYS = {"description", "edits", "patch", "new_code"}
+CODE_KEYS = ("edits", "patch", "new_code") # Theo thứ tự ưu tiên của code_patch.build_new_source
+
+# Kiểm tra biên dịch mã mới ngay khi trường chứa mã stream xong, song song với phần còn lại của phản hồi
+_validation_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prevalidate")
+
+# Chỉ mục ký hiệu của dự án, chỉ phân tích lại những tệp đã thay đổi
+project_index = ProjectIndex()
+_extra_indexes: dict[Path, ProjectIndex] = {} # Chỉ mục cho ứng dụng nằm ngoài dự án (chế độ fleet)
+
+
+def _index_for(app_file: Path) -> ProjectIndex:
+    """Chỉ mục chứa `app_file`: chỉ mục dự án, hoặc một chỉ mục riêng (không cache ra đĩa) cho thư mục của tệp."""
+    if Path(app_file).is_relative_to(project_index.root):
+        return project_index
+    root = Path(app_file).parent
+    if root not in _extra_indexes:
+        _extra_indexes[root] = ProjectIndex(root, cache_file=None)
+    return _extra_indexes[root]
+
+
+def _render_prompt(template: str, **fields: str) -> str:
+    """Thay các chỗ giữ chỗ {tên} đã biết; không đụng tới dấu ngoặc nhọn của các ví dụ JSON trong template."""
+    for name, value in fields.items():
+        template = template.replace("{" + name + "}", value)
+    return template
 
 # --- HÀM MỚI ĐỂ GỌI AI LẬP KẾ HOẠCH ---
 def invoke_planner_ai(user_goal: str, history: list[dict]) -> list[dict] | None:
     """Gọi AI Planner để phân rã mục tiêu lớn thành kế hoạch."""
     logging.info(f"Đang gọi AI Planner với mục tiêu: '{user_goal}'")
     
-    current_code = APP_FILE.read_text(encoding="utf-8")
-    history_str = json.dumps(history, indent=2, ensure_ascii=False)
+    # Chỉ đưa vào các hàm/lớp/test liên quan tới mục tiêu, trong giới hạn ngân sách token
+    project_context = project_index.build_context(user_goal, CONTEXT_TOKEN_BUDGET)
+    history_str = compact_history(history)
     
     # Đọc prompt từ file
     prompt_template = PLANNER_PROMPT_FILE.read_text(encoding="utf-8")
-    prompt = prompt_template.format(
+    prompt = _render_prompt(
+        prompt_template,
         history_context=history_str,
-        source_code_context=current_code,
+        project_context=project_context,
         user_goal=user_goal
     )
     
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        response_text = response.text.strip().replace("```json", "").replace("```", "").strip()
-        data = json.loads(response_text)
+        with metrics.span("agent_llm_call", purpose="plan") as span:
+            data, response_text = _generate_json(prompt, PLANNER_KEYS)
+            span.set(prompt_chars=len(prompt), response_chars=len(response_text))
         
         plan = data.get("plan")
         if not plan or not isinstance(plan, list):
@@ -51,111 +81,280 @@ def invoke_planner_ai(user_goal: str, history: list[dict]) -> list[dict] | None:
         logging.critical(f"Lỗi khi gọi AI Planner: {e}", exc_info=True)
         return None
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [AI_AGENT] [%(levelname)s] - %(message)s")
+# Giao thức sửa mã: ưu tiên sửa theo nút AST hoặc unified diff thay vì viết lại toàn bộ tệp
+EDIT_PROTOCOL_RULES = """Trả về một đối tượng JSON DUY NHẤT chứa các khóa:
+        - "description": Một câu mô tả ngắn gọn (bằng tiếng Việt) về thay đổi bạn đã thực hiện.
+        - "edits": Danh sách thao tác sửa NHỎ NHẤT có thể, mỗi phần tử là một trong các dạng:
+            {"type": "replace_symbol", "name": "ten_ham hoặc TenLop.ten_phuong_thuc", "code": "toàn bộ định nghĩa mới của ký hiệu đó"}
+            {"type": "insert_symbol", "code": "định nghĩa hàm/lớp mới", "before": "ten_ham (tùy chọn)"}
+            {"type": "delete_symbol", "name": "ten_ham"}
+            {"type": "diff", "diff": "unified diff (@@ -a,b +c,d @@) với các dòng ngữ cảnh chính xác"}
+        Chỉ khi thay đổi không thể diễn tả bằng "edits" mới dùng khóa "new_code" (toàn bộ mã nguồn mới của tệp) thay cho "edits"."""
 
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY không được thiết lập trong tệp .env")
 
-genai.configure(api_key=API_KEY)
+def _parse_ai_json(response_text: str) -> dict:
+    """Loại bỏ markdown bao quanh (nếu có) rồi phân tích JSON."""
+    response_text = response_text.strip()
+    if response_text.startswith("```"):
+        response_text = response_text.split("\n", 1)[1] if "\n" in response_text else ""
+        response_text = response_text.rsplit("```", 1)[0].strip()
+    return json.loads(response_text)
 
-APP_FILE = Path("app/application.py")
 
-def _call_gemini_for_evolution(prompt: str) -> tuple[str, str]:
+def _generate_json(prompt: str, allowed_keys: set[str], on_field=None, allow_raw: bool = False,
+                   temperature: float | None = None, use_cache: bool = True) -> tuple[dict | None, str]:
+    """
+    Gọi LLM qua client dùng chung và phân tích envelope JSON. Ở chế độ stream, các mảnh được phân tích
+    ngay khi tới và luồng bị hủy sớm khi cấu trúc chắc chắn sai. Trả về
+    (các trường JSON, văn bản thô); các trường là None nếu phản hồi không phải
+    JSON và `allow_raw` được bật.
+    """
+    client = get_client()
+    if not STREAMING_ENABLED:
+        response_text = client.generate(prompt, temperature, use_cache)
+        try:
+            data = _parse_ai_json(response_text)
+        except json.JSONDecodeError:
+            if allow_raw:
+                return None, response_text
+            raise
+        if not isinstance(data, dict):
+            raise ValueError("Phản hồi JSON không phải là một đối tượng.")
+        if on_field:
+            for key, value in data.items():
+                on_field(key, value)
+        return data, response_text
+
+    parser = EnvelopeParser(allowed_keys=allowed_keys, on_field=on_field)
+    raw_mode = False
+    raw_chunks = []
+    # closing(): trả lượt gọi đồng thời ngay cả khi hủy luồng giữa chừng
+    with closing(client.stream(prompt, temperature, use_cache)) as chunks:
+        for text in chunks:
+            if raw_mode:
+                raw_chunks.append(text)
+                continue
+            try:
+                parser.feed(text)
+            except StreamAbort as e:
+                if not (allow_raw and not parser.fields and not parser.text.lstrip().startswith(("{", "```json"))):
+                    logging.error(f"Hủy phản hồi đang stream: {e}")
+                    raise
+                raw_mode = True  # Phản hồi là mã nguồn thô, đọc nốt phần còn lại
+                raw_chunks.append(parser.text)
+    if raw_mode:
+        return None, "".join(raw_chunks)
+    return parser.close(), parser.text
+
+
+class _Prevalidator:
+    """Dựng và biên dịch thử mã mới từ từng trường chứa mã ngay khi trường đó stream xong."""
+
+    def __init__(self, app_file: Path = APP_FILE):
+        self.app_file = app_file
+        self.base = app_file.read_text(encoding="utf-8")
+        self.futures = {}
+
+    def on_field(self, key: str, value):
+        if key in CODE_KEYS and value:
+            self.futures[key] = _validation_pool.submit(self._build, key, value)
+
+    def _build(self, key: str, value) -> tuple[str, str]:
+        new_source, mode = code_patch.build_new_source(self.base, {key: value})
+        code_patch.validate_source(new_source, str(self.app_file))
+        return new_source, mode
+
+    def result(self, data: dict) -> tuple[str, str] | None:
+        """Kết quả đã kiểm tra cho trường được ưu tiên, nếu tệp chưa đổi kể từ lúc bắt đầu."""
+        key = next((k for k in CODE_KEYS if data.get(k)), None)
+        if key not in self.futures or self.app_file.read_text(encoding="utf-8") != self.base:
+            return None
+        return self.futures[key].result()
+
+
+def _call_gemini_for_evolution(prompt: str, allow_raw_code: bool = False, temperature: float | None = None,
+                               use_cache: bool = True, purpose: str = "evolution", app_file: Path = APP_FILE) -> dict:
     """
     Hàm gọi Gemini để tiến hóa mã nguồn.
-    Trả về một tuple: (new_code, description).
+    Trả về dict gồm "description" và một trong "edits" / "patch" / "new_code".
+    Với `allow_raw_code`, phản hồi không phải JSON được coi là toàn bộ mã nguồn mới.
     """
     logging.info("Đang gửi yêu cầu tiến hóa đến Gemini...")
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content(prompt)
+    prevalidator = _Prevalidator(app_file)
 
     # AI được yêu cầu trả về một đối tượng JSON
-    response_text = response.text.strip()
+    response_text = ""
     try:
-        # Loại bỏ markdown nếu có
-        if response_text.startswith("```json"):
-            response_text = response_text[7:-3].strip()
-        
-        data = json.loads(response_text)
-        new_code = data.get("new_code")
-        description = data.get("description")
-
-        if not new_code or not description:
-            raise ValueError("JSON trả về thiếu 'new_code' hoặc 'description'.")
-
-        return new_code, description
+        with metrics.span("agent_llm_call", purpose=purpose) as span:
+            data, response_text = _generate_json(prompt, EVOLUTION_KEYS, prevalidator.on_field, allow_raw_code,
+                                                 temperature, use_cache)
+            span.set(prompt_chars=len(prompt), response_chars=len(response_text))
+        if data is None:
+            raw_code = response_text.strip().replace("```python", "").replace("```", "").strip()
+            if not raw_code:
+                raise ValueError("AI trả về phản hồi rỗng.")
+            return {"new_code": raw_code, "description": "Sửa lỗi tự động (viết lại toàn bộ tệp)."}
+        if not data.get("description"):
+            raise ValueError("JSON trả về thiếu 'description'.")
+        if not (data.get("edits") or data.get("patch") or data.get("new_code")):
+            raise ValueError("JSON trả về thiếu 'edits' hoặc 'new_code'.")
+        data["_prevalidator"] = prevalidator
+        return data
     except (json.JSONDecodeError, ValueError) as e:
-        logging.error(f"AI không trả về JSON hợp lệ. Lỗi: {e}. Phản hồi thô: {response.text}")
+        get_client().invalidate(prompt, temperature) # Không giữ lại phản hồi hỏng trong cache
+        logging.error(f"AI không trả về JSON hợp lệ. Lỗi: {e}. Phản hồi thô: {response_text}")
         raise ValueError("AI không trả về JSON hợp lệ.") from e
 
 
-def modify_application_code(user_request: str, history: list[dict]):
-    """Sử dụng AI để sửa đổi tệp application.py dựa trên yêu cầu và lịch sử."""
-    logging.info(f"Đang xử lý yêu cầu: '{user_request}' với lịch sử thay đổi.")
-    
-    current_code = APP_FILE.read_text(encoding="utf-8")
-    history_str = json.dumps(history, indent=2, ensure_ascii=False)
+def _full_rewrite_prompt(task: str, current_code: str) -> str:
+    """Prompt dự phòng yêu cầu viết lại toàn bộ tệp khi bản vá không áp dụng được."""
+    return f"""
+    Bạn là một kỹ sư phần mềm AI cao cấp. Bản vá trước đó của bạn không áp dụng được lên mã nguồn.
+    Hãy thực hiện nhiệm vụ dưới đây bằng cách viết lại toàn bộ tệp.
+
+    **QUY TẮC TUYỆT ĐỐI:** Trả về một đối tượng JSON DUY NHẤT chứa hai khóa "new_code" (toàn bộ mã nguồn mới của tệp)
+    và "description" (một câu mô tả ngắn gọn bằng tiếng Việt). KHÔNG trả về bất cứ thứ gì khác.
+
+    **NHIỆM VỤ:**
+    {task}
+
+    **MÃ NGUỒN HIỆN TẠI:**
+    ```python
+    {current_code}
+    ```
+
+    **ĐỐI TƯỢNG JSON CỦA BẠN:**
+    """
+
+
+def _write_ai_change(data: dict, task: str, saw_full_file: bool, app_file: Path = APP_FILE) -> str:
+    """
+    Áp dụng thay đổi của AI vào `app_file` (kiểm tra biên dịch, ghi nguyên tử).
+    Chỉ khi bản vá không áp dụng được mới yêu cầu AI viết lại toàn bộ tệp.
+    Trả về mô tả thay đổi.
+    """
+    try:
+        if not saw_full_file and not (data.get("edits") or data.get("patch")):
+            # AI chỉ thấy một phần tệp nên không thể viết lại toàn bộ một cách an toàn
+            raise code_patch.PatchError("AI trả về toàn bộ tệp dù chỉ được xem một phần mã nguồn.")
+        prevalidator = data.get("_prevalidator")
+        prevalidated = prevalidator.result(data) if prevalidator else None
+        if prevalidated:
+            # Mã mới đã được dựng và biên dịch thử trong lúc phản hồi còn đang stream
+            new_source, mode = prevalidated
+            code_patch.atomic_write_text(app_file, new_source)
+        else:
+            mode = code_patch.apply_to_file(app_file, data)
+    except code_patch.PatchError as e:
+        logging.warning(f"Không áp dụng được thay đổi của AI ({e}). Yêu cầu viết lại toàn bộ tệp...")
+        current_code = app_file.read_text(encoding="utf-8")
+        data = _call_gemini_for_evolution(_full_rewrite_prompt(task, current_code), purpose="rewrite", app_file=app_file)
+        # Dùng nguyên phản hồi: AI có thể trả về "edits"/"patch" thay vì "new_code", vẫn áp dụng được
+        mode = code_patch.apply_to_file(app_file, data)
+    logging.info(f"Đã cập nhật thành công '{app_file}' (chế độ: {mode}).")
+    return data["description"]
+
+
+def _evolution_prompt(user_request: str, history: list[dict]) -> str:
+    history_str = compact_history(history)
+    # application.py được đưa vào nguyên văn nếu vừa ngân sách, nếu không chỉ gồm các ký hiệu liên quan
+    project_context = project_index.build_context(user_request, CONTEXT_TOKEN_BUDGET, full_files=[APP_FILE])
 
     prompt = f"""
-    Bạn là một kỹ sư phần mềm AI cao cấp. Nhiệm vụ của bạn là liên tục cải tiến mã nguồn Python dưới đây dựa trên yêu cầu mới và lịch sử các thay đổi trước đó.
+    Bạn là một kỹ sư phần mềm AI cao cấp. Nhiệm vụ của bạn là liên tục cải tiến tệp '{APP_FILE.as_posix()}' dựa trên yêu cầu mới và lịch sử các thay đổi trước đó.
 
     **QUY TẮC TUYỆT ĐỐI:**
     1.  Phân tích kỹ lưỡng yêu cầu, mã nguồn hiện tại, và lịch sử thay đổi để hiểu rõ bối cảnh.
-    2.  Trả về một đối tượng JSON DUY NHẤT chứa hai khóa:
-        - "new_code": Toàn bộ mã nguồn Python mới của tệp.
-        - "description": Một câu mô tả ngắn gọn (bằng tiếng Việt) về thay đổi bạn đã thực hiện.
+    2.  {EDIT_PROTOCOL_RULES}
     3.  KHÔNG trả về bất cứ thứ gì khác (không giải thích, không markdown bao quanh JSON).
 
-    **LỊCH SỬ CÁC THAY ĐỔI TRƯỚC ĐÂY:**
-    ```json
+    **LỊCH SỬ CÁC THAY ĐỔI TRƯỚC ĐÂY (mỗi dòng một mục JSON):**
     {history_str}
-    ```
 
     **YÊU CẦU MỚI TỪ NGƯỜI DÙNG:**
     "{user_request}"
 
-    **MÃ NGUỒN HIỆN TẠI ĐỂ SỬA ĐỔI:**
-    ```python
-    {current_code}
-    ```
+    **MÃ NGUỒN DỰ ÁN LIÊN QUAN (chỉ sửa '{APP_FILE.as_posix()}'):**
+    {project_context}
 
     **ĐỐI TƯỢNG JSON CỦA BẠN:**
     """
-    
-    new_code, description = _call_gemini_for_evolution(prompt)
-    APP_FILE.write_text(new_code, encoding="utf-8")
-    logging.info(f"Đã cập nhật thành công '{APP_FILE}'.")
-    return description
+    return prompt
 
 
-def fix_application_code(error_message: str):
-    """Sử dụng AI để sửa lỗi trong tệp application.py. (Giữ nguyên, không đổi)"""
-    logging.info("Bắt đầu quá trình sửa lỗi tự động...")
-    try:
-        failed_code = APP_FILE.read_text(encoding="utf-8")
-        prompt = f"""
-        Bạn là một chuyên gia gỡ lỗi Python. Mã nguồn dưới đây đã bị lỗi. Phân tích mã và thông báo lỗi, sau đó viết lại toàn bộ tệp với phiên bản đã sửa.
-        QUY TẮC: Chỉ trả về mã nguồn Python hoàn chỉnh. KHÔNG giải thích, KHÔNG markdown.
+def modify_application_code(user_request: str, history: list[dict]):
+    """Sử dụng AI để sửa đổi tệp application.py dựa trên yêu cầu và lịch sử."""
+    logging.info(f"Đang xử lý yêu cầu: '{user_request}' với lịch sử thay đổi.")
+    data = _call_gemini_for_evolution(_evolution_prompt(user_request, history))
+    saw_full_file = project_index.fits_in_full(APP_FILE, CONTEXT_TOKEN_BUDGET)
+    return _write_ai_change(data, f'Yêu cầu từ người dùng: "{user_request}"', saw_full_file)
+
+
+def generate_change(user_request: str, history: list[dict]) -> dict:
+    """
+    Sinh thay đổi cho một yêu cầu mà KHÔNG ghi vào đĩa (dùng khi nhiều bước được
+    sinh song song rồi gộp lại). Trả về {"description", "edits"/"patch"/"new_code", "base"}.
+    """
+    logging.info(f"Đang sinh thay đổi cho: '{user_request}'")
+    data = _call_gemini_for_evolution(_evolution_prompt(user_request, history))
+    prevalidator = data.pop("_prevalidator", None)
+    if not project_index.fits_in_full(APP_FILE, CONTEXT_TOKEN_BUDGET) and not (data.get("edits") or data.get("patch")):
+        raise code_patch.PatchError("AI trả về toàn bộ tệp dù chỉ được xem một phần mã nguồn.")
+    data["base"] = prevalidator.base if prevalidator else APP_FILE.read_text(encoding="utf-8")
+    return data
+
+
+def _fix_prompt(error_message: str, variant: int = 0, app_file: Path = APP_FILE) -> str:
+    """Prompt sửa lỗi; `variant` > 0 yêu cầu AI thử một hướng sửa khác (dùng khi sinh nhiều ứng viên)."""
+    project_context = _index_for(app_file).build_context(error_message, CONTEXT_TOKEN_BUDGET, full_files=[app_file])
+    variant_hint = f"\n        Đây là phương án số {variant + 1}: hãy cân nhắc một nguyên nhân gốc hoặc cách sửa khác với cách hiển nhiên nhất." if variant else ""
+    return f"""
+        Bạn là một chuyên gia gỡ lỗi Python. Tệp '{app_file.as_posix()}' đã bị lỗi. Phân tích mã và thông báo lỗi, sau đó sửa lỗi.{variant_hint}
+        QUY TẮC: {EDIT_PROTOCOL_RULES}
+        KHÔNG giải thích, KHÔNG markdown.
         
         THÔNG BÁO LỖI:
         {error_message}
         
-        MÃ NGUỒN LỖI:
-        {failed_code}
+        MÃ NGUỒN DỰ ÁN LIÊN QUAN (chỉ sửa '{app_file.as_posix()}'):
+        {project_context}
         
-        MÃ NGUỒN ĐÃ SỬA:
+        ĐỐI TƯỢNG JSON CỦA BẠN:
         """
-        # Sử dụng hàm gọi Gemini đơn giản hơn cho việc sửa lỗi
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        fixed_code = response.text.strip().replace("```python", "").replace("```", "").strip()
-        
-        if not fixed_code:
-            raise ValueError("AI trả về phản hồi rỗng khi sửa lỗi.")
 
-        APP_FILE.write_text(fixed_code, encoding="utf-8")
-        logging.info(f"AI đã thử sửa lỗi và cập nhật lại '{APP_FILE}'.")
+
+def generate_fix_candidate(error_message: str, variant: int = 0, temperature: float | None = None,
+                           app_file: Path = APP_FILE) -> dict:
+    """
+    Sinh một ứng viên sửa lỗi mà KHÔNG ghi vào đĩa.
+    Trả về {"source", "description", "mode", "base"}; ném ValueError nếu ứng viên
+    không dựng được hoặc không biên dịch được.
+    """
+    saw_full_file = project_index.fits_in_full(app_file, CONTEXT_TOKEN_BUDGET)
+    # Không dùng cache: lần sửa lỗi lặp lại cho cùng lỗi cần một câu trả lời mới
+    data = _call_gemini_for_evolution(_fix_prompt(error_message, variant, app_file), allow_raw_code=saw_full_file,
+                                      temperature=temperature, use_cache=False, purpose="fix", app_file=app_file)
+    if not saw_full_file and not (data.get("edits") or data.get("patch")):
+        raise code_patch.PatchError("AI trả về toàn bộ tệp dù chỉ được xem một phần mã nguồn.")
+    prevalidator = data.get("_prevalidator")
+    base = prevalidator.base if prevalidator else app_file.read_text(encoding="utf-8")
+    prevalidated = prevalidator.result(data) if prevalidator else None
+    if prevalidated:
+        source, mode = prevalidated
+    else:
+        source, mode = code_patch.build_new_source(base, data)
+        code_patch.validate_source(source, str(app_file))
+    return {"source": source, "description": data["description"], "mode": mode, "base": base}
+
+
+def fix_application_code(error_message: str, app_file: Path = APP_FILE):
+    """Sử dụng AI để sửa lỗi trong `app_file` (mặc định application.py) bằng một bản vá nhỏ nhất có thể."""
+    logging.info(f"Bắt đầu quá trình sửa lỗi tự động cho '{app_file}'...")
+    try:
+        saw_full_file = project_index.fits_in_full(app_file, CONTEXT_TOKEN_BUDGET)
+        data = _call_gemini_for_evolution(_fix_prompt(error_message, app_file=app_file), allow_raw_code=saw_full_file,
+                                          use_cache=False, purpose="fix", app_file=app_file)
+        _write_ai_change(data, f"Sửa lỗi sau:\n{error_message}", saw_full_file, app_file)
+        logging.info(f"AI đã thử sửa lỗi và cập nhật lại '{app_file}'.")
     except Exception as e:
-        logging.critical(f"Lỗi trong quá trình tự sửa lỗi của AI: {e}", exc_info=True)
\ No newline at end of file
+        logging.critical(f"Lỗi trong quá trình tự sửa lỗi của AI: {e}", exc_info=True)
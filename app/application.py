@@ -3,13 +3,26 @@ import time
 import os
 import signal
 import unittest
+import unittest.mock
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, send_file
 import json
 import sys
+import hashlib
+import atexit
+import threading
+import itertools
+from werkzeug.http import http_date
+from werkzeug.serving import make_server
+from ingest_log import IngestLog
+from work_queue import WorkQueue
+import json_stream
+from health_channel import notify_ready
+import metrics
+from log_setup import setup_logging, payload_preview
 
-# Thiết lập logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Thiết lập logging: bản ghi được định dạng và ghi trên luồng nền, không chặn request
+setup_logging("APP")
 
 # Lưu trữ hàm get_world_time và các test case vào file riêng
 # Tạo file old_get_world_time.py
@@ -52,21 +65,208 @@ class TestGetData(unittest.TestCase):
             response = client.get('/')
             self.assertEqual(response.status_code, 200)
             self.assertIn(b"<h1>Hello, world!</h1>", response.data)
+
+    def test_get_data_not_modified(self):
+        with open('data.json', 'w') as f:
+            json.dump({'message': 'Cached'}, f)
+        with app.test_client() as client:
+            first = client.get('/data')
+            self.assertEqual(first.status_code, 200)
+            self.assertIsNotNone(first.headers.get('Last-Modified'))
+            second = client.get('/data', headers={'If-None-Match': first.headers['ETag']})
+            self.assertEqual(second.status_code, 304)
+        os.remove('data.json')
+
+    def test_get_data_paginated(self):
+        with open('data.json', 'w') as f:
+            json.dump([{'i': i} for i in range(5)], f)
+        with app.test_client() as client:
+            page = json.loads(client.get('/data?offset=1&limit=2').data)
+            self.assertEqual(page['items'], [{'i': 1}, {'i': 2}])
+            self.assertEqual(page['next_offset'], 3)
+            last = json.loads(client.get('/data?offset=3&limit=10').data)
+            self.assertEqual(last['items'], [{'i': 3}, {'i': 4}])
+            self.assertIsNone(last['next_offset'])
+            first = client.get('/data?offset=1&limit=2')
+            cached = client.get('/data?offset=1&limit=2', headers={'If-None-Match': first.headers['ETag']})
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(client.get('/data?limit=0').status_code, 400)
+        os.remove('data.json')
+
+    def test_get_data_pagination_requires_array(self):
+        with open('data.json', 'w') as f:
+            json.dump({'message': 'Not a list'}, f)
+        with app.test_client() as client:
+            self.assertEqual(client.get('/data?offset=0').status_code, 400)
+        os.remove('data.json')
+
+    def test_get_large_data_streamed_from_file(self):
+        with open('data.json', 'w') as f:
+            json.dump([{'i': i} for i in range(100)], f)
+        with unittest.mock.patch(f'{__name__}.DATA_STREAM_THRESHOLD', 10):
+            with app.test_client() as client:
+                response = client.get('/data')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(json.loads(response.data)), 100)
+                again = client.get('/data', headers={'If-None-Match': response.headers['ETag']})
+                self.assertEqual(again.status_code, 304)
+                again.close()
+                response.close()
+        os.remove('data.json')
+
+    def test_get_large_invalid_data_served_verbatim(self):
+        # Trên ngưỡng stream, tệp không được phân tích nên nội dung hỏng không còn trả về 500
+        with open('data.json', 'w') as f:
+            f.write('invalid json' * 10)
+        with unittest.mock.patch(f'{__name__}.DATA_STREAM_THRESHOLD', 10):
+            with app.test_client() as client:
+                response = client.get('/data')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data, b'invalid json' * 10)
+                response.close()
+        os.remove('data.json')
+
+    def test_process_data_iterates_records_in_batches(self):
+        with open('data.json', 'w') as f:
+            json.dump([{'i': i} for i in range(PROCESS_BATCH_SIZE + 1)], f)
+        with unittest.mock.patch(f'{__name__}.process_batch') as process:
+            process_data()
+        self.assertEqual([len(call.args[0]) for call in process.call_args_list], [PROCESS_BATCH_SIZE, 1])
+        os.remove('data.json')
+
+    def test_post_invalidates_data_cache(self):
+        with app.test_client() as client:
+            client.post('/', json={'version': 1})
+            self.assertEqual(json.loads(client.get('/data').data), {'version': 1})
+            client.post('/', json={'version': 2})
+            self.assertEqual(json.loads(client.get('/data').data), {'version': 2})
+        os.remove('data.json')
+
+
+class TestMetrics(unittest.TestCase):
+    def test_metrics_endpoint_reports_route_latency(self):
+        with app.test_client() as client:
+            client.get('/')
+            response = client.get('/metrics')
+            if not metrics.registry.enabled:
+                self.assertEqual(response.status_code, 404)
+                return
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'http_request_seconds_count{component=', response.data)
+            self.assertIn(b'route="/"', response.data)
+
+
+class TestReceiveData(unittest.TestCase):
+    def test_post_rejected_when_queue_full(self):
+        with unittest.mock.patch.object(work_queue, 'has_capacity', return_value=False), \
+                unittest.mock.patch.object(ingest_log, 'append') as append:
+            with app.test_client() as client:
+                response = client.post('/', json={'version': 3})
+                self.assertEqual(response.status_code, 429)
+                append.assert_not_called()
+
+    def test_post_enqueued_only_after_append(self):
+        calls = []
+        with unittest.mock.patch.object(ingest_log, 'append', side_effect=lambda data: calls.append('append')), \
+                unittest.mock.patch.object(work_queue, 'submit', side_effect=lambda data: calls.append('submit') or True):
+            with app.test_client() as client:
+                response = client.post('/', json={'version': 4})
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, ['append', 'submit'])
 app = Flask(__name__)
 
+# Đo độ trễ của mọi route theo (phương thức, route, mã trạng thái)
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("http_request_seconds", time.perf_counter() - started,
+                        method=request.method, route=route, status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Metrics của tiến trình này và của supervisor/orchestrator đang chạy, theo định dạng Prometheus."""
+    if not metrics.registry.enabled:
+        return jsonify({'error': 'Metrics đang tắt (METRICS_ENABLED=0)'}), 404
+    return app.response_class(metrics.registry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# Bộ nhớ đệm cho GET /data: giữ sẵn bytes đã tuần tự hóa, hợp lệ chừng nào
+# (st_mtime_ns, st_size) của data.json chưa đổi
+DATA_FILE = 'data.json'
+DATA_STREAM_THRESHOLD = int(os.environ.get("DATA_STREAM_THRESHOLD", 8 * 1024 * 1024)) # Lớn hơn: gửi thẳng tệp, không nạp vào bộ nhớ
+DATA_PAGE_DEFAULT_LIMIT = 100
+DATA_PAGE_MAX_LIMIT = 1000
+DATA_STREAM_CHUNK_BYTES = 64 * 1024 # Gom các phần tử thành khối cỡ này trước khi gửi (chunked)
+PROCESS_BATCH_SIZE = int(os.environ.get("PROCESS_BATCH_SIZE", 16)) # Số bản ghi mỗi lô khi process_data duyệt data.json
+_data_cache = {"key": None, "body": None, "etag": None, "last_modified": None}
+_data_cache_lock = threading.Lock()
+
+def invalidate_data_cache():
+    """Xóa bộ nhớ đệm của /data (gọi sau mỗi lần ghi data.json)."""
+    with _data_cache_lock:
+        _data_cache["key"] = None
+
+# Nhật ký ghi-trước cho POST /: các bản ghi được gom nhóm trước khi fsync,
+# data.json chỉ còn là view của bản ghi mới nhất và được thay thế nguyên tử
+INGEST_DIR = os.environ.get("INGEST_DIR", "data_log")
+ingest_log = IngestLog(
+    INGEST_DIR,
+    DATA_FILE,
+    commit_interval=float(os.environ.get("INGEST_COMMIT_INTERVAL", 0.005)),
+    sync_commit=os.environ.get("INGEST_SYNC_COMMIT", "1") == "1",
+    on_commit=lambda _records: invalidate_data_cache(),
+)
+atexit.register(ingest_log.close)
+
+def _load_data_response() -> dict:
+    """Trả về mục cache của /data, chỉ đọc và phân tích lại data.json khi tệp đã đổi."""
+    st = os.stat(DATA_FILE)
+    key = (st.st_mtime_ns, st.st_size)
+    with _data_cache_lock:
+        if _data_cache["key"] == key:
+            return dict(_data_cache)
+    with open(DATA_FILE, 'r') as f:
+        data = json.load(f)
+    body = (app.json.dumps(data, separators=(",", ":")) + "\n").encode('utf-8')
+    entry = {
+        "key": key,
+        "body": body,
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "last_modified": http_date(st.st_mtime),
+    }
+    # Chỉ lưu vào cache nếu tệp không bị ghi đè trong lúc đang đọc
+    st_after = os.stat(DATA_FILE)
+    if (st_after.st_mtime_ns, st_after.st_size) == key:
+        with _data_cache_lock:
+            _data_cache.update(entry)
+    return entry
+
 @app.route('/', methods=['GET'])
 def index():
-    logging.info("Nhận request GET /")
+    logging.info("Nhận request GET /", extra={"route": "GET /"})
     return "<h1>Hello, world!</h1>"
 
 @app.route('/', methods=['POST'])
 def receive_data():
     try:
         data = request.get_json()
-        logging.info(f"Nhận dữ liệu từ client: {data}")
-        # Lưu dữ liệu vào file tạm thời
-        with open('data.json', 'w') as f:
-            json.dump(data, f)
+        # Chỉ ghi bản tóm tắt có giới hạn của payload, không định dạng toàn bộ dữ liệu trên luồng request
+        logging.info("Nhận dữ liệu từ client: %s", payload_preview(data), extra={"route": "POST /"})
+        # Backpressure: từ chối trước khi ghi nếu hàng đợi xử lý đã đầy
+        if not work_queue.has_capacity():
+            logging.warning("Hàng đợi xử lý đã đầy, từ chối yêu cầu.")
+            return jsonify({'error': 'Hệ thống đang quá tải, vui lòng thử lại sau'}), 429
+        # Ghi vào nhật ký trước; chỉ xếp hàng xử lý khi bản ghi đã được commit
+        ingest_log.append(data)
+        if not work_queue.submit(data):
+            # Hàng đợi vừa đầy giữa lúc kiểm tra và lúc ghi: dữ liệu đã bền vững, chỉ bỏ qua bước xử lý
+            logging.warning("Hàng đợi xử lý đầy sau khi ghi; bản ghi được lưu nhưng không được xếp hàng xử lý.")
         return jsonify({'message': 'Dữ liệu đã được nhận thành công'}), 200
     except json.JSONDecodeError:
         logging.error(f"Lỗi: Dữ liệu không hợp lệ (JSONDecodeError)")
@@ -107,13 +307,33 @@ def manage_file():
         logging.exception(f"Lỗi khi quản lý tệp: {e}")
         return jsonify({'error': 'Lỗi khi xử lý yêu cầu'}), 500
 
+def process_batch(batch: list):
+    """
+    Xử lý một lô payload. Hiện chưa có bước xử lý nào phía sau (orchestrator không
+    có entry point cho payload), nên chỉ ghi nhận lô; các bản ghi đã nằm trong ingest log.
+    """
+    logging.debug(f"Đã xử lý lô {len(batch)} payload.")
+
+# Hàng đợi được nạp trực tiếp bởi receive_data và tiêu thụ bởi nhóm worker
+work_queue = WorkQueue(
+    process_batch,
+    max_size=int(os.environ.get("WORK_QUEUE_SIZE", 1000)),
+    workers=int(os.environ.get("WORK_QUEUE_WORKERS", 2)),
+    batch_size=int(os.environ.get("WORK_QUEUE_BATCH_SIZE", 16)),
+    use_processes=os.environ.get("WORK_QUEUE_PROCESSES", "0") == "1",
+)
+WORK_DRAIN_TIMEOUT = 4 # Supervisor buộc dừng sau 5 giây kể từ SIGTERM
+
 def process_data():
+    """
+    Xử lý lại ngay dữ liệu hiện có trong data.json (ngoài luồng hàng đợi). Mảng
+    cấp cao nhất được đọc tăng dần và xử lý theo từng lô bản ghi, nên bộ nhớ
+    không tăng theo kích thước tệp.
+    """
     try:
-        with open('data.json', 'r') as f:
-            data = json.load(f)
-            # Gọi orchestrator
-            import orchestrator  # giả định orchestrator ở cùng thư mục
-            orchestrator.process(data)
+        records = json_stream.iter_records(DATA_FILE)
+        while batch := list(itertools.islice(records, PROCESS_BATCH_SIZE)):
+            process_batch(batch)
     except FileNotFoundError:
         logging.warning(f"Lỗi: File data.json không tồn tại.")
     except json.JSONDecodeError as e:
@@ -121,18 +341,89 @@ def process_data():
     except Exception as e:
         logging.exception(f"Lỗi khi xử lý data.json: {e}")
 
+def _file_etag(st: os.stat_result) -> str:
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def _file_data_response():
+    """
+    data.json lớn: gửi nguyên văn tệp theo từng khối (wsgi.file_wrapper, dùng sendfile
+    nếu máy chủ hỗ trợ) thay vì phân tích và giữ toàn bộ trong bộ nhớ. Hỗ trợ Range.
+    Nội dung không được kiểm tra: tệp hỏng vẫn trả về 200 (chỉ tệp nhỏ mới trả 500 "Invalid JSON data").
+    """
+    f = open(DATA_FILE, 'rb') # Giữ đúng phiên bản đang mở dù tệp bị thay thế trong lúc gửi
+    st = os.fstat(f.fileno())
+    return send_file(f, mimetype='application/json', conditional=True, etag=_file_etag(st),
+                     last_modified=st.st_mtime, max_age=0)
+
+def _paginated_data_response():
+    """
+    Trang `offset`/`limit` của mảng cấp cao nhất trong data.json, phân tích tăng dần
+    và gửi theo kiểu chunked: {"offset", "limit", "items": [...], "next_offset"}.
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', DATA_PAGE_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'offset và limit phải là số nguyên'}), 400
+    if offset < 0 or limit < 1:
+        return jsonify({'error': 'offset phải >= 0 và limit phải >= 1'}), 400
+    limit = min(limit, DATA_PAGE_MAX_LIMIT)
+    etag = f"{_file_etag(os.stat(DATA_FILE))}-{offset}-{limit}"
+    # Không dùng make_conditional: nó đọc hết luồng để tính Content-Length
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    records = json_stream.iter_array(DATA_FILE)
+    try:
+        # Đọc trước phần tử đầu tiên của trang để lỗi định dạng được báo bằng mã trạng thái, không phải giữa luồng
+        page = itertools.islice(records, offset, offset + limit + 1)
+        first = next(page, None)
+    except json_stream.NotAnArray:
+        return jsonify({'error': 'data.json không phải là mảng JSON; không hỗ trợ phân trang'}), 400
+
+    def generate():
+        dumps = lambda value: app.json.dumps(value, separators=(",", ":"))
+        chunk = [f'{{"offset":{offset},"limit":{limit},"items":[']
+        size, count, more = 0, 0, False
+        for item in ([] if first is None else itertools.chain([first], page)):
+            if count == limit:
+                more = True # Phần tử thứ limit + 1 chỉ dùng để biết còn trang sau
+                break
+            part = ("," if count else "") + dumps(item)
+            chunk.append(part)
+            size += len(part)
+            count += 1
+            if size >= DATA_STREAM_CHUNK_BYTES:
+                yield "".join(chunk)
+                chunk, size = [], 0
+        records.close()
+        chunk.append(f'],"next_offset":{offset + count if more else "null"}}}\n')
+        yield "".join(chunk)
+
+    response = app.response_class(generate(), status=200, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    return response
+
 @app.route('/data', methods=['GET'])
 def get_data():
     try:
-        logging.info("Nhận request GET /data")
-        if os.path.exists('data.json'):
-            with open('data.json', 'r') as f:
-                data = json.load(f)
-                logging.info("Trả về dữ liệu thành công")
-                return jsonify(data), 200
-        else:
+        logging.info("Nhận request GET /data", extra={"route": "GET /data"})
+        try:
+            if 'offset' in request.args or 'limit' in request.args:
+                return _paginated_data_response()
+            if os.path.getsize(DATA_FILE) > DATA_STREAM_THRESHOLD:
+                return _file_data_response()
+            entry = _load_data_response()
+        except FileNotFoundError:
             logging.warning("File data.json không tồn tại")
             return jsonify({'error': 'File data.json not found'}), 404
+        response = app.response_class(entry["body"], status=200, mimetype='application/json')
+        response.set_etag(entry["etag"])
+        response.headers['Last-Modified'] = entry["last_modified"]
+        logging.info("Trả về dữ liệu thành công", extra={"route": "GET /data"})
+        # Trả về 304 nếu client gửi If-None-Match / If-Modified-Since còn hợp lệ
+        return response.make_conditional(request)
     except json.JSONDecodeError as e:
         logging.error(f"Invalid JSON data: {str(e)}", exc_info=True)
         return jsonify({'error': f'Invalid JSON data: {str(e)}'}), 500
@@ -154,23 +445,33 @@ def run_app():
     # Ví dụ: xóa dấu ngoặc ở cuối dòng print bên dưới.
     # print(f"Một dòng code không lỗi"
     
-    count = 0
     def handle_signal(signum, frame):
         print(f"[{time.ctime()}] --- Ứng dụng nhận được tín hiệu {signal.Signals(signum).name} ---")
+        # Xử lý nốt các payload đang chờ và commit nhật ký trước khi thoát
+        if not work_queue.drain(timeout=WORK_DRAIN_TIMEOUT):
+            print(f"[{time.ctime()}] --- Còn {work_queue.qsize()} payload chưa xử lý khi thoát ---")
+        ingest_log.close()
+        sys.exit(0)
     
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
 
-    while True:
-        print(f"[{time.ctime()}] AI đang làm việc... Lần thứ {count+1} 🤖")
-        process_data()
-        count += 1
-        time.sleep(18)
+    work_queue.start()
+    listen_fd = os.environ.get("APP_LISTEN_FD")
+    # Các worker prefork chạy song song: mỗi worker một tệp ảnh chụp metrics riêng
+    metrics.configure(f"application-{os.getpid()}" if listen_fd else "application")
+    port = int(os.environ.get("APP_PORT", 3000))
+    # Chế độ prefork: nhận kết nối trên socket dùng chung do supervisor mở sẵn
+    server = make_server("127.0.0.1", port, app, threaded=True, fd=int(listen_fd) if listen_fd else None)
+    # Cổng đã mở: báo cho supervisor thay vì để nó đoán bằng thời gian chờ cố định
+    notify_ready()
+    server.serve_forever()
 
 if __name__ == "__main__":
     try:
-        unittest.main(argv=['first-arg-is-ignored'], exit=False) # Chạy test trước
-        app.run(debug=False, port=3000)
+        if os.environ.get("APP_SKIP_STARTUP_TESTS") != "1":
+            unittest.main(argv=['first-arg-is-ignored'], exit=False) # Chạy test trước
+        run_app()
     except Exception as e:
         # Ghi lỗi vào stderr để main.py có thể bắt được
         print(f"Ứng dụng gặp lỗi và bị sập: {e}", file=sys.stderr)
@@ -0,0 +1,223 @@
+# app/code_patch.py
+import os
+import re
+import ast
+from pathlib import Path
+
+# Số dòng tối đa một hunk được phép lệch so với vị trí ghi trong tiêu đề @@
+MAX_HUNK_OFFSET = 200
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Các trường bắt buộc (đều là chuỗi) của từng loại thao tác sửa
+_EDIT_FIELDS = {
+    "replace_symbol": ("name", "code"),
+    "insert_symbol": ("code",),
+    "delete_symbol": ("name",),
+    "diff": ("diff",),
+}
+
+
+class PatchError(ValueError):
+    """Không thể áp dụng bản vá hoặc kết quả không hợp lệ."""
+
+
+# --- Ghi tệp ---
+def atomic_write_text(path: Path, text: str):
+    """Ghi ra tệp tạm trong cùng thư mục rồi os.replace, để không bao giờ có tệp ghi dở."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def validate_source(source: str, filename: str = "<patched>"):
+    """Biên dịch thử mã nguồn; ném PatchError nếu có lỗi cú pháp."""
+    try:
+        compile(source, filename, "exec")
+    except SyntaxError as e:
+        raise PatchError(f"Mã nguồn sau khi vá không biên dịch được: {e}") from e
+
+
+# --- Unified diff ---
+def _parse_hunks(diff: str) -> list[tuple[int, list[str]]]:
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        if line.startswith(("---", "+++")) and current is None:
+            continue
+        match = _HUNK_RE.match(line)
+        if match:
+            current = []
+            hunks.append((int(match.group(1)), current))
+        elif current is not None and line[:1] in (" ", "+", "-"):
+            current.append(line)
+        elif current is not None and line == "":
+            current.append(" ")  # Dòng trống trong ngữ cảnh thường bị mất khoảng trắng đầu
+        elif line.startswith("\\"):
+            continue  # "\ No newline at end of file"
+    if not hunks:
+        raise PatchError("Bản vá không chứa hunk nào.")
+    return hunks
+
+
+def _find_block(lines: list[str], block: list[str], expected: int) -> int:
+    """Tìm vị trí khớp chính xác của `block`, ưu tiên gần `expected` nhất."""
+    if not block:
+        return min(max(expected, 0), len(lines))
+    for offset in range(MAX_HUNK_OFFSET + 1):
+        for pos in (expected - offset, expected + offset) if offset else (expected,):
+            if 0 <= pos <= len(lines) - len(block) and lines[pos:pos + len(block)] == block:
+                return pos
+    # Thử lại bỏ qua khác biệt khoảng trắng cuối dòng
+    stripped = [l.rstrip() for l in block]
+    for pos in range(0, len(lines) - len(block) + 1):
+        if [l.rstrip() for l in lines[pos:pos + len(block)]] == stripped:
+            return pos
+    raise PatchError(f"Không tìm thấy ngữ cảnh của hunk gần dòng {expected + 1}.")
+
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """Áp dụng một unified diff (một tệp) lên `original`."""
+    lines = original.splitlines()
+    shift = 0
+    for start, body in _parse_hunks(diff):
+        old_block = [l[1:] for l in body if l[0] in (" ", "-")]
+        new_block = [l[1:] for l in body if l[0] in (" ", "+")]
+        pos = _find_block(lines, old_block, max(start - 1, 0) + shift)
+        lines[pos:pos + len(old_block)] = new_block
+        shift += len(new_block) - len(old_block)
+    return "\n".join(lines) + ("\n" if original.endswith("\n") or not original else "")
+
+
+# --- Thay thế theo nút AST ---
+def _locate_symbol(source: str, name: str) -> tuple[int, int] | None:
+    """Trả về (dòng bắt đầu, dòng kết thúc) 1-based của hàm/lớp `name` ("Lớp.phương_thức" cho phương thức)."""
+    body = ast.parse(source).body
+    node = None
+    for part in name.split("."):
+        node = next((n for n in body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+                     and n.name == part), None)
+        if node is None:
+            return None
+        body = getattr(node, "body", [])
+    start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+    return start, node.end_lineno
+
+
+def _reindent(code: str, indent: str) -> list[str]:
+    lines = code.strip("\n").splitlines()
+    first = lines[0] if lines else ""
+    current = first[:len(first) - len(first.lstrip())]
+    return [indent + l[len(current):] if l.startswith(current) and l.strip() else (indent + l.lstrip() if l.strip() else "")
+            for l in lines]
+
+
+def replace_symbol(source: str, name: str, code: str) -> str:
+    """Thay toàn bộ định nghĩa của `name` bằng `code`, giữ nguyên mức thụt lề."""
+    span = _locate_symbol(source, name)
+    if span is None:
+        raise PatchError(f"Không tìm thấy ký hiệu '{name}' để thay thế.")
+    lines = source.splitlines()
+    start, end = span
+    indent = lines[start - 1][:len(lines[start - 1]) - len(lines[start - 1].lstrip())]
+    lines[start - 1:end] = _reindent(code, indent)
+    return "\n".join(lines) + "\n"
+
+
+def insert_symbol(source: str, code: str, before: str | None = None) -> str:
+    """Chèn một định nghĩa mới trước ký hiệu `before`, hoặc trước khối `if __name__ == "__main__"`/cuối tệp."""
+    lines = source.splitlines()
+    if before:
+        span = _locate_symbol(source, before)
+        if span is None:
+            raise PatchError(f"Không tìm thấy ký hiệu '{before}' để chèn trước.")
+        at = span[0] - 1
+    else:
+        main_guard = next((n for n in ast.parse(source).body if isinstance(n, ast.If)
+                           and "__name__" in ast.unparse(n.test)), None)
+        at = main_guard.lineno - 1 if main_guard else len(lines)
+    lines[at:at] = code.strip("\n").splitlines() + ["", ""]
+    return "\n".join(lines) + "\n"
+
+
+def delete_symbol(source: str, name: str) -> str:
+    span = _locate_symbol(source, name)
+    if span is None:
+        raise PatchError(f"Không tìm thấy ký hiệu '{name}' để xóa.")
+    lines = source.splitlines()
+    del lines[span[0] - 1:span[1]]
+    return "\n".join(lines) + "\n"
+
+
+def apply_edits(source: str, edits: list[dict]) -> str:
+    """
+    Áp dụng lần lượt danh sách thao tác sửa:
+      {"type": "replace_symbol", "name": "ten_ham", "code": "..."}
+      {"type": "insert_symbol", "code": "...", "before": "ten_ham" (tùy chọn)}
+      {"type": "delete_symbol", "name": "ten_ham"}
+      {"type": "diff", "diff": "<unified diff>"}
+    """
+    if not isinstance(edits, list):
+        raise PatchError(f"'edits' phải là một danh sách, nhận được {type(edits).__name__}.")
+    for edit in edits:
+        _check_edit(edit)
+        kind = edit["type"]
+        try:
+            if kind == "replace_symbol":
+                source = replace_symbol(source, edit["name"], edit["code"])
+            elif kind == "insert_symbol":
+                source = insert_symbol(source, edit["code"], edit.get("before"))
+            elif kind == "delete_symbol":
+                source = delete_symbol(source, edit["name"])
+            else:
+                source = apply_unified_diff(source, edit["diff"])
+        except SyntaxError as e:
+            raise PatchError(f"Không phân tích được mã nguồn trước thao tác '{kind}': {e}") from e
+    return source
+
+
+def _check_edit(edit):
+    """Ném PatchError nếu thao tác sửa không đúng dạng (thay vì AttributeError/TypeError khi áp dụng)."""
+    if not isinstance(edit, dict):
+        raise PatchError(f"Thao tác sửa phải là một đối tượng, nhận được {type(edit).__name__}.")
+    kind = edit.get("type")
+    if kind not in _EDIT_FIELDS:
+        raise PatchError(f"Loại thao tác sửa không hợp lệ: {kind!r}")
+    for field in _EDIT_FIELDS[kind]:
+        if field not in edit:
+            raise PatchError(f"Thao tác '{kind}' thiếu trường '{field}'.")
+        if not isinstance(edit[field], str):
+            raise PatchError(f"Trường '{field}' của thao tác '{kind}' phải là chuỗi.")
+    if edit.get("before") is not None and not isinstance(edit["before"], str):
+        raise PatchError(f"Trường 'before' của thao tác '{kind}' phải là chuỗi.")
+
+
+def build_new_source(current: str, data: dict) -> tuple[str, str]:
+    """
+    Tính nội dung mới từ phản hồi của AI. Ưu tiên "edits", rồi "patch" (unified
+    diff), cuối cùng mới tới "new_code" (viết lại toàn bộ). Trả về (mã mới, chế độ).
+    """
+    if data.get("edits"):
+        return apply_edits(current, data["edits"]), "edits"
+    if data.get("patch"):
+        if not isinstance(data["patch"], str):
+            raise PatchError("'patch' phải là một chuỗi unified diff.")
+        return apply_unified_diff(current, data["patch"]), "patch"
+    if data.get("new_code"):
+        if not isinstance(data["new_code"], str):
+            raise PatchError("'new_code' phải là một chuỗi.")
+        return data["new_code"], "full"
+    raise PatchError("Phản hồi không chứa 'edits', 'patch' hay 'new_code'.")
+
+
+def apply_to_file(path: Path, data: dict) -> str:
+    """Tính mã mới, kiểm tra biên dịch rồi mới ghi nguyên tử vào `path`. Trả về chế độ đã dùng."""
+    path = Path(path)
+    new_source, mode = build_new_source(path.read_text(encoding="utf-8"), data)
+    validate_source(new_source, str(path))
+    atomic_write_text(path, new_source)
+    return mode
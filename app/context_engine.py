@@ -0,0 +1,240 @@
+# app/context_engine.py
+import re
+import ast
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+# --- Cấu hình ---
+PROJECT_ROOT = Path("app")
+INDEX_CACHE_FILE = Path("app/logs/context_index.json")
+SOURCE_PATTERNS = ("*.py",)
+DEFAULT_TOKEN_BUDGET = 6000
+CHARS_PER_TOKEN = 4  # Ước lượng thô, đủ để giữ prompt trong ngân sách
+INDEX_VERSION = 1
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_FRAME_RE = re.compile(r'File "([^"]+)", line (\d+), in (\S+)')
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _words(text: str) -> set[str]:
+    """Tách định danh và cả các phần của snake_case để so khớp lỏng."""
+    words = set()
+    for w in _WORD_RE.findall(text):
+        lw = w.lower()
+        words.add(lw)
+        words.update(p for p in lw.split("_") if len(p) > 2)
+    return words
+
+
+def _index_source(source: str) -> dict:
+    """Phân tích một tệp bằng ast: các ký hiệu cấp cao nhất, định danh chúng dùng và các import."""
+    tree = ast.parse(source)
+    symbols = []
+    imports = set()
+    header_end = 0
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            imports.update(n.split(".")[0] for n in names if n)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+            refs = sorted({n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+                          | {n.attr for n in ast.walk(node) if isinstance(n, ast.Attribute)})
+            is_test = isinstance(node, ast.ClassDef) and any(ast.unparse(b).endswith("TestCase") for b in node.bases)
+            symbols.append({
+                "name": node.name,
+                "kind": "test" if is_test else ("class" if isinstance(node, ast.ClassDef) else "function"),
+                "start": start,
+                "end": node.end_lineno,
+                "signature": f"def {node.name}({ast.unparse(node.args)})" if not isinstance(node, ast.ClassDef)
+                             else f"class {node.name}" + (f"({', '.join(ast.unparse(b) for b in node.bases)})" if node.bases else ""),
+                "refs": refs,
+            })
+        elif not symbols:
+            header_end = node.end_lineno  # Phần đầu tệp: import, hằng số trước định nghĩa đầu tiên
+    return {"symbols": symbols, "imports": sorted(imports), "header_end": header_end}
+
+
+class ProjectIndex:
+    """
+    Chỉ mục ký hiệu và phụ thuộc của dự án, được cache theo hash từng tệp:
+    chỉ những tệp có nội dung thay đổi mới bị phân tích lại. Tệp có
+    (st_mtime_ns, st_size) không đổi thì không cần đọc và hash lại.
+    """
+
+    def __init__(self, root: Path = PROJECT_ROOT, cache_file: Path | None = INDEX_CACHE_FILE):
+        self.root = Path(root)
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.files: dict[str, dict] = {}
+        self._sources: dict[str, str] = {}
+        self._lock = threading.Lock()  # Nhiều luồng (ví dụ các ứng viên sửa lỗi) có thể dựng ngữ cảnh cùng lúc
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION:
+                self.files = data["files"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.files = {}
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_name(f".{self.cache_file.name}.tmp")
+        tmp.write_text(json.dumps({"version": INDEX_VERSION, "files": self.files}), encoding="utf-8")
+        tmp.replace(self.cache_file)
+
+    def refresh(self) -> int:
+        """Cập nhật chỉ mục; trả về số tệp phải phân tích lại."""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        seen = set()
+        rebuilt = 0
+        touched = False
+        for pattern in SOURCE_PATTERNS:
+            for path in sorted(self.root.rglob(pattern)):
+                if any(part.startswith(".") or part in ("versions", "logs", "__pycache__") for part in path.parts):
+                    continue
+                key = path.as_posix()
+                seen.add(key)
+                st = path.stat()
+                stat_key = [st.st_mtime_ns, st.st_size]  # Dạng list để so sánh được sau khi nạp lại từ JSON
+                cached = self.files.get(key)
+                if cached and cached.get("stat") == stat_key:
+                    continue
+                source = path.read_text(encoding="utf-8")
+                self._sources[key] = source
+                file_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+                if cached and cached["hash"] == file_hash:
+                    cached["stat"] = stat_key  # Chỉ đổi mtime (ví dụ touch): giữ kết quả phân tích
+                    touched = True
+                    continue
+                try:
+                    entry = _index_source(source)
+                except SyntaxError as e:
+                    logging.warning(f"Không phân tích được '{key}' ({e}); chỉ dùng nội dung thô.")
+                    entry = {"symbols": [], "imports": [], "header_end": 0, "syntax_error": str(e)}
+                self.files[key] = {"hash": file_hash, "stat": stat_key, **entry}
+                rebuilt += 1
+        for stale in set(self.files) - seen:
+            del self.files[stale]
+        if rebuilt or touched or seen != set(self.files):
+            self._save_cache()
+        return rebuilt
+
+    def source(self, key: str) -> str:
+        # Tệp không đổi kể từ lần cache trước thì chưa được đọc trong tiến trình này
+        if key not in self._sources:
+            self._sources[key] = Path(key).read_text(encoding="utf-8")
+        return self._sources[key]
+
+    # --- Chọn ngữ cảnh ---
+    def _score(self, query: str) -> dict[tuple[str, str], float]:
+        """Chấm điểm từng ký hiệu theo độ liên quan với yêu cầu/traceback."""
+        query_words = _words(query)
+        frames = [(Path(f).name, int(line), func) for f, line, func in _FRAME_RE.findall(query)]
+        scores = {}
+        for key, info in self.files.items():
+            fname = Path(key).name
+            for sym in info["symbols"]:
+                score = 0.0
+                if sym["name"].lower() in query_words:
+                    score += 10
+                score += len(_words(" ".join([sym["name"]] + sym["refs"])) & query_words) * 0.5
+                for frame_file, line, func in frames:
+                    if frame_file == fname and (sym["start"] <= line <= sym["end"] or func == sym["name"]):
+                        score += 20
+                if score:
+                    scores[(key, sym["name"])] = score
+        # Lan truyền: ký hiệu được ký hiệu liên quan gọi tới, và test tham chiếu tới chúng
+        # Cộng dồn theo tên: cùng một tên có thể được định nghĩa ở nhiều tệp, refs chỉ chứa tên
+        names = {}
+        for (_, name), score in scores.items():
+            names[name] = names.get(name, 0) + score
+        for key, info in self.files.items():
+            for sym in info["symbols"]:
+                linked = sum(names.get(r, 0) for r in sym["refs"] if r != sym["name"])
+                if linked:
+                    bonus = linked * (0.5 if sym["kind"] == "test" else 0.25)
+                    scores[(key, sym["name"])] = scores.get((key, sym["name"]), 0) + bonus
+        return scores
+
+    def _symbol_source(self, key: str, sym: dict) -> str:
+        lines = self.source(key).splitlines()
+        return "\n".join(lines[sym["start"] - 1:sym["end"]])
+
+    def fits_in_full(self, path: Path, budget_tokens: int = DEFAULT_TOKEN_BUDGET) -> bool:
+        """Tệp `path` có được build_context đưa vào nguyên văn với ngân sách này hay không."""
+        text = f"File: {Path(path).as_posix()}\n---\n{Path(path).read_text(encoding='utf-8')}\n"
+        return len(text) <= budget_tokens * CHARS_PER_TOKEN
+
+    def build_context(self, query: str, budget_tokens: int = DEFAULT_TOKEN_BUDGET,
+                      full_files: list[Path] | None = None, exclude_files: list[Path] | None = None) -> str:
+        """
+        Dựng `project_context` theo định dạng "File: ...\\n---\\n..." trong giới hạn
+        `budget_tokens`. Các tệp trong `full_files` được đưa vào nguyên văn nếu vừa
+        ngân sách; phần còn lại chỉ gồm đầu tệp, các ký hiệu liên quan nhất và
+        một bản tóm tắt chữ ký của những ký hiệu khác.
+        """
+        self.refresh()
+        budget = budget_tokens * CHARS_PER_TOKEN
+        parts: list[str] = []
+        full_keys = {Path(p).as_posix() for p in full_files or []}
+        excluded = {Path(p).as_posix() for p in exclude_files or []}
+
+        for key in sorted(full_keys & set(self.files)):
+            text = f"File: {key}\n---\n{self.source(key)}\n"
+            if len(text) <= budget:
+                parts.append(text)
+                budget -= len(text)
+            else:
+                full_keys.discard(key)
+
+        scores = self._score(query)
+        ranked = sorted(scores.items(), key=lambda kv: -kv[1])
+        chosen: dict[str, list[dict]] = {}
+        for (key, name), _ in ranked:
+            if key in full_keys or key in excluded:
+                continue
+            sym = next(s for s in self.files[key]["symbols"] if s["name"] == name)
+            snippet = self._symbol_source(key, sym)
+            cost = len(snippet) + (0 if key in chosen else len(self._header(key)) + 32)
+            if cost > budget:
+                continue
+            chosen.setdefault(key, []).append(sym)
+            budget -= cost
+
+        for key, syms in chosen.items():
+            body = [self._header(key)] + [self._symbol_source(key, s) for s in sorted(syms, key=lambda s: s["start"])]
+            included = {s["name"] for s in syms}
+            outline = [f"# {s['signature']}  (dòng {s['start']}-{s['end']}, đã lược bỏ)"
+                       for s in self.files[key]["symbols"] if s["name"] not in included]
+            outline_text = "\n".join(outline)
+            if outline and len(outline_text) <= budget:
+                body.append(outline_text)
+                budget -= len(outline_text)
+            parts.append(f"File: {key}\n---\n" + "\n\n".join(b for b in body if b) + "\n")
+
+        return "\n".join(parts)
+
+    def _header(self, key: str) -> str:
+        end = self.files[key].get("header_end", 0)
+        return "\n".join(self.source(key).splitlines()[:end])
+
+
+def compact_history(history: list[dict]) -> str:
+    """Tuần tự hóa lịch sử ở dạng gọn (không thụt lề) để tiết kiệm token."""
+    return "\n".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) for entry in history)
@@ -0,0 +1,213 @@
+# app/error_knowledge.py
+import re
+import ast
+import json
+import time
+import zlib
+import difflib
+import hashlib
+import logging
+from pathlib import Path
+
+import code_patch
+
+# --- Cấu hình ---
+KNOWLEDGE_FILE = Path("app/logs/error_knowledge.json")
+MAX_ENTRIES = 500  # Số dấu vân tay lỗi tối đa được ghi nhớ
+MAX_FIXES_PER_ENTRY = 3
+
+_FRAME_RE = re.compile(r'File "([^"]+)", line (\d+), in (\S+)')
+_EXCEPTION_RE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))(?::\s*(.*))?$")
+# Các phần thay đổi giữa các lần chạy nhưng không đổi bản chất lỗi
+_VOLATILE_RE = [
+    (re.compile(r"0x[0-9a-fA-F]+"), "0x?"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "'?'"),
+    (re.compile(r"\b\d+(\.\d+)?\b"), "N"),
+]
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _enclosing_code(source: str, lineno: int) -> str:
+    """Mã nguồn của ký hiệu cấp cao nhất chứa dòng `lineno` (hoặc chính dòng đó nếu ở cấp module)."""
+    lines = source.splitlines()
+    try:
+        for node in ast.parse(source).body:
+            start = min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+            if start <= lineno <= node.end_lineno and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                return "\n".join(lines[start - 1:node.end_lineno])
+    except SyntaxError:
+        pass
+    return lines[lineno - 1].strip() if 0 < lineno <= len(lines) else ""
+
+
+def _top_level_symbols(source: str) -> dict[str, tuple[int, int]]:
+    spans = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            spans[node.name] = (min([d.lineno for d in node.decorator_list] + [node.lineno]), node.end_lineno)
+    return spans
+
+
+def symbol_edits(before: str, after: str) -> list[dict] | None:
+    """
+    Diễn đạt thay đổi dưới dạng các thao tác replace_symbol nếu nó chỉ nằm gọn trong
+    các hàm/lớp cấp cao nhất; khi đó bản sửa áp dụng lại được cả khi phần khác của tệp đã đổi.
+    """
+    try:
+        old_spans, new_spans = _top_level_symbols(before), _top_level_symbols(after)
+    except SyntaxError:
+        return None
+    if old_spans.keys() != new_spans.keys():
+        return None
+    old_lines, new_lines = before.splitlines(), after.splitlines()
+    edits, old_rest, new_rest = [], old_lines[:], new_lines[:]
+    # Thay từ cuối lên để chỉ số dòng của các ký hiệu phía trên không bị lệch
+    for name in sorted(old_spans, key=lambda n: -old_spans[n][0]):
+        (old_start, old_end), (new_start, new_end) = old_spans[name], new_spans[name]
+        old_code, new_code = old_lines[old_start - 1:old_end], new_lines[new_start - 1:new_end]
+        if old_code != new_code:
+            edits.append({"type": "replace_symbol", "name": name, "code": "\n".join(new_code)})
+        old_rest[old_start - 1:old_end] = [f"<{name}>"]
+    for name in sorted(new_spans, key=lambda n: -new_spans[n][0]):
+        new_start, new_end = new_spans[name]
+        new_rest[new_start - 1:new_end] = [f"<{name}>"]
+    return edits if edits and old_rest == new_rest else None
+
+
+def fingerprint(error_output: str, source: str, app_name: str) -> dict | None:
+    """
+    Chuẩn hóa một traceback thành dấu vân tay: loại ngoại lệ, thông điệp đã bỏ
+    các giá trị thay đổi, khung lệnh trong tệp ứng dụng và hash của đoạn mã tại đó.
+    Trả về None nếu không nhận ra được ngoại lệ nào.
+    """
+    exc_type, message = None, ""
+    for line in reversed(error_output.strip().splitlines()):
+        match = _EXCEPTION_RE.match(line.strip())
+        if match:
+            exc_type, message = match.group(1), match.group(2) or ""
+            break
+    if exc_type is None:
+        return None
+    for pattern, repl in _VOLATILE_RE:
+        message = pattern.sub(repl, message)
+
+    frames = _FRAME_RE.findall(error_output)
+    app_frames = [f for f in frames if Path(f[0]).name == app_name]
+    location, code_hash = "", ""
+    if app_frames:
+        _, line, func = app_frames[-1]
+        location = f"{app_name}:{func}"
+        code_hash = _sha256(_enclosing_code(source, int(line)))[:16]
+    elif frames:
+        location = f"{Path(frames[-1][0]).name}:{frames[-1][2]}"
+    key = _sha256("|".join([exc_type, message, location, code_hash]))[:24]
+    return {"key": key, "exception": exc_type, "message": message, "location": location, "code_hash": code_hash}
+
+
+class ErrorKnowledge:
+    """
+    Kho tri thức lỗi: ghi nhớ bản vá nào đã sửa được dấu vân tay lỗi nào (và
+    phiên bản nó tạo ra), để lần sau gặp lại có thể áp dụng ngay mà không gọi AI.
+    Một bản sửa chỉ được ghi nhớ sau khi phiên bản mới được xác nhận chạy ổn định.
+    """
+
+    def __init__(self, store_file: Path = KNOWLEDGE_FILE, version_store=None):
+        self.store_file = Path(store_file)
+        self.version_store = version_store
+        self.entries: dict[str, dict] = self._load()
+        self._pending: dict | None = None  # Bản sửa gần nhất, chờ xác nhận
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.store_file.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        entries = sorted(self.entries.items(), key=lambda kv: kv[1]["last_seen"])[-MAX_ENTRIES:]
+        self.entries = dict(entries)
+        self.store_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.store_file.with_name(f".{self.store_file.name}.tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.store_file)
+
+    def _candidate_source(self, fix: dict, current: str) -> str:
+        """Dựng lại mã đã sửa: lấy thẳng phiên bản đã lưu nếu mã hiện tại trùng khớp, nếu không thì áp dụng diff."""
+        if self.version_store is not None and fix["before"] == _sha256(current):
+            try:
+                return self.version_store.get(fix["after"]).decode("utf-8")
+            except (OSError, zlib.error):
+                pass
+        if fix.get("edits"):
+            return code_patch.apply_edits(current, fix["edits"])
+        return code_patch.apply_unified_diff(current, fix["diff"])
+
+    def replay(self, error_output: str, app_file: Path) -> bool:
+        """Áp dụng một bản sửa đã biết cho lỗi này nếu có. Trả về True nếu đã ghi tệp."""
+        self._discard_failed_pending()
+        app_file = Path(app_file)
+        current = app_file.read_text(encoding="utf-8")
+        fp = fingerprint(error_output, current, app_file.name)
+        entry = self.entries.get(fp["key"]) if fp else None
+        if not entry:
+            return False
+        for fix in sorted(entry["fixes"], key=lambda f: -f["hits"]):
+            try:
+                new_source = self._candidate_source(fix, current)
+                code_patch.validate_source(new_source, str(app_file))
+            except code_patch.PatchError as e:
+                logging.warning(f"Không áp dụng lại được bản sửa đã biết cho {fp['exception']} ({e}).")
+                continue
+            code_patch.atomic_write_text(app_file, new_source)
+            self._pending = {"fingerprint": fp, "before": _sha256(current), "after": _sha256(new_source),
+                             "diff": fix["diff"], "edits": fix.get("edits"), "description": fix.get("description", ""),
+                             "replayed": True}
+            logging.info(f"Đã áp dụng lại bản sửa đã biết cho {fp['exception']} tại {fp['location']} "
+                         f"(đã dùng {fix['hits']} lần), không cần gọi AI.")
+            return True
+        return False
+
+    def observe(self, error_output: str, before: str, after: str, app_name: str, description: str = ""):
+        """Ghi nhận một bản sửa (do AI tạo) đang chờ xác nhận."""
+        if before == after:
+            return
+        fp = fingerprint(error_output, before, app_name)
+        if fp is None:
+            return
+        diff = "\n".join(difflib.unified_diff(before.splitlines(), after.splitlines(), lineterm=""))
+        self._pending = {"fingerprint": fp, "before": _sha256(before), "after": _sha256(after), "diff": diff,
+                         "edits": symbol_edits(before, after), "description": description, "replayed": False}
+
+    def confirm(self, version_hash: str):
+        """Phiên bản `version_hash` đã chạy ổn định: nếu nó là kết quả của bản sửa đang chờ thì ghi nhớ bản sửa."""
+        pending, self._pending = self._pending, None
+        if not pending or pending["after"] != version_hash:
+            return
+        fp = pending["fingerprint"]
+        entry = self.entries.setdefault(fp["key"], {**{k: fp[k] for k in ("exception", "message", "location", "code_hash")},
+                                                    "fixes": [], "last_seen": 0})
+        entry["last_seen"] = time.time()
+        fix = next((f for f in entry["fixes"] if f["after"] == pending["after"] or f["diff"] == pending["diff"]), None)
+        if fix:
+            fix["hits"] += 1
+        else:
+            entry["fixes"].append({k: pending[k] for k in ("before", "after", "diff", "edits", "description")} | {"hits": 1})
+            entry["fixes"] = sorted(entry["fixes"], key=lambda f: -f["hits"])[:MAX_FIXES_PER_ENTRY]
+        self._save()
+        logging.info(f"Đã ghi nhớ bản sửa cho {fp['exception']} tại {fp['location']} (phiên bản {version_hash[:12]}).")
+
+    def _discard_failed_pending(self):
+        """Lỗi mới xuất hiện trước khi bản sửa đang chờ được xác nhận: bản sửa đó không hiệu quả."""
+        pending, self._pending = self._pending, None
+        if not pending or not pending["replayed"]:
+            return
+        entry = self.entries.get(pending["fingerprint"]["key"])
+        if entry:
+            entry["fixes"] = [f for f in entry["fixes"] if f["diff"] != pending["diff"]]
+            if not entry["fixes"]:
+                del self.entries[pending["fingerprint"]["key"]]
+            self._save()
+            logging.warning("Bản sửa đã biết không khắc phục được lỗi; đã loại khỏi kho tri thức.")
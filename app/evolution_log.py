@@ -0,0 +1,111 @@
+# app/evolution_log.py
+import os
+import sys
+import json
+import logging
+from pathlib import Path
+
+# --- Cấu hình ---
+EVOLUTION_LOG_FILE = Path("app/logs/evolution_log.jsonl")
+LEGACY_LOG_FILE = Path("app/logs/evolution_log.json")  # Định dạng cũ: một mảng JSON được ghi lại toàn bộ mỗi lần
+TAIL_BLOCK_SIZE = 8192
+
+
+class EvolutionLog:
+    """
+    Nhật ký tiến hóa chỉ-ghi-thêm (JSON mỗi dòng): ghi một mục là O(1), đọc N mục
+    cuối bằng cách đọc ngược từng khối từ cuối tệp thay vì tải toàn bộ lịch sử.
+    """
+
+    def __init__(self, path: Path = EVOLUTION_LOG_FILE, legacy_path: Path | None = LEGACY_LOG_FILE):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+
+    def _ensure_migrated(self):
+        if self.legacy_path and self.legacy_path.exists() and not self.path.exists():
+            migrate(self.legacy_path, self.path)
+
+    def append(self, entry: dict):
+        self._ensure_migrated()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        # Một lần write trên tệp O_APPEND: các tiến trình ghi đồng thời không làm xen kẽ dòng
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def tail(self, n: int) -> list[dict]:
+        """N mục cuối cùng theo thứ tự thời gian, đọc từ cuối tệp."""
+        self._ensure_migrated()
+        if n <= 0:
+            return []
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            # Cần n+1 ký tự xuống dòng để chắc chắn có đủ n dòng hoàn chỉnh
+            while pos > 0 and data.count(b"\n") <= n:
+                step = min(TAIL_BLOCK_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        entries = []
+        for line in data.splitlines()[-n:] if pos == 0 else data.splitlines()[1:][-n:]:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning("Bỏ qua một dòng hỏng trong nhật ký tiến hóa.")
+        return entries
+
+    def __iter__(self):
+        self._ensure_migrated()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+
+def migrate(legacy_path: Path = LEGACY_LOG_FILE, path: Path = EVOLUTION_LOG_FILE) -> int:
+    """Chuyển nhật ký JSON cũ sang JSON mỗi dòng; giữ lại tệp cũ với hậu tố .migrated. Trả về số mục."""
+    legacy_path, path = Path(legacy_path), Path(path)
+    try:
+        entries = json.loads(legacy_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return 0
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Không đọc được nhật ký cũ '{legacy_path}': {e}") from e
+    if not isinstance(entries, list):
+        raise ValueError(f"Nhật ký cũ '{legacy_path}' không phải là một mảng JSON.")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    if path.exists():
+        # Giữ các mục mới đã được ghi thêm sau lần chuyển đổi trước
+        with open(tmp, 'ab') as out, open(path, 'rb') as current:
+            out.write(current.read())
+    os.replace(tmp, path)
+    legacy_path.replace(legacy_path.with_name(legacy_path.name + ".migrated"))
+    logging.info(f"Đã chuyển {len(entries)} mục từ '{legacy_path}' sang '{path}'.")
+    return len(entries)
+
+
+if __name__ == "__main__":
+    # Công cụ chuyển đổi: python app/evolution_log.py [tệp_json_cũ] [tệp_jsonl_mới]
+    from log_setup import setup_logging
+    setup_logging("EVOLUTION_LOG")
+    args = sys.argv[1:]
+    count = migrate(Path(args[0]) if args else LEGACY_LOG_FILE, Path(args[1]) if len(args) > 1 else EVOLUTION_LOG_FILE)
+    print(f"Đã chuyển {count} mục.")
@@ -0,0 +1,73 @@
+# app/fixer.py
+import time
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import code_patch
+import test_gate
+from ai_agent import APP_FILE, generate_fix_candidate
+
+# --- Cấu hình ---
+DEFAULT_CANDIDATES = 3
+CANDIDATE_TEMPERATURES = (0.2, 0.6, 0.9, 1.0)  # Đa dạng hóa các ứng viên
+FIX_TIMEOUT = 300  # Thời gian tối đa cho toàn bộ vòng sửa lỗi song song (giây)
+
+
+def _generate_and_validate(error_message: str, variant: int, app_file: Path = APP_FILE,
+                           done: threading.Event | None = None) -> dict | None:
+    """
+    Sinh một ứng viên rồi chạy bộ test trên nó trong các thư mục tạm riêng.
+    Trả về None (bỏ qua phần việc còn lại) nếu `done` đã được đặt, tức là đã có ứng viên khác thắng.
+    """
+    if done and done.is_set():
+        return None
+    started = time.monotonic()
+    temperature = CANDIDATE_TEMPERATURES[variant % len(CANDIDATE_TEMPERATURES)]
+    candidate = generate_fix_candidate(error_message, variant=variant, temperature=temperature, app_file=app_file)
+    generated = time.monotonic()
+    if done and done.is_set():
+        logging.info(f"Ứng viên #{variant + 1}: đã có bản sửa khác được áp dụng, bỏ qua bước chạy test.")
+        return None
+    result = test_gate.run_tests(app_file, source=candidate["source"].encode("utf-8"))
+    logging.info(f"Ứng viên #{variant + 1}: sinh {generated - started:.1f}s, test {result['duration']:.1f}s, "
+                 f"{'ĐẠT' if result['passed'] else 'KHÔNG ĐẠT'}.")
+    return {**candidate, "variant": variant, "tests": result}
+
+
+def speculative_fix(error_message: str, candidates: int = DEFAULT_CANDIDATES, timeout: float = FIX_TIMEOUT,
+                    app_file: Path = APP_FILE) -> bool:
+    """
+    Yêu cầu đồng thời `candidates` bản sửa lỗi, kiểm tra biên dịch và chạy test
+    từng bản song song, rồi ghi (nguyên tử) bản đầu tiên vượt qua test.
+    Trả về True nếu đã áp dụng một bản sửa.
+    """
+    logging.info(f"Bắt đầu sửa lỗi song song với {candidates} ứng viên...")
+    base = Path(app_file).read_text(encoding="utf-8")
+    done = threading.Event() # Đặt khi vòng sửa lỗi kết thúc để các ứng viên thua dừng sớm
+    pool = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="fix-candidate")
+    futures = [pool.submit(_generate_and_validate, error_message, i, app_file, done) for i in range(candidates)]
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            try:
+                candidate = future.result()
+            except Exception as e:
+                logging.warning(f"Một ứng viên sửa lỗi thất bại: {e}")
+                continue
+            if candidate is None or not candidate["tests"]["passed"]:
+                continue
+            if Path(app_file).read_text(encoding="utf-8") != base or candidate["base"] != base:
+                logging.warning("Tệp đã thay đổi trong lúc sửa lỗi; bỏ qua ứng viên.")
+                return False
+            code_patch.atomic_write_text(app_file, candidate["source"])
+            logging.info(f"Đã áp dụng ứng viên #{candidate['variant'] + 1}: {candidate['description']}")
+            return True
+    except TimeoutError:
+        logging.error(f"Hết thời gian {timeout}s khi chờ các ứng viên sửa lỗi.")
+    finally:
+        # Không chờ các ứng viên còn lại; chúng thấy `done` và thoát trước bước chạy test
+        done.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    logging.error("Không có ứng viên sửa lỗi nào vượt qua test.")
+    return False
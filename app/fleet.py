@@ -0,0 +1,493 @@
+# app/fleet.py
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import signal
+import asyncio
+import logging
+from pathlib import Path
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Cấu hình ---
+FLEET_CONFIG = Path(os.getenv("FLEET_CONFIG", "app/fleet.json"))
+LOGS_DIR = Path("app/logs")
+LOG_FILE = LOGS_DIR / "fleet.log"
+FLEET_DIR = LOGS_DIR / "fleet"  # Mỗi ứng dụng một thư mục: sự kiện, trạng thái, đầu ra, tri thức lỗi
+VERSIONS_DIR = Path("app/versions/fleet")  # Mỗi ứng dụng một kho phiên bản riêng
+STATUS_FILE = LOGS_DIR / "fleet_status.json"
+PYTHON_EXECUTABLE = "python"
+DEFAULT_MAX_FIX_ATTEMPTS = 3
+MAX_CONCURRENT_FIXES = int(os.getenv("FLEET_MAX_CONCURRENT_FIXES", 2))  # Số lần gọi AI sửa lỗi chạy đồng thời
+MAX_CONCURRENT_GATES = os.cpu_count() or 2  # Số cổng test chạy đồng thời khi nhiều ứng dụng khởi động cùng lúc
+MAX_STORED_VERSIONS = 20
+OUTPUT_BUFFER_BYTES = 64 * 1024
+MAX_ERROR_BYTES = 16 * 1024
+READY_TIMEOUT = 30
+STOP_TIMEOUT = 5
+STABLE_AFTER = 10  # Chạy lâu hơn khoảng này (giây) sau khi sẵn sàng mới được coi là phiên bản ổn định
+CLEAN_EXIT_DELAY = 1.0  # Ứng dụng tự thoát với mã 0 được khởi động lại sau khoảng này, tránh vòng lặp bận
+STATUS_INTERVAL = 1.0  # Tệp trạng thái được ghi tối đa một lần mỗi khoảng này, dù có bao nhiêu ứng dụng
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+# --- Thiết lập Logging ---
+from log_setup import setup_logging
+setup_logging("FLEET", LOG_FILE)
+
+# Một lần import cho cả đội ứng dụng: orchestrator/AI agent được dùng chung
+from orchestrator import trigger_self_correction
+from watcher import FileWatcher, DEBOUNCE_SECONDS, hash_file
+from output_capture import AsyncOutputCapture
+from version_store import VersionStore
+from error_knowledge import ErrorKnowledge
+from health_channel import EventChannel, open_ready_pipe, wait_ready_async, READY_FD_ENV
+import test_gate
+import metrics
+
+# Các trạng thái của một ứng dụng
+STARTING = "starting"
+RUNNING = "running"
+FIXING = "fixing"
+QUEUED_FIX = "queued_fix"  # Đang chờ lượt trong hàng đợi sửa lỗi bằng AI
+RESTORING = "restoring"
+GAVE_UP = "gave_up"  # Không thể phục hồi: chờ tệp được sửa từ bên ngoài
+ERROR = "error"
+
+
+class AppSpec(NamedTuple):
+    name: str
+    file: Path
+    command: list[str]
+    port: int | None
+    max_fix_attempts: int
+    env: dict
+    cwd: Path | None
+
+
+def load_config(path: Path = FLEET_CONFIG) -> tuple[list[AppSpec], dict]:
+    """
+    Đọc tệp cấu hình fleet. Mỗi ứng dụng gồm "name", "file" và tùy chọn "command"
+    (chuỗi hoặc danh sách; "{file}" và "{port}" được thay thế), "port",
+    "max_fix_attempts", "env", "cwd". Ném ValueError nếu cấu hình không hợp lệ.
+    """
+    try:
+        config = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Không đọc được cấu hình fleet '{path}': {e}") from e
+    specs, names, files = [], set(), set()
+    for i, entry in enumerate(config.get("apps", [])):
+        name = str(entry.get("name", ""))
+        if not _NAME_RE.match(name) or name in names:
+            raise ValueError(f"Ứng dụng #{i + 1}: tên '{name}' không hợp lệ hoặc bị trùng.")
+        if not entry.get("file"):
+            raise ValueError(f"Ứng dụng '{name}': thiếu 'file'.")
+        file = Path(entry["file"])
+        if os.path.abspath(file) in files:
+            raise ValueError(f"Ứng dụng '{name}': tệp '{file}' đã thuộc về ứng dụng khác (bản sửa lỗi sẽ ghi đè lẫn nhau).")
+        port = entry.get("port")
+        command = entry.get("command") or [PYTHON_EXECUTABLE, "{file}"]
+        if isinstance(command, str):
+            command = shlex.split(command)
+        command = [str(arg).replace("{file}", str(file)).replace("{port}", str(port or "")) for arg in command]
+        names.add(name)
+        files.add(os.path.abspath(file))
+        specs.append(AppSpec(name, file, command, int(port) if port else None,
+                             int(entry.get("max_fix_attempts", DEFAULT_MAX_FIX_ATTEMPTS)),
+                             {str(k): str(v) for k, v in entry.get("env", {}).items()},
+                             Path(entry["cwd"]) if entry.get("cwd") else None))
+    if not specs:
+        raise ValueError(f"Cấu hình fleet '{path}' không có ứng dụng nào.")
+    options = {"max_concurrent_fixes": int(config.get("max_concurrent_fixes", MAX_CONCURRENT_FIXES)),
+               "max_concurrent_gates": int(config.get("max_concurrent_gates", MAX_CONCURRENT_GATES))}
+    return specs, options
+
+
+class ManagedApp:
+    """
+    Máy trạng thái khởi chạy/sập/sửa lỗi của một ứng dụng trong fleet. Mỗi ứng dụng
+    có kho phiên bản, kho tri thức lỗi và kênh sự kiện riêng; việc chờ tiến trình,
+    tín hiệu sẵn sàng và thay đổi tệp đều diễn ra trên vòng lặp sự kiện chung.
+    """
+
+    def __init__(self, spec: AppSpec, fleet: "Fleet"):
+        self.spec = spec
+        self.fleet = fleet
+        app_dir = FLEET_DIR / spec.name
+        self.output_log = app_dir / "output.log"
+        self.version_store = VersionStore(VERSIONS_DIR / spec.name, max_versions=MAX_STORED_VERSIONS)
+        self.knowledge = ErrorKnowledge(app_dir / "error_knowledge.json", self.version_store)
+        self.events = EventChannel(app_dir / "events.jsonl", app_dir / "status.json")
+        self.state = STARTING
+        self.state_since = time.time()
+        self.fix_attempts = 0
+        self.restarts = 0
+        self.process: asyncio.subprocess.Process | None = None
+        self.version: str | None = None
+        self.changed = asyncio.Event()  # Được Fleet đặt khi tệp của ứng dụng đổi nội dung
+        self._restart_started: float | None = None
+
+    def set_state(self, state: str):
+        if state != self.state:
+            self.state, self.state_since = state, time.time()
+            self.fleet.mark_status_dirty()
+
+    def status(self) -> dict:
+        return {"state": self.state, "since": self.state_since, "pid": self.process.pid if self.process else None,
+                "port": self.spec.port, "version": self.version, "fix_attempts": self.fix_attempts,
+                "restarts": self.restarts}
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self._run_once()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Lỗi của một ứng dụng không được làm dừng cả fleet
+                    logging.critical(f"[{self.spec.name}] Lỗi nghiêm trọng trong vòng giám sát: {e}", exc_info=True)
+                    self.set_state(ERROR)
+                    await self._stop_process()
+                    await self._wait_for_change()
+        finally:
+            await self._stop_process()
+
+    async def _run_once(self):
+        """Một vòng đời: khởi chạy, chờ sẵn sàng, rồi chờ tiến trình thoát hoặc tệp thay đổi."""
+        self.changed.clear()
+        capture, ready_fd = await self._start()
+        result = await wait_ready_async(ready_fd, READY_TIMEOUT)
+        started = result == "ready"
+        if result == "exited":
+            try:
+                await asyncio.wait_for(self.process.wait(), 1)  # Pipe đóng vì tiến trình đã chết
+            except TimeoutError:
+                started = True  # Tiến trình tự đóng pipe nhưng vẫn chạy
+        elif result == "timeout" and self.process.returncode is None:
+            logging.warning(f"[{self.spec.name}] Tiến trình {self.process.pid} không báo sẵn sàng nhưng vẫn chạy; coi như đã khởi động.")
+            started = True
+        if started:
+            self._mark_ready()
+
+        exited = asyncio.ensure_future(self.process.wait())
+        changed = asyncio.ensure_future(self.changed.wait())
+        try:
+            done, _ = await asyncio.wait({exited, changed}, timeout=STABLE_AFTER if started else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                await self._record_stable()
+                await asyncio.wait({exited, changed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            changed.cancel()
+            if not exited.done():
+                exited.cancel()
+
+        if self.process.returncode is None:
+            logging.warning(f"[{self.spec.name}] Phát hiện thay đổi trong '{self.spec.file}'. Đang khởi động lại...")
+            self.fix_attempts = 0  # Phiên bản mới có ngân sách sửa lỗi riêng
+            self._announce_restart()
+            await self._stop_process()
+            return
+
+        returncode = self.process.returncode
+        if returncode == 0:
+            logging.warning(f"[{self.spec.name}] Tiến trình đã tự thoát (mã 0). Khởi động lại sau {CLEAN_EXIT_DELAY}s.")
+            await asyncio.sleep(CLEAN_EXIT_DELAY)
+            return
+        await capture.join(timeout=1)
+        error_output = capture.error_tail(MAX_ERROR_BYTES) or "Không thể đọc lỗi từ stderr."
+        logging.error(f"[{self.spec.name}] Đã thoát với mã lỗi {returncode}. Lỗi: {error_output}")
+        self.events.publish("crash", self.version, returncode=returncode, app=self.spec.name)
+        await self._handle_crash(error_output)
+
+    async def _start(self) -> tuple[AsyncOutputCapture, int]:
+        self.set_state(STARTING)
+        async with self.fleet.gate_slots:
+            gate = await asyncio.to_thread(test_gate.check, self.spec.file)
+        if not gate["passed"]:
+            logging.warning(f"[{self.spec.name}] Phiên bản hiện tại không qua test:\n{gate['output']}")
+        self.version = await asyncio.to_thread(hash_file, self.spec.file)
+        ready_fd, child_ready_fd = open_ready_pipe()
+        env = {**os.environ, "PYTHONUNBUFFERED": "1", "APP_SKIP_STARTUP_TESTS": "1", READY_FD_ENV: str(child_ready_fd),
+               **self.spec.env}
+        if self.spec.port is not None:
+            env["APP_PORT"] = str(self.spec.port)
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.spec.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                env=env, cwd=self.spec.cwd, pass_fds=(child_ready_fd,))
+        except OSError:
+            os.close(ready_fd)
+            raise
+        finally:
+            # Chỉ tiến trình con giữ đầu ghi: khi nó chết, pipe báo EOF ngay lập tức
+            os.close(child_ready_fd)
+        capture = AsyncOutputCapture(self.process, buffer_bytes=OUTPUT_BUFFER_BYTES, tee_file=self.output_log)
+        self.fleet.mark_status_dirty()
+        logging.info(f"[{self.spec.name}] Đã khởi chạy '{self.spec.file}' với PID {self.process.pid}"
+                     + (f" trên cổng {self.spec.port}." if self.spec.port else "."))
+        self.events.publish("starting", self.version, pid=self.process.pid, port=self.spec.port, app=self.spec.name)
+        return capture, ready_fd
+
+    async def _stop_process(self):
+        """Dừng tiến trình một cách lịch sự, buộc dừng nếu quá STOP_TIMEOUT giây."""
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except TimeoutError:
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+        logging.info(f"[{self.spec.name}] Tiến trình {process.pid} đã được dừng.")
+
+    async def _wait_for_change(self):
+        logging.info(f"[{self.spec.name}] Đang chờ '{self.spec.file}' được thay đổi trước khi thử lại.")
+        self.changed.clear()
+        await self.changed.wait()
+
+    def _announce_restart(self):
+        self._restart_started = time.monotonic()
+        self.restarts += 1
+        metrics.inc("fleet_restarts_total", app=self.spec.name)
+        self.events.publish("restart", self.version, app=self.spec.name)
+
+    def _mark_ready(self):
+        """Ứng dụng đã báo sẵn sàng: thông báo qua kênh sự kiện như supervisor đơn lẻ."""
+        self.set_state(RUNNING)
+        if self._restart_started is not None:
+            metrics.observe("fleet_restart_seconds", time.monotonic() - self._restart_started, app=self.spec.name)
+            self._restart_started = None
+        self.events.publish("healthy", self.version, pid=self.process.pid, app=self.spec.name)
+
+    async def _record_stable(self):
+        """
+        Ứng dụng đã chạy đủ STABLE_AFTER sau khi sẵn sàng: ghi nhận phiên bản vào kho,
+        xác nhận bản sửa đang chờ và hoàn lại lượt sửa lỗi. Một phiên bản sập ngay sau
+        khi báo sẵn sàng vì thế không trở thành "phiên bản ổn định" để phục hồi về.
+        """
+        self.fix_attempts = 0
+        self.fleet.mark_status_dirty()
+        try:
+            await asyncio.to_thread(self.version_store.put, self.spec.file, self.version)
+            await asyncio.to_thread(self.knowledge.confirm, self.version)
+            logging.info(f"[{self.spec.name}] Đã ghi nhận phiên bản ổn định {self.version[:12]}.")
+        except Exception as e:
+            logging.error(f"[{self.spec.name}] Sao lưu thất bại: {e}")
+
+    async def _handle_crash(self, error_output: str):
+        """Áp dụng bản sửa đã biết, xếp hàng chờ AI sửa, hoặc phục hồi phiên bản ổn định khi hết lượt sửa."""
+        name = self.spec.name
+        metrics.inc("fleet_crashes_total", app=name)
+        started = time.monotonic()
+        if self.fix_attempts < self.spec.max_fix_attempts:
+            self.fix_attempts += 1
+            self.set_state(FIXING)
+            logging.warning(f"[{name}] Bắt đầu tự sửa lỗi (Lần {self.fix_attempts}/{self.spec.max_fix_attempts})...")
+            # Bản sửa đã biết không cần AI nên không phải chờ trong hàng đợi
+            source = "known_fix"
+            if not await asyncio.to_thread(self.knowledge.replay, error_output, self.spec.file):
+                source = "ai"
+                self.set_state(QUEUED_FIX)
+                await self.fleet.request_fix(self, error_output)
+        else:
+            logging.critical(f"[{name}] Đã đạt giới hạn {self.spec.max_fix_attempts} lần sửa lỗi. Đang phục hồi phiên bản ổn định cuối cùng.")
+            self.set_state(RESTORING)
+            restored = await asyncio.to_thread(self.version_store.restore_last, self.spec.file)
+            self.fix_attempts = 0
+            if not restored:
+                logging.critical(f"[{name}] Không tìm thấy phiên bản ổn định để phục hồi.")
+                metrics.inc("fleet_gave_up_total", app=name)
+                self.events.publish("gave_up", self.version, app=name)
+                self.set_state(GAVE_UP)
+                await self._wait_for_change()
+                return
+            logging.warning(f"[{name}] Đã phục hồi '{self.spec.file}' về phiên bản {restored[:12]}.")
+            source = "restore"
+        metrics.observe("fleet_fix_seconds", time.monotonic() - started, app=name, source=source)
+        self.events.publish("fix_applied", await asyncio.to_thread(hash_file, self.spec.file), source=source,
+                            attempt=self.fix_attempts, app=name)
+        # Chính supervisor vừa ghi tệp, không coi đó là một thay đổi từ bên ngoài
+        self.fleet.watcher.rebase([self.spec.file])
+        self.changed.clear()
+
+    def self_correct(self, error_output: str):
+        """Gọi AI sửa lỗi cho tệp của ứng dụng (chạy trên luồng của hàng đợi sửa lỗi)."""
+        before = self.spec.file.read_text(encoding="utf-8")
+        trigger_self_correction(error_output, self.spec.file)
+        self.knowledge.observe(error_output, before, self.spec.file.read_text(encoding="utf-8"), self.spec.file.name)
+
+
+class Fleet:
+    """
+    Giám sát nhiều ứng dụng trong một tiến trình và một vòng lặp asyncio: một
+    FileWatcher (một descriptor inotify) cho mọi tệp, tiến trình con được thu hồi
+    qua pidfd, và một hàng đợi sửa lỗi dùng chung với số lần gọi AI đồng thời có
+    giới hạn. Số luồng và chi phí nền không tăng theo số ứng dụng.
+    """
+
+    def __init__(self, specs: list[AppSpec], max_concurrent_fixes: int = MAX_CONCURRENT_FIXES,
+                 max_concurrent_gates: int = MAX_CONCURRENT_GATES, status_file: Path = STATUS_FILE):
+        self.specs = specs
+        self.max_concurrent_fixes = max(1, max_concurrent_fixes)
+        self.max_concurrent_gates = max(1, max_concurrent_gates)
+        self.status_file = Path(status_file)
+        self.apps: list[ManagedApp] = []
+        self.watcher: FileWatcher | None = None
+        self._by_path: dict[str, ManagedApp] = {}
+        self._status_dirty = None
+
+    def mark_status_dirty(self):
+        if self._status_dirty is not None:
+            self._status_dirty.set()
+
+    async def request_fix(self, app: ManagedApp, error_output: str):
+        """Xếp hàng một lần gọi AI sửa lỗi và chờ tới khi nó hoàn tất."""
+        done = asyncio.get_running_loop().create_future()
+        await self.fix_queue.put((app, error_output, time.monotonic(), done))
+        logging.info(f"[{app.spec.name}] Đã xếp hàng chờ AI sửa lỗi ({self.fix_queue.qsize()} yêu cầu đang chờ).")
+        await done
+
+    async def _fix_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            app, error_output, queued_at, done = await self.fix_queue.get()
+            try:
+                if done.cancelled():
+                    continue  # Ứng dụng đã bị dừng trong lúc chờ
+                metrics.observe("fleet_fix_queue_wait_seconds", time.monotonic() - queued_at)
+                app.set_state(FIXING)
+                with metrics.span("fleet_self_correction", app=app.spec.name):
+                    await loop.run_in_executor(self._fix_executor, app.self_correct, error_output)
+                if not done.done():
+                    done.set_result(None)
+            except Exception as e:
+                logging.error(f"[{app.spec.name}] AI sửa lỗi thất bại: {e}")
+                if not done.done():
+                    done.set_result(None)  # Ứng dụng sẽ khởi động lại và tiêu tiếp lượt sửa lỗi
+            finally:
+                self.fix_queue.task_done()
+
+    def _on_files_changed(self, paths: list[Path]):
+        for path in paths:
+            app = self._by_path.get(os.path.abspath(path))
+            if app:
+                app.changed.set()
+
+    def _watch_files(self, loop: asyncio.AbstractEventLoop) -> asyncio.Task | None:
+        """Đăng ký descriptor inotify vào vòng lặp; khi không có inotify thì một task polling cho mọi tệp."""
+        fd = self.watcher.fileno()
+        if fd is None:
+            async def poll():
+                while True:
+                    self._on_files_changed(self.watcher.check())
+                    await asyncio.sleep(self.watcher.poll_interval)
+            return asyncio.create_task(poll())
+
+        def drain():
+            if self.watcher.fileno() != fd:
+                return  # Fleet đang tắt
+            # Gom các sự kiện ghi liên tiếp của cùng một lần lưu rồi mới kiểm tra nội dung
+            self._on_files_changed(self.watcher.poll_changes())
+            loop.add_reader(fd, on_readable)
+
+        def on_readable():
+            loop.remove_reader(fd)
+            loop.call_later(DEBOUNCE_SECONDS, drain)
+
+        loop.add_reader(fd, on_readable)
+        return None
+
+    async def _write_status(self):
+        """Ghi trạng thái của cả fleet khi có thay đổi, tối đa một lần mỗi STATUS_INTERVAL."""
+        while True:
+            await self._status_dirty.wait()
+            self._status_dirty.clear()
+            status = {"pid": os.getpid(), "ts": time.time(), "fix_queue": self.fix_queue.qsize(),
+                      "apps": {app.spec.name: app.status() for app in self.apps}}
+            try:
+                self.status_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.status_file.with_name(f".{self.status_file.name}.tmp")
+                tmp.write_text(json.dumps(status, indent=2, ensure_ascii=False), encoding="utf-8")
+                tmp.replace(self.status_file)
+            except OSError as e:
+                logging.warning(f"Không ghi được trạng thái fleet: {e}")
+            await asyncio.sleep(STATUS_INTERVAL)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        _use_pidfd_child_watcher(loop)
+        stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+
+        self.fix_queue = asyncio.Queue()
+        self.gate_slots = asyncio.Semaphore(self.max_concurrent_gates)
+        self._status_dirty = asyncio.Event()
+        self._fix_executor = ThreadPoolExecutor(max_workers=self.max_concurrent_fixes, thread_name_prefix="fleet-fix")
+        self.apps = [ManagedApp(spec, self) for spec in self.specs]
+        self._by_path = {os.path.abspath(app.spec.file): app for app in self.apps}
+        self.watcher = FileWatcher([app.spec.file for app in self.apps], hash_func=hash_file)
+        logging.info(f"Fleet: {len(self.apps)} ứng dụng, tối đa {self.max_concurrent_fixes} lần AI sửa lỗi đồng thời, "
+                     f"theo dõi tệp ở chế độ {self.watcher.mode}.")
+
+        background = [asyncio.create_task(self._fix_worker()) for _ in range(self.max_concurrent_fixes)]
+        background.append(asyncio.create_task(self._write_status()))
+        poller = self._watch_files(loop)
+        if poller:
+            background.append(poller)
+        app_tasks = [asyncio.create_task(app.run(), name=f"app-{app.spec.name}") for app in self.apps]
+        self.mark_status_dirty()
+        try:
+            await stopping.wait()
+            logging.info("Đã nhận tín hiệu dừng. Đang tắt các ứng dụng...")
+        finally:
+            for task in app_tasks + background:
+                task.cancel()
+            await asyncio.gather(*app_tasks, *background, return_exceptions=True)
+            if self.watcher.fileno() is not None:
+                loop.remove_reader(self.watcher.fileno())
+            self.watcher.close()
+            # Lần gọi AI đang chạy dở không hủy được; chờ nó ghi xong thay vì bỏ tệp ở trạng thái lưng chừng
+            self._fix_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _use_pidfd_child_watcher(loop: asyncio.AbstractEventLoop):
+    """
+    Python < 3.12 mặc định dùng ThreadedChildWatcher (một luồng cho mỗi tiến trình
+    con). Trên Linux có pidfd, chuyển sang PidfdChildWatcher để việc chờ tiến trình
+    thoát diễn ra ngay trên vòng lặp sự kiện.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+
+def main():
+    """Chạy fleet từ tệp cấu hình (đối số dòng lệnh hoặc FLEET_CONFIG)."""
+    config_path = Path(sys.argv[1]) if len(sys.argv) > 1 else FLEET_CONFIG
+    try:
+        specs, options = load_config(config_path)
+    except ValueError as e:
+        logging.critical(str(e))
+        sys.exit(1)
+    metrics.configure("fleet")
+    asyncio.run(Fleet(specs, **options).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# app/health_channel.py
+import os
+import json
+import asyncio
+import time
+import errno
+import select
+import logging
+from pathlib import Path
+
+from watcher import FileWatcher, _stat_key
+
+# --- Cấu hình ---
+EVENTS_FILE = Path("app/logs/supervisor_events.jsonl")
+STATUS_FILE = Path("app/logs/supervisor_status.json")
+MAX_EVENTS_BYTES = 1024 * 1024  # Xoay vòng nhật ký sự kiện khi vượt quá kích thước này
+READY_MESSAGE = b"READY\n"
+READY_FD_ENV = "APP_READY_FD"
+
+# Các sự kiện kết thúc một lần triển khai
+HEALTHY_EVENTS = ("healthy",)
+FAILURE_EVENTS = ("crash", "unhealthy", "gave_up")
+
+
+# --- Phía ứng dụng ---
+def notify_ready():
+    """Báo cho supervisor rằng ứng dụng đã mở cổng và sẵn sàng phục vụ (không làm gì nếu không có kênh)."""
+    fd = os.environ.pop(READY_FD_ENV, None)
+    if not fd:
+        return
+    try:
+        os.write(int(fd), READY_MESSAGE)
+        os.close(int(fd))
+    except OSError as e:
+        logging.warning(f"Không gửi được tín hiệu sẵn sàng cho supervisor: {e}")
+
+
+# --- Phía supervisor ---
+def open_ready_pipe() -> tuple[int, int]:
+    """Tạo pipe báo sẵn sàng: (đầu đọc cho supervisor, đầu ghi truyền cho tiến trình con)."""
+    read_fd, write_fd = os.pipe()
+    os.set_inheritable(write_fd, True)
+    return read_fd, write_fd
+
+
+def wait_ready(read_fd: int, timeout: float) -> str:
+    """
+    Chờ tín hiệu trên đầu đọc của pipe. Trả về "ready" khi ứng dụng báo sẵn sàng,
+    "exited" khi pipe bị đóng mà không có tín hiệu (tiến trình đã chết), hoặc
+    "timeout". Luôn đóng `read_fd`.
+    """
+    deadline = time.monotonic() + timeout
+    data = b""
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return "timeout"
+            try:
+                ready, _, _ = select.select([read_fd], [], [], remaining)
+            except InterruptedError:
+                continue
+            if not ready:
+                return "timeout"
+            chunk = os.read(read_fd, 64)
+            if not chunk:
+                return "exited"
+            data += chunk
+            if READY_MESSAGE in data:
+                return "ready"
+    finally:
+        os.close(read_fd)
+
+
+async def wait_ready_async(read_fd: int, timeout: float) -> str:
+    """
+    Như wait_ready nhưng chờ trên vòng lặp asyncio thay vì chặn một luồng, để một
+    supervisor có thể chờ nhiều ứng dụng cùng lúc. Luôn đóng `read_fd`.
+    """
+    loop = asyncio.get_running_loop()
+    result = loop.create_future()
+    data = bytearray()
+
+    def on_readable():
+        try:
+            chunk = os.read(read_fd, 64)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        data.extend(chunk)
+        if result.done():
+            return
+        if not chunk:
+            result.set_result("exited")
+        elif READY_MESSAGE in data:
+            result.set_result("ready")
+
+    os.set_blocking(read_fd, False)
+    loop.add_reader(read_fd, on_readable)
+    try:
+        return await asyncio.wait_for(result, timeout)
+    except TimeoutError:
+        return "timeout"
+    finally:
+        loop.remove_reader(read_fd)
+        os.close(read_fd)
+
+
+class EventChannel:
+    """
+    Kênh sự kiện cục bộ giữa supervisor và orchestrator: supervisor ghi thêm các
+    sự kiện (JSON mỗi dòng) như "starting", "healthy", "crash", kèm hash phiên bản;
+    orchestrator chặn chờ trên tệp (inotify hoặc polling) thay vì ngủ cố định.
+    """
+
+    def __init__(self, events_file: Path = EVENTS_FILE, status_file: Path | None = STATUS_FILE,
+                 max_bytes: int = MAX_EVENTS_BYTES):
+        self.events_file = Path(events_file)
+        self.status_file = Path(status_file) if status_file else None
+        self.max_bytes = max_bytes
+
+    def publish(self, event: str, version: str | None = None, **fields) -> dict:
+        entry = {"ts": time.time(), "event": event, "version": version, "supervisor_pid": os.getpid(), **fields}
+        self.events_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.events_file.stat().st_size > self.max_bytes:
+                os.replace(self.events_file, self.events_file.with_name(self.events_file.name + ".1"))
+        except FileNotFoundError:
+            pass
+        # Một lần write trên tệp O_APPEND: các dòng không bị xen kẽ
+        fd = os.open(self.events_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+        if self.status_file:
+            tmp = self.status_file.with_name(f".{self.status_file.name}.tmp")
+            tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.status_file)
+        return entry
+
+    def status(self) -> dict | None:
+        if not self.status_file:
+            return None
+        try:
+            return json.loads(self.status_file.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def supervisor_alive(self) -> bool:
+        """Supervisor ghi trạng thái gần nhất có còn chạy không."""
+        status = self.status()
+        if not status:
+            return False
+        try:
+            os.kill(status["supervisor_pid"], 0)
+            return True
+        except OSError as e:
+            return e.errno == errno.EPERM
+
+    def _read_from(self, offset: int) -> tuple[list[dict], int]:
+        try:
+            with open(self.events_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < offset:
+                    offset = 0  # Tệp đã được xoay vòng
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b"\n") + 1  # Bỏ qua dòng đang ghi dở
+        events = []
+        for line in data[:end].splitlines():
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return events, offset + end
+
+    def wait_for(self, version: str | None, since: float, timeout: float,
+                 events: tuple[str, ...] = HEALTHY_EVENTS + FAILURE_EVENTS) -> dict | None:
+        """
+        Chờ sự kiện đầu tiên thuộc `events` của phiên bản `version` (None = mọi phiên
+        bản) xảy ra sau thời điểm `since`. Trả về sự kiện, hoặc None nếu hết thời gian.
+        """
+        deadline = time.monotonic() + timeout
+        self.events_file.parent.mkdir(parents=True, exist_ok=True)
+        watcher = FileWatcher([self.events_file], hash_func=lambda p: str(_stat_key(p)), poll_interval=0.1)
+        offset = 0
+        try:
+            while True:
+                found, offset = self._read_from(offset)
+                for entry in found:
+                    if entry["ts"] >= since and entry["event"] in events and version in (None, entry.get("version")):
+                        return entry
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                watcher.wait_for_change(timeout=remaining)
+        finally:
+            watcher.close()
@@ -0,0 +1,234 @@
+# app/ingest_log.py
+import os
+import json
+import time
+import fcntl
+import queue
+import logging
+import threading
+from pathlib import Path
+
+# --- Cấu hình mặc định ---
+DEFAULT_COMMIT_INTERVAL = 0.005  # Thời gian tối đa gom các bản ghi vào một lần fsync (giây)
+DEFAULT_MAX_BATCH = 512  # Số bản ghi tối đa trong một lần group commit
+DEFAULT_SEGMENT_MAX_BYTES = 4 * 1024 * 1024  # Kích thước một segment trước khi xoay vòng
+DEFAULT_MAX_SEGMENTS = 8  # Số segment đã đóng được giữ lại sau khi nén
+SEGMENT_SUFFIX = ".jsonl"
+LOCK_FILE = "LOCK"  # Khóa độc quyền: mỗi thư mục chỉ có một tiến trình ghi
+
+
+def atomic_write_json(path: Path, data, fsync: bool = True):
+    """Ghi JSON nguyên tử (tệp tạm + os.replace) để người đọc không bao giờ thấy tệp ghi dở."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class IngestLog:
+    """
+    Nhật ký ghi-trước (write-ahead) chỉ-ghi-thêm cho dữ liệu POST.
+
+    - Mỗi bản ghi là một dòng JSON {"seq", "ts", "data"} trong segment hiện tại.
+    - Một luồng ghi duy nhất gom các bản ghi đến gần nhau và fsync một lần
+      cho cả nhóm (group commit). `sync_commit=True` buộc người gọi chờ tới khi
+      dữ liệu đã bền vững; `False` trả về ngay sau khi xếp hàng (độ trễ thấp hơn,
+      có thể mất tối đa một nhóm khi sập).
+    - Segment được xoay vòng theo kích thước; luồng nền xóa các segment cũ.
+    - Tệp `snapshot_file` (data.json) là "view" vật chất hóa của bản ghi mới
+      nhất, được ghi nguyên tử sau mỗi nhóm để giữ nguyên hợp đồng của /data.
+    - Mỗi thư mục chỉ có một người ghi (flock trên tệp LOCK); mở thư mục đang
+      được tiến trình khác ghi sẽ ném RuntimeError thay vì ghi trùng seq.
+    """
+
+    def __init__(self, directory: Path, snapshot_file: Path,
+                 commit_interval: float = DEFAULT_COMMIT_INTERVAL,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+                 max_segments: int = DEFAULT_MAX_SEGMENTS,
+                 sync_commit: bool = True,
+                 on_commit=None):
+        self.directory = Path(directory)
+        self.snapshot_file = Path(snapshot_file)
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.sync_commit = sync_commit
+        self.on_commit = on_commit  # Gọi sau mỗi nhóm với danh sách bản ghi vừa ghi
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.directory / LOCK_FILE, 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"Thư mục ingest log '{self.directory}' đang được một tiến trình khác ghi.")
+        self._queue: queue.Queue = queue.Queue()
+        self._compact_event = threading.Event()
+        self._stopped = threading.Event()
+        self._seq = 0
+        self._segment = None
+        self._recover()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="ingest-writer", daemon=True)
+        self._writer.start()
+        self._compactor = threading.Thread(target=self._compactor_loop, name="ingest-compactor", daemon=True)
+        self._compactor.start()
+
+    # --- API công khai ---
+    def append(self, data) -> int:
+        """Ghi một bản ghi. Trả về số thứ tự (seq) của nó."""
+        if self._stopped.is_set():
+            raise RuntimeError("IngestLog đã đóng.")
+        done = threading.Event() if self.sync_commit else None
+        slot = {"data": data, "done": done, "seq": None, "error": None}
+        self._queue.put(slot)
+        if done:
+            done.wait()
+            if slot["error"]:
+                raise slot["error"]
+        return slot["seq"]
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def close(self):
+        """Ghi nốt các bản ghi đang chờ rồi dừng các luồng nền."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        self._writer.join()
+        self._compact_event.set()
+        self._compactor.join()
+        self._lock_file.close()  # Nhả flock
+
+    # --- Khôi phục ---
+    def _recover(self):
+        """
+        Tìm seq cuối cùng hợp lệ; cắt bỏ dòng ghi dở ở cuối segment (nếu có) và dựng
+        lại snapshot từ bản ghi cuối nếu nó thiếu, hỏng hoặc cũ hơn bản ghi đó (ví dụ
+        sập giữa lúc fsync segment và lúc ghi snapshot). Snapshot mới hơn thì giữ nguyên:
+        nhiều log (các worker prefork) có thể cùng cập nhật một snapshot.
+        """
+        segments = self.segments()
+        if not segments:
+            return
+        last = segments[-1]
+        with open(last, 'rb+') as f:
+            content = f.read()
+            valid_end = content.rfind(b"\n") + 1
+            if valid_end != len(content):
+                logging.warning(f"Cắt bỏ bản ghi ghi dở ở cuối '{last.name}'.")
+                f.truncate(valid_end)
+        for segment in reversed(segments):
+            lines = segment.read_bytes().splitlines()
+            if lines:
+                record = json.loads(lines[-1])
+                self._seq = record["seq"]
+                if self._snapshot_stale(record):
+                    logging.warning(f"Snapshot '{self.snapshot_file}' thiếu, hỏng hoặc cũ hơn bản ghi #{self._seq}; đang dựng lại từ log.")
+                    atomic_write_json(self.snapshot_file, record["data"])
+                break
+
+    def _snapshot_stale(self, record: dict) -> bool:
+        """Snapshot thiếu/hỏng, hoặc được ghi trước thời điểm commit của `record`."""
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            return True
+        # Snapshot luôn được ghi sau khi lấy `ts` của nhóm, nên mtime < ts nghĩa là lần ghi đó đã bị mất
+        return mtime < record["ts"]
+
+    # --- Luồng ghi ---
+    def _open_segment(self):
+        path = self.directory / f"{self._seq + 1:016d}{SEGMENT_SUFFIX}"
+        self._segment = open(path, 'ab')
+
+    def _collect_batch(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.commit_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Để vòng lặp ngoài nhận tín hiệu dừng
+                break
+            batch.append(item)
+        return batch
+
+    def _writer_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect_batch(first)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                logging.exception(f"Group commit thất bại: {e}")
+                for slot in batch:
+                    slot["error"] = e
+            else:
+                # Các bản ghi đã bền vững: lỗi ở snapshot/callback chỉ được ghi log, không báo cho
+                # người gọi (họ sẽ gửi lại và tạo bản ghi trùng); _recover sẽ dựng lại snapshot
+                try:
+                    self._publish(batch)
+                except Exception as e:
+                    logging.exception(f"Cập nhật snapshot/callback sau group commit thất bại: {e}")
+            for slot in batch:
+                if slot["done"]:
+                    slot["done"].set()
+        if self._segment:
+            self._segment.close()
+
+    def _commit(self, batch: list):
+        if self._segment is None or self._segment.tell() >= self.segment_max_bytes:
+            if self._segment:
+                self._segment.close()
+                self._compact_event.set()
+            self._open_segment()
+        now = time.time()
+        lines = []
+        for slot in batch:
+            self._seq += 1
+            slot["seq"] = self._seq
+            lines.append(json.dumps({"seq": self._seq, "ts": now, "data": slot["data"]}, ensure_ascii=False))
+        self._segment.write(("\n".join(lines) + "\n").encode('utf-8'))
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+
+    def _publish(self, batch: list):
+        """Cập nhật view "mới nhất" và gọi on_commit sau khi log đã bền vững."""
+        atomic_write_json(self.snapshot_file, batch[-1]["data"], fsync=False)
+        if self.on_commit:
+            self.on_commit([slot["data"] for slot in batch])
+
+    # --- Nén nền ---
+    def _compactor_loop(self):
+        while not self._stopped.is_set():
+            self._compact_event.wait()
+            self._compact_event.clear()
+            try:
+                self._compact()
+            except OSError as e:
+                logging.error(f"Nén ingest log thất bại: {e}")
+
+    def _compact(self):
+        """Xóa các segment đã đóng cũ nhất, giữ lại `max_segments` segment gần nhất."""
+        closed = self.segments()[:-1]
+        for segment in closed[:max(0, len(closed) - self.max_segments)]:
+            segment.unlink(missing_ok=True)
+            logging.info(f"Đã nén ingest log: xóa segment '{segment.name}'.")
@@ -0,0 +1,108 @@
+# app/json_stream.py
+import re
+import json
+from pathlib import Path
+from typing import Iterator
+
+# --- Cấu hình ---
+READ_CHUNK_CHARS = 64 * 1024  # Số ký tự đọc thêm mỗi lần bộ đệm không đủ để giải mã phần tử tiếp theo
+
+_WHITESPACE = " \t\n\r"
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_DELIMITERS = _WHITESPACE + ",]"
+_decoder = json.JSONDecoder()
+
+
+class NotAnArray(ValueError):
+    """Giá trị cấp cao nhất của tệp không phải là một mảng JSON."""
+
+
+class _Reader:
+    """Bộ đệm trượt trên tệp văn bản: chỉ giữ phần chưa được giải mã."""
+
+    def __init__(self, f, chunk_chars: int):
+        self.f = f
+        self.chunk_chars = chunk_chars
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Đọc thêm một khối; trả về False khi đã hết tệp."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_chars)
+        # Bỏ phần đã xử lý trước khi nối thêm để bộ nhớ không tăng theo kích thước tệp
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+            return False
+        return True
+
+    def skip_whitespace(self) -> str | None:
+        """Ký tự có nghĩa tiếp theo (không tiêu thụ), hoặc None ở cuối tệp."""
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def decode_value(self):
+        """
+        Giải mã một phần tử mảng tại vị trí hiện tại, đọc thêm khi phần tử bị cắt
+        ngang bởi ranh giới khối. Kết quả chỉ được chấp nhận khi ký tự theo sau là
+        dấu phân cách (hoặc đã hết tệp), vì "-2" có thể là phần đầu của "-2.5e10".
+        """
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                if (end < len(self.buf) and self.buf[end] in _DELIMITERS) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Phần tử lớn: khối đọc lớn dần để số lần thử giải mã lại chỉ tăng theo log
+            self.chunk_chars = max(self.chunk_chars, len(self.buf) - self.pos)
+            self.fill()
+
+
+def iter_array(path: Path, chunk_chars: int = READ_CHUNK_CHARS) -> Iterator:
+    """
+    Lần lượt trả về các phần tử của mảng JSON cấp cao nhất trong `path` mà không
+    tải cả tệp vào bộ nhớ (bộ nhớ tỉ lệ với phần tử lớn nhất). Ném NotAnArray nếu
+    giá trị cấp cao nhất không phải mảng, json.JSONDecodeError nếu tệp hỏng.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f, chunk_chars)
+        if reader.skip_whitespace() != "[":
+            raise NotAnArray(f"Giá trị cấp cao nhất của '{path}' không phải là mảng JSON.")
+        reader.pos += 1
+        expect_value = True
+        first = True
+        while True:
+            char = reader.skip_whitespace()
+            if char is None:
+                raise json.JSONDecodeError("Mảng JSON chưa được đóng", reader.buf, reader.pos)
+            if char == "]" and (first or not expect_value):
+                break
+            if not expect_value:
+                if char != ",":
+                    raise json.JSONDecodeError("Thiếu dấu phẩy giữa các phần tử", reader.buf, reader.pos)
+                reader.pos += 1
+                expect_value = True
+                continue
+            yield reader.decode_value()
+            expect_value = False
+            first = False
+
+
+def iter_records(path: Path, chunk_chars: int = READ_CHUNK_CHARS) -> Iterator:
+    """Các bản ghi của tệp: từng phần tử nếu là mảng, nếu không thì chính giá trị đó (một bản ghi)."""
+    try:
+        yield from iter_array(path, chunk_chars)
+    except NotAnArray:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield json.load(f)
@@ -0,0 +1,353 @@
+# app/llm_client.py
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+import metrics
+
+# --- Cấu hình ---
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" hoặc "stub"
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "60"))  # Hạn mức yêu cầu/phút (token bucket)
+RATE_BURST = int(os.getenv("LLM_RATE_BURST", "5"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "app/logs/llm_cache"))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_ENTRIES", "500"))
+STUB_SCRIPT = os.getenv("LLM_STUB_SCRIPT")  # Tệp JSON kịch bản cho backend stub
+
+# Tên lớp ngoại lệ (google.api_core và tương tự) nên được thử lại
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+                    "InternalServerError", "ServerError", "RetryError"}
+
+
+# --- Backend ---
+class GeminiBackend:
+    """Backend Gemini; chỉ import thư viện và đọc API key khi được dùng lần đầu, và dùng lại model handle."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str | None = None):
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY không được thiết lập trong tệp .env")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str, config: dict):
+        key = (model, json.dumps(config, sort_keys=True))
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self._genai.GenerativeModel(model, generation_config=config or None)
+            return self._models[key]
+
+    def generate(self, model: str, prompt: str, config: dict, timeout: float) -> str:
+        response = self._model(model, config).generate_content(prompt, request_options={"timeout": timeout})
+        _record_usage(model, getattr(response, "usage_metadata", None))
+        return response.text
+
+    def stream(self, model: str, prompt: str, config: dict, timeout: float):
+        chunk = None
+        for chunk in self._model(model, config).generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            yield chunk.text
+        # Mảnh cuối mang số token của cả phản hồi
+        _record_usage(model, getattr(chunk, "usage_metadata", None))
+
+
+def _record_usage(model: str, usage):
+    if usage is None:
+        return
+    metrics.inc("llm_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, model=model, kind="prompt")
+    metrics.inc("llm_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, model=model, kind="response")
+
+
+class StubBackend:
+    """
+    Model giả chạy cục bộ cho test và benchmark. Phản hồi lấy theo thứ tự ưu tiên:
+    `handler(prompt, config)`, các luật {"match": chuỗi con, "response": ...} trong
+    `rules`, rồi lần lượt danh sách `responses` (phần tử cuối được lặp lại).
+    """
+
+    name = "stub"
+
+    def __init__(self, handler=None, rules: list[dict] | None = None, responses: list[str] | None = None,
+                 latency: float = 0.0, chunk_size: int = 64):
+        self.handler = handler
+        self.rules = rules or []
+        self.responses = list(responses or [])
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_script(cls, path: Path) -> "StubBackend":
+        script = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(rules=script.get("rules"), responses=script.get("responses"), latency=script.get("latency", 0.0))
+
+    def _respond(self, prompt: str, config: dict) -> str:
+        with self._lock:
+            self.calls += 1
+            if self.handler:
+                return self.handler(prompt, config)
+            for rule in self.rules:
+                if rule["match"] in prompt:
+                    response = rule["response"]
+                    return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+            if not self.responses:
+                raise RuntimeError("StubBackend không còn phản hồi nào được lập kịch bản.")
+            response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+            return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+
+    def generate(self, model: str, prompt: str, config: dict, timeout: float) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt, config)
+
+    def stream(self, model: str, prompt: str, config: dict, timeout: float):
+        text = self.generate(model, prompt, config, timeout)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+
+# --- Giới hạn tốc độ ---
+class TokenBucket:
+    """Token bucket: tối đa `capacity` yêu cầu dồn dập, hồi `rate` token mỗi giây."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- Cache phản hồi trên đĩa ---
+class ResponseCache:
+    """Cache LRU trên đĩa: mỗi phản hồi một tệp, thời gian truy cập gần nhất lưu trong mtime."""
+
+    def __init__(self, directory: Path = CACHE_DIR, max_entries: int = CACHE_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            text = json.loads(path.read_text(encoding="utf-8"))["text"]
+            os.utime(path)  # Đánh dấu vừa được dùng
+            return text
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def put(self, key: str, text: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"text": text, "created": time.time()}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+        self._evict()
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        with self._lock:
+            entries = list(self.directory.glob("*.json"))
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda p: p.stat().st_mtime)
+            for path in entries[:len(entries) - self.max_entries]:
+                path.unlink(missing_ok=True)
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+class LLMClient:
+    """
+    Lớp gọi LLM dùng chung: giới hạn tốc độ (token bucket), giới hạn số lời gọi
+    đồng thời, thử lại với backoff lũy thừa có jitter, và cache phản hồi trên đĩa
+    theo hash của (backend, model, cấu hình, prompt).
+    """
+
+    def __init__(self, backend, model: str = LLM_MODEL, rate_per_minute: float = RATE_PER_MINUTE,
+                 burst: int = RATE_BURST, max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 timeout: float = REQUEST_TIMEOUT, cache: ResponseCache | None = None):
+        self.backend = backend
+        self.model = model
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache = cache
+        self._bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()  # Bảo vệ self.stats: nhiều luồng dùng chung một client
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _config(self, temperature: float | None) -> dict:
+        return {} if temperature is None else {"temperature": temperature}
+
+    def cache_key(self, prompt: str, temperature: float | None = None) -> str:
+        material = json.dumps([self.backend.name, self.model, self._config(temperature)], sort_keys=True) + "\0" + prompt
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def invalidate(self, prompt: str, temperature: float | None = None):
+        """Xóa phản hồi đã cache (ví dụ khi nó hóa ra không dùng được)."""
+        if self.cache:
+            self.cache.delete(self.cache_key(prompt, temperature))
+
+    def _acquire(self):
+        started = time.perf_counter()
+        self._bucket.acquire()
+        metrics.observe("llm_rate_limit_wait_seconds", time.perf_counter() - started)
+
+    def _backoff(self, attempt: int, error: Exception):
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))  # Full jitter
+        self._count("retries")
+        metrics.inc("llm_retries_total", error=type(error).__name__)
+        logging.warning(f"Lời gọi LLM thất bại ({type(error).__name__}: {error}); thử lại sau {delay:.1f}s "
+                        f"(lần {attempt + 1}/{self.max_retries}).")
+        time.sleep(delay)
+
+    def _cached(self, prompt: str, temperature: float | None, use_cache: bool) -> tuple[str, str | None]:
+        key = self.cache_key(prompt, temperature)
+        text = self.cache.get(key) if self.cache and use_cache else None
+        if text is not None:
+            self._count("cache_hits")
+            metrics.inc("llm_cache_hits_total")
+            logging.info(f"Dùng phản hồi LLM đã cache ({key[:12]}).")
+        return key, text
+
+    def generate(self, prompt: str, temperature: float | None = None, use_cache: bool = True) -> str:
+        key, text = self._cached(prompt, temperature, use_cache)
+        if text is not None:
+            return text
+        config = self._config(temperature)
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            with self._slots:
+                self._count("requests")
+                try:
+                    with metrics.span("llm_request", backend=self.backend.name, model=self.model):
+                        text = self.backend.generate(self.model, prompt, config, self.timeout)
+                    break
+                except Exception as e:
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    error = e
+            self._backoff(attempt, error)
+        if self.cache and use_cache:
+            self.cache.put(key, text)
+        return text
+
+    def stream(self, prompt: str, temperature: float | None = None, use_cache: bool = True):
+        """
+        Trả về các mảnh phản hồi. Chỉ thử lại khi lỗi xảy ra trước mảnh đầu tiên;
+        phản hồi chỉ được cache khi luồng được đọc hết.
+
+        Bên gọi phải đọc hết generator hoặc gọi `close()` (ví dụ dùng
+        contextlib.closing) nếu dừng giữa chừng: một lượt trong `_slots` bị giữ
+        suốt thời gian luồng còn mở.
+        """
+        key, text = self._cached(prompt, temperature, use_cache)
+        if text is not None:
+            yield text
+            return
+        config = self._config(temperature)
+        labels = {"backend": self.backend.name, "model": self.model}
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            received = []
+            self._slots.acquire()
+            chunks = None
+            try:
+                self._count("requests")
+                # Không dùng span ở đây: generator nhường quyền cho bên gọi giữa các mảnh
+                started = time.perf_counter()
+                chunks = self.backend.stream(self.model, prompt, config, self.timeout)
+                for chunk in chunks:
+                    if not received:
+                        metrics.observe("llm_first_chunk_seconds", time.perf_counter() - started, **labels)
+                    received.append(chunk)
+                    yield chunk
+                metrics.observe("llm_request_seconds", time.perf_counter() - started, **labels)
+                break
+            except Exception as e:
+                metrics.inc("llm_request_errors_total", **labels)
+                if received or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                error = e
+            finally:
+                # Chạy cả khi bên gọi close() generator giữa chừng (GeneratorExit tại yield)
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                self._slots.release()
+            self._backoff(attempt, error)
+        if self.cache and use_cache:
+            self.cache.put(key, "".join(received))
+
+
+_client: LLMClient | None = None
+_client_lock = threading.Lock()
+
+
+def create_backend(name: str = LLM_BACKEND):
+    if name == "stub":
+        return StubBackend.from_script(Path(STUB_SCRIPT)) if STUB_SCRIPT else StubBackend()
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Backend LLM không hợp lệ: {name!r}")
+
+
+def get_client() -> LLMClient:
+    """Client dùng chung cho cả tiến trình, được tạo khi cần lần đầu."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(create_backend(), cache=ResponseCache() if CACHE_ENABLED else None)
+        return _client
+
+
+def set_backend(backend, **options) -> LLMClient:
+    """Thay backend (ví dụ StubBackend trong test/benchmark); trả về client mới."""
+    global _client
+    cache = options.pop("cache", ResponseCache() if CACHE_ENABLED else None)
+    with _client_lock:
+        _client = LLMClient(backend, cache=cache, **options)
+        return _client
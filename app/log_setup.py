@@ -0,0 +1,167 @@
+# app/log_setup.py
+import os
+import gzip
+import time
+import queue
+import random
+import shutil
+import atexit
+import logging
+import reprlib
+import logging.handlers
+from pathlib import Path
+
+# --- Cấu hình ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))  # Xoay vòng khi tệp log vượt kích thước này
+LOG_MAX_AGE = float(os.getenv("LOG_MAX_AGE", 24 * 3600))  # ...hoặc khi tệp đã mở quá lâu (giây, 0 = tắt)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))  # Số tệp cũ (.gz) giữ lại
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 4000))  # Thông điệp dài hơn bị cắt bớt
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # Hàng đợi đầy thì bỏ bản ghi thay vì chặn luồng gọi
+# Tỉ lệ lấy mẫu log INFO/DEBUG theo route hoặc tên logger, ví dụ "POST /=0.01,GET /data=0.1,werkzeug=0.05"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_FORMAT = "%(asctime)s [{component}] [%(levelname)s] - %(message)s"
+
+_payload_repr = reprlib.Repr()
+_payload_repr.maxstring = 200
+_payload_repr.maxother = 200
+_payload_repr.maxlevel = 2
+_payload_repr.maxdict = _payload_repr.maxlist = 10
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def payload_preview(value) -> str:
+    """Bản tóm tắt có giới hạn của một payload: chi phí không phụ thuộc kích thước payload."""
+    return _payload_repr.repr(value)
+
+
+def parse_sample_rates(spec: str) -> dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, rate = item.rpartition("=")
+        try:
+            rates[key.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logging.warning(f"Bỏ qua tỉ lệ lấy mẫu log không hợp lệ: {item!r}")
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Chỉ giữ lại một phần bản ghi INFO/DEBUG của các route ồn ào. Khóa lấy mẫu là
+    `extra={"route": ...}` của bản ghi, hoặc tên logger. Cảnh báo và lỗi luôn được giữ.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(getattr(record, "route", None) or record.name)
+        return rate is None or rate >= 1.0 or random.random() < rate
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Cắt bớt thông điệp quá dài (traceback đính kèm vẫn được giữ nguyên)."""
+
+    def __init__(self, fmt: str, max_chars: int = LOG_MAX_MESSAGE_CHARS):
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = record.message
+        if self.max_chars and len(message) > self.max_chars:
+            record.message = f"{message[:self.max_chars]}... [đã cắt {len(message) - self.max_chars} ký tự]"
+        return super().formatMessage(record)
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Xoay vòng theo kích thước hoặc tuổi của tệp; các tệp cũ được nén gzip (tệp.log.1.gz, ...)."""
+
+    def __init__(self, filename: Path, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                 max_age: float = LOG_MAX_AGE):
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_age = max_age
+        self.opened_at = time.time()
+        self.namer = lambda name: name + ".gz"
+        self.rotator = _gzip_rotator
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.max_age and time.time() - self.opened_at >= self.max_age and os.path.exists(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+
+
+class _AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Đưa bản ghi vào hàng đợi mà không định dạng trên luồng gọi: việc ghép chuỗi,
+    cắt bớt và ghi đĩa diễn ra trên luồng nền của QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            # Traceback phải được dựng ngay khi ngoại lệ còn sống
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # Không bao giờ chặn request vì log
+
+
+def setup_logging(component: str, log_file: Path | None = None, level: str = LOG_LEVEL,
+                  console: bool = True) -> logging.handlers.QueueListener | None:
+    """
+    Cấu hình logging dùng chung cho cả tiến trình: root logger chỉ đẩy bản ghi vào
+    hàng đợi, một luồng nền ghi ra console và (tùy chọn) `log_file` xoay vòng có nén.
+    Như basicConfig, lần gọi đầu tiên trong tiến trình quyết định cấu hình.
+    """
+    global _listener
+    root = logging.getLogger()
+    if _listener is not None or root.handlers:
+        return _listener
+
+    formatter = TruncatingFormatter(LOG_FORMAT.format(component=component))
+    handlers = []
+    if console:
+        handlers.append(logging.StreamHandler())
+    if log_file:
+        handlers.append(CompressedRotatingFileHandler(Path(log_file)))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = _AsyncQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Ghi nốt các bản ghi còn trong hàng đợi khi tiến trình thoát
+    atexit.register(_listener.stop)
+
+    def _direct_in_child():
+        # Tiến trình con tạo bằng fork không có luồng listener: ghi trực tiếp thay vì qua hàng đợi
+        root.removeHandler(queue_handler)
+        for handler in handlers:
+            handler.addFilter(queue_handler.filters[0])
+            root.addHandler(handler)
+
+    os.register_at_fork(after_in_child=_direct_in_child)
+    return _listener
@@ -1,145 +1,471 @@
 # app/main.py (Đã nâng cấp để tự sửa lỗi)
 import os
+import itertools
 import subprocess
 import time
-import hashlib
-import shutil
 import logging
+import urllib.request
 from pathlib import Path
+from typing import NamedTuple
 
 # --- Cấu hình ---
 APP_FILE = Path("app/application.py")
 VERSIONS_DIR = Path("app/versions")
 LOGS_DIR = Path("app/logs")
 LOG_FILE = LOGS_DIR / "supervisor.log"
+APP_OUTPUT_LOG = LOGS_DIR / "application.log" # Bản sao stdout/stderr của ứng dụng (xoay vòng)
 PYTHON_EXECUTABLE = "python"  # Hoặc "python3"
 MAX_FIX_ATTEMPTS = 3 # Giới hạn số lần thử sửa lỗi liên tiếp
+MAX_STORED_VERSIONS = 20 # Số phiên bản ổn định khác nhau giữ lại trong kho phiên bản
+OUTPUT_BUFFER_BYTES = 64 * 1024 # Dung lượng bộ đệm vòng cho mỗi luồng đầu ra
+MAX_ERROR_BYTES = 16 * 1024 # Chỉ gửi phần cuối này của stderr cho AI sửa lỗi
+PROCESS_CHECK_INTERVAL = 1.0 # Chu kỳ tối đa giữa hai lần kiểm tra tiến trình khi không có thay đổi tệp
+SUPERVISOR_MODE = os.getenv("SUPERVISOR_MODE", "restart") # "restart", "blue_green", "prefork" hoặc "fleet"
+PUBLIC_PORT = 3000 # Cổng công khai của dịch vụ
+BLUE_GREEN_PORTS = (3001, 3002) # Hai cổng nội bộ luân phiên ở chế độ blue/green
+HEALTH_CHECK_TIMEOUT = 60 # Thời gian tối đa chờ phiên bản mới trả lời 200 trên "/" (gồm cả chạy test)
+HEALTH_CHECK_INTERVAL = 0.2
+DRAIN_TIMEOUT = 10 # Thời gian tối đa chờ các kết nối tới phiên bản cũ kết thúc
+PREFORK_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", os.cpu_count() or 1)) # Số worker ở chế độ prefork
+PREFORK_MAX_RESTART_FAILURES = 3 # Số lần khởi động lại worker thất bại liên tiếp (cùng phiên bản) trước khi chuyển sang sửa lỗi
+READY_TIMEOUT = 30 # Thời gian tối đa chờ ứng dụng báo sẵn sàng qua pipe; quá hạn mà còn sống thì coi như đã khởi động
+WORKERS_STATUS_FILE = LOGS_DIR / "workers.json"
+ERROR_KNOWLEDGE_FILE = LOGS_DIR / "error_knowledge.json" # Dấu vân tay lỗi và các bản sửa đã được xác nhận
 
 # --- Thiết lập Logging ---
 LOGS_DIR.mkdir(exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+# Ghi log trên luồng nền; supervisor.log xoay vòng theo kích thước/thời gian và được nén
+from log_setup import setup_logging
+setup_logging("SUPERVISOR", LOG_FILE)
 
 # --- Import orchestrator để có thể gọi AI sửa lỗi ---
 # Chúng ta import ở đây vì main là cấp cao nhất, sẽ không gây lỗi circular import
 from orchestrator import trigger_self_correction
+from watcher import FileWatcher, hash_file
+from output_capture import OutputCapture
+from version_store import VersionStore
+from traffic_proxy import TrafficProxy
+from prefork import WorkerPool, create_listen_socket
+from error_knowledge import ErrorKnowledge
+from health_channel import EventChannel, open_ready_pipe, wait_ready, READY_FD_ENV
+import test_gate
+import metrics
 
-def get_file_hash(filepath: Path) -> str:
-    """Tính toán hash SHA-256 của một tệp."""
-    if not filepath.exists():
-        return ""
-    h = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        while chunk := f.read(8192):
-            h.update(chunk)
-    return h.hexdigest()
-
-def backup_working_version(source: Path):
-    """Sao lưu phiên bản đang hoạt động vào thư mục versions."""
-    VERSIONS_DIR.mkdir(exist_ok=True)
-    backup_path = VERSIONS_DIR / f"{source.name}.{int(time.time())}.bak"
+version_store = VersionStore(VERSIONS_DIR, max_versions=MAX_STORED_VERSIONS)
+error_knowledge = ErrorKnowledge(ERROR_KNOWLEDGE_FILE, version_store)
+events = EventChannel() # Kênh sự kiện cho orchestrator: starting/healthy/crash/...
+metrics.configure("supervisor")
+_restart_started: float | None = None # Thời điểm phát hiện thay đổi gần nhất, để đo độ trễ khởi động lại
+
+def backup_working_version(source: Path, file_hash: str | None = None) -> str | None:
+    """Ghi nhận phiên bản đang hoạt động vào kho phiên bản (bỏ qua nếu trùng nội dung)."""
     try:
-        shutil.copy(source, backup_path)
-        logging.info(f"Đã sao lưu phiên bản hoạt động tới: {backup_path}")
-        return backup_path
+        with metrics.span("supervisor_backup"):
+            stored_hash = version_store.put(source, file_hash)
+        logging.info(f"Đã ghi nhận phiên bản hoạt động {stored_hash[:12]} của '{source}'.")
+        error_knowledge.confirm(stored_hash)
+        return stored_hash
     except Exception as e:
         logging.error(f"Sao lưu thất bại: {e}")
         return None
 
 def restore_last_working_version(target: Path) -> bool:
-    """Phục hồi phiên bản hoạt động cuối cùng từ thư mục versions."""
+    """Phục hồi phiên bản hoạt động cuối cùng từ kho phiên bản."""
     try:
-        backups = sorted(VERSIONS_DIR.glob(f"{target.name}.*.bak"), key=os.path.getmtime, reverse=True)
-        if not backups:
+        if version_store.head(target.name) is None and version_store.import_legacy_backups(target.name):
+            logging.info("Đã nhập các bản sao lưu .bak cũ vào kho phiên bản.")
+        with metrics.span("supervisor_restore"):
+            restored_hash = version_store.restore_last(target)
+        if not restored_hash:
             logging.error("Không tìm thấy phiên bản sao lưu nào để phục hồi.")
             return False
-        
-        latest_backup = backups[0]
-        shutil.copy(latest_backup, target)
-        logging.warning(f"Đã phục hồi tệp '{target}' từ bản sao lưu '{latest_backup}'.")
+        logging.warning(f"Đã phục hồi tệp '{target}' về phiên bản {restored_hash[:12]}.")
         return True
     except Exception as e:
         logging.error(f"Phục hồi thất bại: {e}")
         return False
 
-def main():
-    """Hàm chính giám sát và chạy ứng dụng với khả năng tự sửa lỗi."""
-    process = None
-    last_hash = get_file_hash(APP_FILE)
+def record_healthy(version: str, **fields):
+    """Phiên bản `version` đã chạy ổn định: ghi nhận vào kho phiên bản và thông báo qua kênh sự kiện."""
+    global _restart_started
+    backup_working_version(APP_FILE, version)
+    if _restart_started is not None:
+        metrics.observe("supervisor_restart_seconds", time.monotonic() - _restart_started, mode=SUPERVISOR_MODE)
+        _restart_started = None
+    events.publish("healthy", version, **fields)
+
+def announce_restart(version: str):
+    """Đã phát hiện thay đổi: bắt đầu đo thời gian tới khi phiên bản mới khỏe mạnh và báo cho orchestrator."""
+    global _restart_started
+    _restart_started = time.monotonic()
+    metrics.inc("supervisor_restarts_total", mode=SUPERVISOR_MODE)
+    events.publish("restart", version)
+
+class AppInstance(NamedTuple):
+    process: subprocess.Popen
+    capture: OutputCapture
+    port: int | None
+    version: str
+    ready_fd: int
+
+def start_application(port: int | None = None, extra_env: dict | None = None, pass_fds: tuple = ()) -> AppInstance:
+    """Khởi chạy application.py (trên `port` nếu có) với đầu ra được thu vào bộ đệm vòng."""
+    # Chạy test trong thư mục tạm (có cache theo hash); ứng dụng không cần tự chạy lại test khi khởi động
+    with metrics.span("supervisor_test_gate") as span:
+        gate = test_gate.check(APP_FILE)
+        span.set(passed=gate["passed"], cached=gate.get("cached", False))
+    if not gate["passed"]:
+        logging.warning(f"Phiên bản hiện tại không qua test:\n{gate['output']}")
+    logging.info(f"Đang khởi chạy '{APP_FILE}'" + (f" trên cổng {port}..." if port else "..."))
+    version = hash_file(APP_FILE)
+    # Ứng dụng báo sẵn sàng (sau khi đã mở cổng) bằng cách ghi vào pipe này
+    ready_fd, child_ready_fd = open_ready_pipe()
+    env = {**os.environ, "PYTHONUNBUFFERED": "1", "APP_SKIP_STARTUP_TESTS": "1", READY_FD_ENV: str(child_ready_fd),
+           **(extra_env or {})}
+    if port is not None:
+        env["APP_PORT"] = str(port)
+    # Mở tiến trình với pipe cho stdout/stderr; các luồng nền đọc liên tục vào bộ đệm vòng
+    try:
+        process = subprocess.Popen([PYTHON_EXECUTABLE, str(APP_FILE)], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   env=env, pass_fds=(*pass_fds, child_ready_fd))
+    finally:
+        # Chỉ tiến trình con giữ đầu ghi: khi nó chết, supervisor đọc được EOF ngay lập tức
+        os.close(child_ready_fd)
+    capture = OutputCapture(process, buffer_bytes=OUTPUT_BUFFER_BYTES, tee_file=APP_OUTPUT_LOG)
+    logging.info(f"'{APP_FILE}' đã được khởi chạy với PID: {process.pid}.")
+    events.publish("starting", version, pid=process.pid, port=port)
+    return AppInstance(process, capture, port, version, ready_fd)
+
+def stop_application(process: subprocess.Popen | None):
+    """Dừng tiến trình một cách lịch sự, buộc dừng nếu quá 5 giây."""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    logging.info(f"Tiến trình {process.pid} đã được dừng.")
+
+def read_crash_output(instance: AppInstance) -> str:
+    """Lấy phần cuối stderr của một tiến trình đã thoát."""
+    instance.capture.join(timeout=1)
+    return instance.capture.error_tail(MAX_ERROR_BYTES) or "Không thể đọc lỗi từ stderr."
+
+def handle_crash(error_output: str, fix_attempts: int, watcher: FileWatcher) -> int | None:
+    """
+    Gọi AI sửa lỗi hoặc phục hồi phiên bản ổn định khi hết lượt sửa.
+    Trả về số lần sửa lỗi mới, hoặc None nếu không thể phục hồi.
+    """
+    metrics.inc("supervisor_crashes_total", mode=SUPERVISOR_MODE)
+    started = time.monotonic()
+    if fix_attempts < MAX_FIX_ATTEMPTS:
+        fix_attempts += 1
+        logging.warning(f"Bắt đầu quá trình tự sửa lỗi (Lần {fix_attempts}/{MAX_FIX_ATTEMPTS})...")
+        # Ưu tiên bản sửa đã biết cho đúng lỗi này; chỉ gọi AI khi chưa gặp bao giờ
+        source = "known_fix"
+        if not error_knowledge.replay(error_output, APP_FILE):
+            source = "ai"
+            before = APP_FILE.read_text(encoding="utf-8")
+            trigger_self_correction(error_output)
+            error_knowledge.observe(error_output, before, APP_FILE.read_text(encoding="utf-8"), APP_FILE.name)
+    else:
+        logging.critical(f"Đã đạt giới hạn {MAX_FIX_ATTEMPTS} lần sửa lỗi. Đang phục hồi phiên bản ổn định cuối cùng.")
+        if not restore_last_working_version(APP_FILE):
+            metrics.inc("supervisor_gave_up_total")
+            events.publish("gave_up", hash_file(APP_FILE))
+            return None
+        source = "restore"
+        fix_attempts = 0 # Reset bộ đếm
+    metrics.observe("supervisor_fix_seconds", time.monotonic() - started, source=source)
+    events.publish("fix_applied", hash_file(APP_FILE), source=source, attempt=fix_attempts)
+    # Chính supervisor vừa ghi tệp, không coi đó là một thay đổi từ bên ngoài
+    watcher.rebase()
+    return fix_attempts
+
+def wait_until_ready(instance: AppInstance, timeout: float = READY_TIMEOUT) -> bool:
+    """
+    Chờ ứng dụng báo sẵn sàng qua pipe. Tiến trình chết trước đó (pipe đóng) được
+    phát hiện ngay; phiên bản không hỗ trợ giao thức mà vẫn sống sau `timeout` được coi là đã khởi động.
+    """
+    result = wait_ready(instance.ready_fd, timeout)
+    if result == "ready":
+        return True
+    if result == "exited":
+        try:
+            instance.process.wait(timeout=1) # Pipe đóng vì tiến trình đã chết; chờ thu hồi mã thoát
+            return False
+        except subprocess.TimeoutExpired:
+            pass # Tiến trình tự đóng pipe nhưng vẫn chạy
+    if instance.process.poll() is None:
+        logging.warning(f"Tiến trình {instance.process.pid} không báo sẵn sàng ({result}) nhưng vẫn chạy; coi như đã khởi động.")
+        return True
+    return False
+
+def wait_until_healthy(instance: AppInstance, timeout: float = HEALTH_CHECK_TIMEOUT) -> bool:
+    """Chờ tín hiệu sẵn sàng rồi xác nhận tiến trình trả lời 200 trên "/" (hoặc thoát/hết thời gian)."""
+    deadline = time.monotonic() + timeout
+    if not wait_until_ready(instance, min(READY_TIMEOUT, timeout)):
+        return False
+    process = instance.process
+    url = f"http://127.0.0.1:{instance.port}/"
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(HEALTH_CHECK_INTERVAL)
+    return False
+
+def run_restart_mode():
+    """Chế độ mặc định: dừng phiên bản cũ rồi mới khởi chạy phiên bản mới."""
+    instance = None
+    watcher = FileWatcher([APP_FILE], hash_func=hash_file)
+    last_hash = watcher.current_hash(APP_FILE)
     fix_attempts = 0
-    
-    if last_hash:
-        backup_working_version(APP_FILE)
+    logging.info(f"Đang theo dõi '{APP_FILE}' ở chế độ {watcher.mode}.")
 
     while True:
         try:
             # Khởi chạy hoặc khởi động lại tiến trình
-            if process is None or process.poll() is not None:
+            if instance is None or instance.process.poll() is not None:
                 # Nếu tiến trình đã từng chạy và bị lỗi
-                if process and process.poll() is not None and process.poll() != 0:
-                    error_output = process.stderr.read() if process.stderr else "Không thể đọc lỗi từ stderr."
-                    logging.error(f"'{APP_FILE}' đã thoát với mã lỗi {process.poll()}. Lỗi: {error_output}")
-
-                    if fix_attempts < MAX_FIX_ATTEMPTS:
-                        fix_attempts += 1
-                        logging.warning(f"Bắt đầu quá trình tự sửa lỗi (Lần {fix_attempts}/{MAX_FIX_ATTEMPTS})...")
-                        # Gọi AI để sửa lỗi
-                        trigger_self_correction(error_output)
-                        # Hash sẽ thay đổi và vòng lặp tiếp theo sẽ xử lý khởi động lại
-                        time.sleep(1) # Chờ một chút để file được ghi
-                        last_hash = get_file_hash(APP_FILE)
-                    else:
-                        logging.critical(f"Đã đạt giới hạn {MAX_FIX_ATTEMPTS} lần sửa lỗi. Đang phục hồi phiên bản ổn định cuối cùng.")
-                        if restore_last_working_version(APP_FILE):
-                            last_hash = get_file_hash(APP_FILE)
-                            fix_attempts = 0 # Reset bộ đếm
-                        else:
-                            logging.critical("Không thể phục hồi. Hệ thống tạm dừng.")
-                            break
-                
-                logging.info(f"Đang khởi chạy '{APP_FILE}'...")
-                # Mở tiến trình với stderr=subprocess.PIPE để bắt lỗi
-                process = subprocess.Popen([PYTHON_EXECUTABLE, str(APP_FILE)], stderr=subprocess.PIPE, text=True, encoding='utf-8')
-                logging.info(f"'{APP_FILE}' đã được khởi chạy với PID: {process.pid}.")
-                time.sleep(2)
-
-                # Nếu sau khi khởi động mà nó vẫn chạy tốt, reset bộ đếm lỗi
-                if process.poll() is None:
+                if instance and instance.process.returncode != 0:
+                    error_output = read_crash_output(instance)
+                    logging.error(f"'{APP_FILE}' đã thoát với mã lỗi {instance.process.returncode}. Lỗi: {error_output}")
+                    events.publish("crash", instance.version, returncode=instance.process.returncode)
+                    fix_attempts = handle_crash(error_output, fix_attempts, watcher)
+                    if fix_attempts is None:
+                        logging.critical("Không thể phục hồi. Hệ thống tạm dừng.")
+                        break
+                    last_hash = watcher.current_hash(APP_FILE)
+
+                instance = start_application()
+
+                # Nếu ứng dụng báo sẵn sàng (thay vì chỉ còn sống sau vài giây), reset bộ đếm lỗi và ghi nhận phiên bản tốt
+                if wait_until_ready(instance):
                     fix_attempts = 0
+                    record_healthy(instance.version, pid=instance.process.pid)
+                continue # Vòng sau: theo dõi thay đổi nếu đang chạy, hoặc xử lý ngay nếu đã sập trước khi sẵn sàng
 
-            # Giám sát thay đổi tệp
-            current_hash = get_file_hash(APP_FILE)
+            # Giám sát thay đổi tệp: chặn trên inotify (hoặc polling) thay vì ngủ cố định
+            watcher.wait_for_change(timeout=PROCESS_CHECK_INTERVAL)
+            current_hash = watcher.current_hash(APP_FILE)
             if current_hash != last_hash:
                 logging.warning(f"Phát hiện thay đổi trong '{APP_FILE}'. Đang khởi động lại...")
-                
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                logging.info("Tiến trình cũ đã được dừng.")
-
-                backup_working_version(APP_FILE)
+                announce_restart(current_hash)
+                stop_application(instance.process)
                 last_hash = current_hash
-                process = None
+                instance = None
                 continue
 
-            time.sleep(3)
-
         except KeyboardInterrupt:
             logging.info("Phát hiện Ctrl+C. Đang tắt hệ thống...")
-            if process and process.poll() is None:
-                process.terminate()
+            if instance:
+                instance.process.terminate()
             break
         except Exception as e:
             logging.critical(f"Lỗi nghiêm trọng trong vòng lặp giám sát: {e}", exc_info=True)
             break
 
+    watcher.close()
+
+def run_blue_green_mode():
+    """
+    Chế độ blue/green: phiên bản mới được khởi chạy song song trên cổng dự phòng,
+    chỉ nhận lưu lượng từ proxy khi đã trả lời tốt trên "/", sau đó phiên bản cũ
+    được "xả" kết nối rồi mới dừng. Ứng viên lỗi bị loại bỏ, phiên bản cũ vẫn phục vụ.
+    """
+    active = None
+    candidate = None # Phiên bản mới đang được kiểm tra, chưa nhận lưu lượng
+    previous = None # Phiên bản cũ đang được xả kết nối sau khi chuyển lưu lượng
+    watcher = FileWatcher([APP_FILE], hash_func=hash_file)
+    proxy = TrafficProxy(PUBLIC_PORT)
+    proxy.start()
+    last_hash = watcher.current_hash(APP_FILE)
+    deployed_hash = None
+    failed_hash = None # Phiên bản vừa thất bại và chưa thể sửa, không thử lại cho tới khi tệp đổi
+    fix_attempts = 0
+    logging.info(f"Đang theo dõi '{APP_FILE}' ở chế độ {watcher.mode} (blue/green).")
+
+    try:
+        while True:
+            try:
+                if active and active.process.poll() is not None:
+                    error_output = read_crash_output(active)
+                    logging.error(f"Phiên bản đang phục vụ (cổng {active.port}) đã thoát với mã {active.process.returncode}. Lỗi: {error_output}")
+                    events.publish("crash", active.version, returncode=active.process.returncode, port=active.port)
+                    active = None
+                    deployed_hash = None
+                    fix_attempts = handle_crash(error_output, fix_attempts, watcher)
+                    if fix_attempts is None:
+                        logging.critical("Không thể phục hồi. Hệ thống tạm dừng.")
+                        break
+                    last_hash = watcher.current_hash(APP_FILE)
+
+                if last_hash != deployed_hash and last_hash != failed_hash:
+                    port = next(p for p in BLUE_GREEN_PORTS if not active or p != active.port)
+                    # Ứng viên và phiên bản đang phục vụ chạy song song: mỗi cổng có ingest log riêng
+                    candidate = start_application(port, extra_env={"INGEST_DIR": f"data_log/port-{port}"})
+                    if wait_until_healthy(candidate):
+                        proxy.switch_to(port)
+                        previous, active, candidate = active, candidate, None
+                        deployed_hash = last_hash
+                        failed_hash = None
+                        fix_attempts = 0
+                        record_healthy(active.version, port=port)
+                        if previous:
+                            if not proxy.wait_drained(previous.port, DRAIN_TIMEOUT):
+                                logging.warning(f"Hết thời gian chờ xả kết nối trên cổng {previous.port}.")
+                            stop_application(previous.process)
+                        logging.info(f"Phiên bản {last_hash[:12]} đang phục vụ trên cổng {port}.")
+                    else:
+                        stop_application(candidate.process)
+                        rejected, candidate = candidate, None
+                        error_output = read_crash_output(rejected)
+                        logging.error(f"Phiên bản ứng viên (cổng {port}) không khỏe mạnh, đã loại bỏ. Lỗi: {error_output}")
+                        events.publish("unhealthy", rejected.version, returncode=rejected.process.returncode, port=port)
+                        fix_attempts = handle_crash(error_output, fix_attempts, watcher)
+                        if fix_attempts is None:
+                            if not active:
+                                logging.critical("Không thể phục hồi. Hệ thống tạm dừng.")
+                                break
+                            logging.error("Không thể sửa ứng viên; phiên bản cũ tiếp tục phục vụ.")
+                            failed_hash = last_hash
+                            fix_attempts = 0
+                        last_hash = watcher.current_hash(APP_FILE)
+                    continue
+
+                watcher.wait_for_change(timeout=PROCESS_CHECK_INTERVAL)
+                current_hash = watcher.current_hash(APP_FILE)
+                if current_hash != last_hash:
+                    logging.warning(f"Phát hiện thay đổi trong '{APP_FILE}'. Đang triển khai song song...")
+                    announce_restart(current_hash)
+                    last_hash = current_hash
+
+            except KeyboardInterrupt:
+                logging.info("Phát hiện Ctrl+C. Đang tắt hệ thống...")
+                break
+            except Exception as e:
+                logging.critical(f"Lỗi nghiêm trọng trong vòng lặp giám sát: {e}", exc_info=True)
+                break
+    finally:
+        # Mọi đường thoát đều dừng mọi tiến trình con: ứng viên, phiên bản đang xả và phiên bản đang phục vụ
+        for instance in (candidate, previous, active):
+            if instance:
+                stop_application(instance.process)
+        proxy.close()
+        watcher.close()
+
+def run_prefork_mode():
+    """
+    Chế độ prefork: N worker WSGI cùng chấp nhận kết nối trên một socket do
+    supervisor mở sẵn. Worker chết được khởi động lại từng cái một; khi tệp
+    thay đổi, các worker được thay lần lượt (rolling reload) nên dịch vụ không gián đoạn.
+    """
+    sock = create_listen_socket("127.0.0.1", PUBLIC_PORT)
+    logging.info(f"Chế độ prefork: {PREFORK_WORKERS} worker trên cổng {PUBLIC_PORT}.")
+
+    generations = itertools.count()
+
+    def spawn_worker(slot: int) -> AppInstance:
+        # Mỗi thế hệ worker có thư mục ingest log riêng: khi rolling reload, worker cũ và mới
+        # của cùng một ô chạy song song và không được ghi chung một log
+        worker_env = {"APP_LISTEN_FD": str(sock.fileno()), "INGEST_DIR": f"data_log/worker-{slot}-{next(generations)}"}
+        return start_application(PUBLIC_PORT, extra_env=worker_env, pass_fds=(sock.fileno(),))
+
+    pool = WorkerPool(PREFORK_WORKERS, spawn_worker, stop_application, wait_until_ready, WORKERS_STATUS_FILE)
+    watcher = FileWatcher([APP_FILE], hash_func=hash_file)
+    last_hash = watcher.current_hash(APP_FILE)
+    fix_attempts = 0
+    try:
+        pool.start_all(last_hash)
+        if pool.alive_count():
+            record_healthy(last_hash, workers=pool.alive_count())
+
+        while True:
+            try:
+                dead = pool.reap()
+                for slot, instance in dead:
+                    if instance.process.returncode != 0:
+                        logging.error(f"Worker {slot} đã thoát với mã lỗi {instance.process.returncode}. Lỗi: {read_crash_output(instance)}")
+                        events.publish("crash", instance.version, returncode=instance.process.returncode, slot=slot)
+                if dead and pool.alive_count() == 0:
+                    # Tất cả worker đều chết: nhiều khả năng do mã nguồn, cần sửa lỗi
+                    fix_attempts = handle_crash(read_crash_output(dead[-1][1]), fix_attempts, watcher)
+                    if fix_attempts is None:
+                        logging.critical("Không thể phục hồi. Hệ thống tạm dừng.")
+                        break
+                    pool.reset_failures()
+                    last_hash = watcher.current_hash(APP_FILE)
+                exhausted = None
+                for slot in pool.failed_slots():
+                    if pool.restart(slot, last_hash):
+                        fix_attempts = 0
+                        record_healthy(last_hash, workers=pool.alive_count())
+                    else:
+                        if pool.status[slot]["failures"] >= PREFORK_MAX_RESTART_FAILURES:
+                            exhausted = slot
+                        break # Các worker còn lại sẽ được thử lại ở vòng sau (sau thời gian backoff)
+                if exhausted is not None:
+                    # Phiên bản hiện tại liên tục không khởi động được: xử lý như khi tất cả worker đều chết
+                    logging.error(f"Worker {exhausted} khởi động lại thất bại {PREFORK_MAX_RESTART_FAILURES} lần liên tiếp. Chuyển sang sửa lỗi.")
+                    fix_attempts = handle_crash(read_crash_output(pool.workers[exhausted]), fix_attempts, watcher)
+                    if fix_attempts is None:
+                        logging.critical("Không thể phục hồi. Hệ thống tạm dừng.")
+                        break
+                    pool.reset_failures()
+                    # Các worker còn sống vẫn chạy mã cũ: buộc rolling reload với nội dung đã sửa
+                    last_hash = None
+
+                watcher.wait_for_change(timeout=PROCESS_CHECK_INTERVAL)
+                current_hash = watcher.current_hash(APP_FILE)
+                if current_hash != last_hash:
+                    logging.warning(f"Phát hiện thay đổi trong '{APP_FILE}'. Đang rolling reload các worker...")
+                    announce_restart(current_hash)
+                    last_hash = current_hash
+                    failed = pool.rolling_reload(last_hash)
+                    if failed is None:
+                        fix_attempts = 0
+                        record_healthy(last_hash, workers=pool.alive_count())
+                    else:
+                        events.publish("unhealthy", failed.version, returncode=failed.process.returncode)
+                        fix_attempts = handle_crash(read_crash_output(failed), fix_attempts, watcher)
+                        if fix_attempts is None:
+                            logging.error("Không thể sửa phiên bản mới; các worker cũ tiếp tục phục vụ.")
+                            fix_attempts = 0
+                        else:
+                            # Tệp đã được sửa/phục hồi: buộc vòng sau reload lại với nội dung mới
+                            last_hash = None
+
+            except KeyboardInterrupt:
+                logging.info("Phát hiện Ctrl+C. Đang tắt hệ thống...")
+                break
+            except Exception as e:
+                logging.critical(f"Lỗi nghiêm trọng trong vòng lặp giám sát: {e}", exc_info=True)
+                break
+    finally:
+        # Mọi đường thoát (Ctrl+C, lỗi không lường trước, không thể phục hồi) đều dừng các worker con
+        pool.stop_all()
+        sock.close()
+        watcher.close()
+
+def main():
+    """Hàm chính giám sát và chạy ứng dụng với khả năng tự sửa lỗi."""
+    if SUPERVISOR_MODE == "blue_green":
+        run_blue_green_mode()
+    elif SUPERVISOR_MODE == "prefork":
+        run_prefork_mode()
+    elif SUPERVISOR_MODE == "fleet":
+        # Nhiều ứng dụng trong một vòng lặp asyncio, theo tệp cấu hình fleet (xem app/fleet.py)
+        import fleet
+        fleet.main()
+    else:
+        run_restart_mode()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,257 @@
+# app/metrics.py
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import itertools
+import threading
+import contextvars
+from collections import deque
+from pathlib import Path
+
+# --- Cấu hình ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"  # "0": mọi lời gọi đo đạc trở thành no-op
+METRICS_DIR = Path(os.getenv("METRICS_DIR", "app/logs/metrics"))  # Mỗi tiến trình ghi một ảnh chụp JSON tại đây
+SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "10"))
+SPAN_BUFFER = 256  # Số span gần nhất được giữ lại để xem trong ảnh chụp
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Span:
+    """
+    Đo thời gian một giai đoạn. Thời lượng được ghi vào histogram `<tên>_seconds`,
+    lỗi được đếm trong `<tên>_errors_total`; span lồng nhau dùng chung trace_id.
+    """
+
+    __slots__ = ("registry", "name", "labels", "attrs", "trace_id", "span_id", "parent_id", "start", "_token", "_t0")
+
+    def __init__(self, registry: "Registry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.attrs = {}
+
+    def set(self, **attrs):
+        """Gắn thêm thông tin chỉ hiển thị trong bản ghi span (không tạo chuỗi metric mới)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.span_id = f"{os.getpid():x}.{next(_span_ids):x}"
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self._token = _current_span.set(self)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._t0
+        _current_span.reset(self._token)
+        self.registry.observe(f"{self.name}_seconds", duration, **self.labels)
+        if exc_type is not None:
+            self.registry.inc(f"{self.name}_errors_total", **self.labels)
+        self.registry.record_span({
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": self.start, "duration_ms": round(duration * 1000, 3), "labels": self.labels,
+            "attrs": self.attrs, "error": exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Registry:
+    """Bộ đếm và histogram trong bộ nhớ của một tiến trình, xuất ra văn bản Prometheus hoặc ảnh chụp JSON."""
+
+    def __init__(self, component: str, enabled: bool = METRICS_ENABLED, directory: Path = METRICS_DIR):
+        self.component = component
+        self.enabled = enabled
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, list] = {}  # (tên, nhãn) -> [số đếm theo bucket, tổng, số mẫu]
+        self._buckets: dict[str, tuple] = {}
+        self._spans = deque(maxlen=SPAN_BUFFER)
+        self._exporter = None
+
+    @property
+    def snapshot_file(self) -> Path:
+        return self.directory / f"{self.component}.json"
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            bounds = self._buckets.setdefault(name, tuple(buckets))
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(bounds), 0.0, 0]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    hist[0][i] += 1
+                    break
+            hist[1] += value
+            hist[2] += 1
+
+    def span(self, name: str, **labels):
+        return Span(self, name, labels) if self.enabled else _NOOP_SPAN
+
+    def record_span(self, record: dict):
+        self._spans.append(record)  # deque.append an toàn giữa các luồng
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._counters.items()]
+            histograms = [{"name": n, "labels": dict(l), "buckets": list(self._buckets[n]), "counts": list(h[0]),
+                           "sum": h[1], "count": h[2]} for (n, l), h in self._histograms.items()]
+        return {"component": self.component, "pid": os.getpid(), "ts": time.time(),
+                "counters": counters, "histograms": histograms, "spans": list(self._spans)}
+
+    def write_snapshot(self):
+        """Ghi ảnh chụp JSON một cách nguyên tử."""
+        if not self.enabled:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_file.with_name(f".{self.snapshot_file.name}.tmp")
+            tmp.write_text(json.dumps(self.snapshot(), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.snapshot_file)
+        except OSError as e:
+            logging.warning(f"Không ghi được ảnh chụp metrics '{self.snapshot_file}': {e}")
+
+    def start_exporter(self, interval: float = SNAPSHOT_INTERVAL):
+        """Ghi ảnh chụp định kỳ trên một luồng nền, và một lần cuối khi tiến trình thoát."""
+        if not self.enabled or self._exporter:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.write_snapshot()
+
+        self._exporter = threading.Thread(target=loop, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+        atexit.register(self.write_snapshot)
+
+    def render_prometheus(self, include_peers: bool = True) -> str:
+        """
+        Văn bản theo định dạng Prometheus cho tiến trình này, kèm các ảnh chụp của
+        những tiến trình khác đang sống (supervisor, orchestrator...) nếu `include_peers`.
+        """
+        snapshots = [self.snapshot()]
+        if include_peers:
+            snapshots += [s for s in _read_peer_snapshots(self.directory) if s.get("pid") != os.getpid()]
+        return render_snapshots(snapshots)
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (ProcessLookupError, ValueError, TypeError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_peer_snapshots(directory: Path) -> list[dict]:
+    snapshots = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            snapshot = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        if _pid_alive(snapshot.get("pid")):
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_snapshots(snapshots: list[dict]) -> str:
+    """Gộp nhiều ảnh chụp thành văn bản Prometheus; mỗi chuỗi được gắn nhãn `component`."""
+    families: dict[str, tuple[str, list[str]]] = {}  # Prometheus yêu cầu các mẫu cùng tên đứng liền nhau
+    for snapshot in snapshots:
+        component = snapshot.get("component", "unknown")
+        for counter in snapshot.get("counters", []):
+            lines = families.setdefault(counter["name"], ("counter", []))[1]
+            labels = {"component": component, **counter["labels"]}
+            lines.append(f"{counter['name']}{_format_labels(labels)} {counter['value']}")
+        for hist in snapshot.get("histograms", []):
+            name = hist["name"]
+            lines = families.setdefault(name, ("histogram", []))[1]
+            labels = {"component": component, **hist["labels"]}
+            cumulative = 0
+            for bound, count in zip(hist["buckets"], hist["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    out = []
+    for name, (kind, lines) in families.items():
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+# --- Registry mặc định của tiến trình ---
+registry = Registry(os.getenv("METRICS_COMPONENT") or Path(sys.argv[0]).stem or "python")
+
+
+def configure(component: str | None = None, export: bool = True):
+    """Đặt tên thành phần (tên tệp ảnh chụp) và bật ghi ảnh chụp định kỳ."""
+    if component:
+        registry.component = component
+    if export:
+        registry.start_exporter()
+
+
+def inc(name: str, value: float = 1, **labels):
+    registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    registry.observe(name, value, **labels)
+
+
+def span(name: str, **labels):
+    return registry.span(name, **labels)
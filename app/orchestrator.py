@@ -4,15 +4,33 @@ import logging
 import json
 from pathlib import Path
 from datetime import datetime
+import os
 import time
+import hashlib
+import threading
 # Sửa import: Thêm invoke_planner_ai
-from ai_agent import modify_application_code, fix_application_code, invoke_planner_ai
+from ai_agent import modify_application_code, fix_application_code, invoke_planner_ai, generate_change
+from fixer import speculative_fix
+import code_patch
+import test_gate
+import plan_executor
+from evolution_log import EvolutionLog
+from health_channel import EventChannel, HEALTHY_EVENTS
+import metrics
+from log_setup import setup_logging
 
 # --- Thiết lập ---
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [ORCHESTRATOR] [%(levelname)s] - %(message)s")
-EVOLUTION_LOG_FILE = Path("app/logs/evolution_log.json")
+setup_logging("ORCHESTRATOR")
+EVOLUTION_LOG_FILE = Path("app/logs/evolution_log.jsonl") # Chỉ ghi thêm, mỗi dòng một mục JSON
 PLAN_FILE = Path("app/logs/plan.json") # File để lưu kế hoạch
 MAX_HISTORY_ENTRIES = 10
+FIX_CANDIDATES = int(os.getenv("FIX_CANDIDATES", "1")) # > 1: sinh và kiểm tra song song nhiều bản sửa lỗi
+APP_FILE = Path("app/application.py")
+STEP_HEALTH_TIMEOUT = int(os.getenv("STEP_HEALTH_TIMEOUT", "300")) # Thời gian tối đa chờ một phiên bản khỏe mạnh (gồm cả sửa lỗi)
+PLAN_MAX_CONCURRENCY = int(os.getenv("PLAN_MAX_CONCURRENCY", plan_executor.DEFAULT_MAX_CONCURRENCY)) # Số bước được sinh đồng thời
+supervisor_events = EventChannel()
+evolution_log = EvolutionLog(EVOLUTION_LOG_FILE)
+_plan_lock = threading.Lock() # Các bước sinh song song cùng ghi cache vào plan.json
 
 # --- Các hàm quản lý nhật ký và kế hoạch ---
 def load_json_file(filepath: Path) -> list | dict:
@@ -25,21 +43,53 @@ def load_json_file(filepath: Path) -> list | dict:
         return []
 
 def save_json_file(filepath: Path, data: list | dict):
+    """Ghi nguyên tử (tệp tạm + os.replace): một lần dừng giữa chừng không để lại plan.json hỏng."""
     filepath.parent.mkdir(exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
+    tmp = filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filepath)
 
 def save_evolution_entry(user_request: str, ai_description: str):
-    history = load_json_file(EVOLUTION_LOG_FILE)
     entry = {"timestamp": datetime.now().isoformat(), "user_request": user_request, "ai_change_description": ai_description}
-    history.append(entry)
-    save_json_file(EVOLUTION_LOG_FILE, history)
+    evolution_log.append(entry)
+
+def recent_history() -> list[dict]:
+    return evolution_log.tail(MAX_HISTORY_ENTRIES)
+
+def wait_for_healthy_version(since: float) -> bool:
+    """
+    Chặn tới khi supervisor báo phiên bản hiện tại của APP_FILE khỏe mạnh. Nếu phiên
+    bản đó sập, tiếp tục chờ tới khi một bản sửa khỏe mạnh (hoặc supervisor bỏ cuộc).
+    """
+    if not supervisor_events.supervisor_alive():
+        logging.warning("Không thấy supervisor đang chạy; bỏ qua bước chờ phiên bản khỏe mạnh.")
+        return True
+    version = hashlib.sha256(APP_FILE.read_bytes()).hexdigest()
+    status = supervisor_events.status()
+    if status and status["version"] == version and status["event"] in HEALTHY_EVENTS:
+        return True # Phiên bản này đã đang chạy ổn định (ví dụ bước không làm đổi tệp)
+    event = supervisor_events.wait_for(version, since, STEP_HEALTH_TIMEOUT)
+    if event is None:
+        logging.error(f"Hết {STEP_HEALTH_TIMEOUT}s mà phiên bản {version[:12]} chưa được xác nhận khỏe mạnh.")
+        return False
+    if event["event"] in HEALTHY_EVENTS:
+        logging.info(f"Supervisor xác nhận phiên bản {version[:12]} khỏe mạnh.")
+        return True
+    logging.warning(f"Phiên bản {version[:12]}: {event['event']}. Đang chờ supervisor sửa lỗi...")
+    fixed = supervisor_events.wait_for(None, event["ts"], STEP_HEALTH_TIMEOUT, events=HEALTHY_EVENTS + ("gave_up",))
+    if fixed and fixed["event"] in HEALTHY_EVENTS:
+        logging.info(f"Supervisor đã sửa lỗi; phiên bản {fixed['version'][:12]} khỏe mạnh.")
+        return True
+    return False
 
 # --- Hàm cho các chế độ ---
 def execute_manual_request(user_request: str):
     """Thực hiện một yêu cầu đơn lẻ từ người dùng."""
     logging.info(f"Đang thực hiện yêu cầu thủ công: '{user_request}'")
-    history = load_json_file(EVOLUTION_LOG_FILE)[-MAX_HISTORY_ENTRIES:]
+    history = recent_history()
     try:
         description = modify_application_code(user_request, history)
         save_evolution_entry(user_request, description)
@@ -47,64 +97,152 @@ def execute_manual_request(user_request: str):
     except Exception as e:
         logging.critical(f"Không thể hoàn thành yêu cầu thủ công. Lỗi: {e}")
 
+def _file_sha256() -> str:
+    return hashlib.sha256(APP_FILE.read_bytes()).hexdigest()
+
+def _step_input_key(step: dict, base: str) -> str:
+    """Khóa cache cho đầu vào của một bước: mô tả bước và đúng mã nguồn nó được sinh trên đó."""
+    return hashlib.sha256(f"{step['description']}\0{hashlib.sha256(base.encode('utf-8')).hexdigest()}".encode("utf-8")).hexdigest()
+
+def _verify_completed(plan_data: dict) -> set[str]:
+    """
+    Đối chiếu hash đầu ra đã ghi của từng đợt với tệp hiện tại. Nếu tệp trùng với
+    đầu ra của một đợt cũ hơn (ví dụ đã bị phục hồi), các đợt sau đó bị coi là chưa làm.
+    """
+    waves = plan_data.get("waves", [])
+    current = _file_sha256()
+    for i in range(len(waves) - 1, -1, -1):
+        if waves[i]["output_hash"] == current:
+            if i < len(waves) - 1:
+                logging.warning(f"Tệp đã quay về đầu ra của đợt {i + 1}; thực hiện lại {len(waves) - 1 - i} đợt sau đó.")
+            plan_data["waves"] = waves[:i + 1]
+            break
+    else:
+        if waves:
+            logging.warning("Tệp không khớp đầu ra của đợt nào (đã bị sửa ngoài kế hoạch); giữ nguyên các bước đã hoàn thành.")
+    return {sid for wave in plan_data.get("waves", []) for sid in wave["steps"]}
+
+def run_saved_plan(plan_data: dict):
+    """Thực thi (hoặc tiếp tục) một kế hoạch đã lưu, ghi checkpoint sau mỗi đợt."""
+    plan = plan_data["steps"]
+    done = _verify_completed(plan_data)
+    plan_data["completed"] = [s["id"] for s in plan if s["id"] in done]
+    plan_data["completed_steps"] = len(plan_data["completed"])
+    plan_data.setdefault("llm_cache", {})
+    save_json_file(PLAN_FILE, plan_data)
+    if done:
+        logging.info(f"Bỏ qua {len(done)}/{len(plan)} bước đã hoàn thành: {plan_data['completed']}")
+
+    def generate(step: dict) -> dict:
+        base = APP_FILE.read_text(encoding="utf-8")
+        key = _step_input_key(step, base)
+        with _plan_lock:
+            cached = plan_data["llm_cache"].get(key)
+        if cached:
+            # Đầu vào không đổi: dùng lại đầu ra LLM đã lưu thay vì gọi lại
+            logging.info(f"Dùng lại kết quả LLM đã lưu cho bước '{step['id']}'.")
+            metrics.inc("plan_step_cache_hits_total")
+            return {**cached, "base": base}
+        history = recent_history()
+        with metrics.span("plan_step_generate") as span:
+            span.set(step=step["id"])
+            change = generate_change(step["description"], history)
+        with _plan_lock:
+            plan_data["llm_cache"][_step_input_key(step, change["base"])] = {k: v for k, v in change.items() if k != "base"}
+            save_json_file(PLAN_FILE, plan_data)
+        return change
+
+    def _commit_wave(source: str, merged: list[tuple[dict, dict]]) -> bool:
+        # Kiểm tra cả đợt đã gộp một lần (biên dịch + test, có cache theo hash) trước khi ghi
+        with metrics.span("plan_test_gate"):
+            gate = test_gate.check(APP_FILE, source.encode("utf-8"))
+        if not gate["passed"]:
+            logging.critical(f"❌ Mã gộp của các bước {[s['id'] for s, _ in merged]} không qua test:\n{gate['output']}")
+            return False
+        step_started = time.time()
+        code_patch.atomic_write_text(APP_FILE, source)
+        for step, change in merged:
+            save_evolution_entry(f"Tự chủ ({step['id']}): {step['description']}", change["description"])
+        logging.info(f"✅ HOÀN THÀNH CÁC BƯỚC {[s['id'] for s, _ in merged]}. Đợi supervisor xác nhận phiên bản mới...")
+        with metrics.span("plan_health_wait"):
+            healthy = wait_for_healthy_version(step_started)
+        if not healthy:
+            logging.critical("❌ Phiên bản mới không chạy ổn định. Chế độ tự chủ sẽ tạm dừng.")
+            return False
+        # Checkpoint: hash của phiên bản đã được xác nhận (có thể đã được supervisor sửa)
+        with _plan_lock:
+            plan_data["waves"] = plan_data.get("waves", []) + [{"steps": [s["id"] for s, _ in merged], "output_hash": _file_sha256()}]
+            plan_data["completed"] = plan_data["completed"] + [s["id"] for s, _ in merged]
+            plan_data["completed_steps"] = len(plan_data["completed"])
+            save_json_file(PLAN_FILE, plan_data)
+        return True
+
+    def commit(source: str, merged: list[tuple[dict, dict]]) -> bool:
+        with metrics.span("plan_wave_commit") as span:
+            span.set(steps=[s["id"] for s, _ in merged])
+            ok = _commit_wave(source, merged)
+        metrics.inc("plan_steps_completed_total" if ok else "plan_steps_failed_total", len(merged))
+        return ok
+
+    read_base = lambda: APP_FILE.read_text(encoding="utf-8")
+    with metrics.span("plan_run"):
+        completed = plan_executor.run_plan(plan, generate, commit, done=done, max_concurrency=PLAN_MAX_CONCURRENCY,
+                                           read_base=read_base)
+    if completed:
+        logging.info("🎉 TẤT CẢ CÁC BƯỚC TRONG KẾ HOẠCH ĐÃ HOÀN THÀNH! MỤC TIÊU ĐẠT ĐƯỢC. 🎉")
+        PLAN_FILE.unlink(missing_ok=True) # Xóa file kế hoạch khi xong
+    else:
+        logging.error("Hệ thống tự sửa lỗi sẽ được kích hoạt bởi Supervisor nếu cần.")
+        logging.error("Chế độ tự chủ sẽ tạm dừng. Hãy sửa lỗi rồi chạy lại với --resume.")
+
 def execute_autonomous_goal(user_goal: str):
     """Thực hiện một mục tiêu lớn một cách tự chủ."""
     logging.info(f"--- BẮT ĐẦU CHẾ ĐỘ TỰ CHỦ VỚI MỤC TIÊU: {user_goal} ---")
     
-    # Bước 1: Gọi AI Planner để tạo kế hoạch
-    history = load_json_file(EVOLUTION_LOG_FILE)[-MAX_HISTORY_ENTRIES:]
+    # Bước 1: Gọi AI Planner để tạo kế hoạch (một DAG: mỗi bước khai báo các bước nó phụ thuộc)
+    history = recent_history()
     plan = invoke_planner_ai(user_goal, history)
     
     if not plan:
         logging.critical("Không thể tạo kế hoạch. Dừng chế độ tự chủ.")
         return
-        
-    save_json_file(PLAN_FILE, {"goal": user_goal, "steps": plan, "completed_steps": 0})
-    logging.info(f"Đã lưu kế hoạch vào '{PLAN_FILE}'.")
-    
-    # Bước 2: Thực thi từng bước trong kế hoạch
-    for i, step_data in enumerate(plan):
-        step_description = step_data.get("description")
-        logging.info(f"--- Đang thực hiện Bước {i+1}/{len(plan)}: {step_description} ---")
-        
-        try:
-            # Sử dụng hàm modify_application_code để thực hiện bước này
-            # Chúng ta coi mỗi bước là một "yêu cầu" cho Executor AI
-            history = load_json_file(EVOLUTION_LOG_FILE)[-MAX_HISTORY_ENTRIES:]
-            ai_change_desc = modify_application_code(step_description, history)
-            
-            # Ghi lại thành công của bước này vào nhật ký
-            save_evolution_entry(f"Tự chủ (Bước {i+1}): {step_description}", ai_change_desc)
-            
-            # Cập nhật tiến độ kế hoạch
-            plan_data = load_json_file(PLAN_FILE)
-            plan_data["completed_steps"] = i + 1
-            save_json_file(PLAN_FILE, plan_data)
-            
-            logging.info(f"✅ HOÀN THÀNH BƯỚC {i+1}. Đợi hệ thống ổn định...")
-            # Đợi một chút để supervisor khởi động lại và ổn định
-            time.sleep(10)
-
-        except Exception as e:
-            logging.critical(f"❌ LỖI KHI THỰC HIỆN BƯỚC {i+1}. Lỗi: {e}")
-            logging.error("Hệ thống tự sửa lỗi sẽ được kích hoạt bởi Supervisor.")
-            logging.error("Chế độ tự chủ sẽ tạm dừng. Hãy sửa lỗi và chạy lại.")
-            break # Dừng vòng lặp kế hoạch nếu có lỗi
-            
-    else: # Chỉ chạy khi vòng for hoàn thành không bị break
-        logging.info("🎉 TẤT CẢ CÁC BƯỚC TRONG KẾ HOẠCH ĐÃ HOÀN THÀNH! MỤC TIÊU ĐẠT ĐƯỢC. 🎉")
-        PLAN_FILE.unlink(missing_ok=True) # Xóa file kế hoạch khi xong
+    plan = plan_executor.normalize_plan(plan)
+    plan_data = {"goal": user_goal, "steps": plan, "completed_steps": 0, "completed": [], "waves": [], "llm_cache": {}}
+    save_json_file(PLAN_FILE, plan_data)
+    logging.info(f"Đã lưu kế hoạch vào '{PLAN_FILE}' ({len(plan)} bước, "
+                 f"đường găng {plan_executor.critical_path_length(plan)} đợt).")
+
+    # Bước 2: Thực thi kế hoạch theo từng đợt song song
+    run_saved_plan(plan_data)
+
+def resume_autonomous_goal():
+    """Tiếp tục kế hoạch đã lưu trong plan.json mà không gọi lại Planner."""
+    plan_data = load_json_file(PLAN_FILE)
+    if not plan_data or not isinstance(plan_data, dict) or not plan_data.get("steps"):
+        logging.critical(f"Không tìm thấy kế hoạch đã lưu trong '{PLAN_FILE}'.")
+        return
+    logging.info(f"--- TIẾP TỤC CHẾ ĐỘ TỰ CHỦ VỚI MỤC TIÊU: {plan_data.get('goal')} ---")
+    # Kế hoạch cũ (tuần tự) chỉ ghi completed_steps: coi các bước đầu tiên đó là đã xong
+    steps = plan_executor.normalize_plan(plan_data["steps"])
+    if "waves" not in plan_data and plan_data.get("completed_steps"):
+        plan_data["waves"] = [{"steps": [s["id"] for s in steps[:plan_data["completed_steps"]]], "output_hash": _file_sha256()}]
+    plan_data["steps"] = steps
+    run_saved_plan(plan_data)
 
 
 def main():
     """Hàm chính điều phối, hỗ trợ chế độ thủ công và tự chủ."""
+    metrics.configure("orchestrator")
     if len(sys.argv) < 2:
         print("Sử dụng:")
         print("  - Chế độ thủ công: python app/orchestrator.py \"Yêu cầu cụ thể\"")
         print("  - Chế độ tự chủ:   python app/orchestrator.py --goal \"Mục tiêu lớn của bạn\"")
+        print("  - Tiếp tục kế hoạch đã lưu: python app/orchestrator.py --resume")
         sys.exit(1)
         
-    if sys.argv[1] == '--goal':
+    if sys.argv[1] == '--resume':
+        resume_autonomous_goal()
+    elif sys.argv[1] == '--goal':
         if len(sys.argv) < 3:
             print("Lỗi: Vui lòng cung cấp mục tiêu sau --goal.")
             sys.exit(1)
@@ -114,10 +252,14 @@ def main():
         user_request = " ".join(sys.argv[1:])
         execute_manual_request(user_request)
 
-# trigger_self_correction giữ nguyên
-def trigger_self_correction(error_message: str):
-    logging.info("Đã nhận tín hiệu tự sửa lỗi từ Supervisor.")
-    fix_application_code(error_message)
+def trigger_self_correction(error_message: str, app_file: Path = APP_FILE):
+    logging.info(f"Đã nhận tín hiệu tự sửa lỗi từ Supervisor cho '{app_file}'.")
+    if FIX_CANDIDATES > 1:
+        with metrics.span("self_correction", strategy="speculative"):
+            speculative_fix(error_message, FIX_CANDIDATES, app_file=app_file)
+    else:
+        with metrics.span("self_correction", strategy="single"):
+            fix_application_code(error_message, app_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
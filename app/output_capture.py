@@ -0,0 +1,161 @@
+# app/output_capture.py
+import sys
+import codecs
+import asyncio
+import threading
+import logging
+from pathlib import Path
+
+from log_setup import CompressedRotatingFileHandler
+
+# --- Cấu hình ---
+READ_CHUNK_SIZE = 8192
+DEFAULT_BUFFER_BYTES = 64 * 1024  # Dung lượng tối đa giữ lại cho mỗi luồng
+TEE_MAX_BYTES = 5 * 1024 * 1024  # Kích thước tối đa của một tệp log trước khi xoay vòng
+TEE_BACKUP_COUNT = 3
+
+
+class RingBuffer:
+    """Bộ đệm vòng theo byte, an toàn luồng. Bộ nhớ không vượt quá `capacity`."""
+
+    def __init__(self, capacity: int = DEFAULT_BUFFER_BYTES):
+        self.capacity = capacity
+        self.total_bytes = 0  # Tổng số byte đã từng ghi (kể cả phần đã bị đẩy ra)
+        self._buf = bytearray()
+        self._lock = threading.Lock()
+
+    def write(self, data: bytes):
+        with self._lock:
+            self.total_bytes += len(data)
+            if len(data) >= self.capacity:
+                self._buf[:] = data[-self.capacity:]
+                return
+            self._buf += data
+            overflow = len(self._buf) - self.capacity
+            if overflow > 0:
+                del self._buf[:overflow]
+
+    def tail(self, max_bytes: int | None = None) -> str:
+        """Trả về tối đa `max_bytes` byte cuối cùng dưới dạng văn bản."""
+        with self._lock:
+            data = bytes(self._buf if max_bytes is None else self._buf[-max_bytes:])
+        return data.decode("utf-8", errors="replace")
+
+
+def _make_tee_logger(tee_file: Path) -> logging.Logger:
+    """Logger riêng ghi nguyên văn đầu ra tiến trình con vào tệp log xoay vòng (tệp cũ được nén)."""
+    logger = logging.getLogger(f"output_capture.{tee_file}")
+    if not logger.handlers:
+        tee_file.parent.mkdir(parents=True, exist_ok=True)
+        handler = CompressedRotatingFileHandler(tee_file, max_bytes=TEE_MAX_BYTES, backup_count=TEE_BACKUP_COUNT)
+        handler.terminator = ""
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def _utf8_decoder():
+    return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+class _CapturedStreams:
+    """Phần chung của hai cách đọc đầu ra: bộ đệm vòng cho từng luồng và tệp log (tùy chọn)."""
+
+    def __init__(self, buffer_bytes: int, tee_file: Path | None):
+        self.stdout = RingBuffer(buffer_bytes)
+        self.stderr = RingBuffer(buffer_bytes)
+        self._tee = _make_tee_logger(Path(tee_file)) if tee_file else None
+
+    def error_tail(self, max_bytes: int) -> str:
+        """Phần cuối của stderr, dùng làm ngữ cảnh lỗi cho AI sửa lỗi."""
+        tail = self.stderr.tail(max_bytes)
+        if self.stderr.total_bytes > max_bytes:
+            return f"[... đã lược bỏ {self.stderr.total_bytes - max_bytes} byte đầu ...]\n{tail}"
+        return tail
+
+    def _emit(self, decoder, chunk: bytes, echo=None, final: bool = False):
+        """
+        Ghi phần văn bản của `chunk` ra tệp log và terminal. Mỗi luồng có bộ giải mã
+        tăng dần riêng: ký tự UTF-8 nhiều byte bị cắt giữa hai lần đọc được ghép lại
+        ở lần sau thay vì thành ký tự thay thế.
+        """
+        text = decoder.decode(chunk, final)
+        if not text:
+            return
+        if self._tee:
+            self._tee.info(text)
+        if echo:
+            echo.write(text)
+            echo.flush()
+
+
+class OutputCapture(_CapturedStreams):
+    """
+    Đọc stdout/stderr của một tiến trình con trong các luồng nền để pipe không
+    bao giờ bị đầy. Mỗi luồng được giữ trong một RingBuffer, có thể ghi kèm vào
+    tệp log xoay vòng và (tùy chọn) hiển thị lại stdout trên terminal.
+    """
+
+    def __init__(self, process, buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+                 tee_file: Path | None = None, echo_stdout: bool = True):
+        super().__init__(buffer_bytes, tee_file)
+        self._threads = []
+        for stream, buffer, echo in (
+            (process.stdout, self.stdout, sys.stdout if echo_stdout else None),
+            (process.stderr, self.stderr, None),
+        ):
+            if stream is None:
+                continue
+            t = threading.Thread(target=self._pump, args=(stream, buffer, echo), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _pump(self, stream, buffer: RingBuffer, echo):
+        decoder = _utf8_decoder()
+        try:
+            read = getattr(stream, "read1", stream.read)
+            while chunk := read(READ_CHUNK_SIZE):
+                buffer.write(chunk)
+                self._emit(decoder, chunk, echo)
+            self._emit(decoder, b"", echo, final=True)  # Byte dở dang ở cuối luồng
+        except (OSError, ValueError) as e:
+            logging.debug(f"Ngừng đọc đầu ra tiến trình con: {e}")
+        finally:
+            stream.close()
+
+    def join(self, timeout: float | None = None):
+        """Chờ các luồng đọc kết thúc (sau khi tiến trình con đóng pipe)."""
+        for t in self._threads:
+            t.join(timeout)
+
+
+class AsyncOutputCapture(_CapturedStreams):
+    """
+    Như OutputCapture cho tiến trình tạo bằng asyncio.create_subprocess_exec: các
+    luồng đầu ra được đọc bởi task trên vòng lặp sự kiện thay vì hai luồng hệ điều
+    hành cho mỗi tiến trình. Không hiển thị lại stdout (đầu ra của nhiều ứng dụng
+    sẽ bị trộn lẫn trên terminal).
+    """
+
+    def __init__(self, process, buffer_bytes: int = DEFAULT_BUFFER_BYTES, tee_file: Path | None = None):
+        super().__init__(buffer_bytes, tee_file)
+        self._tasks = [asyncio.ensure_future(self._pump(stream, buffer))
+                       for stream, buffer in ((process.stdout, self.stdout), (process.stderr, self.stderr))
+                       if stream is not None]
+
+    async def _pump(self, stream: asyncio.StreamReader, buffer: RingBuffer):
+        decoder = _utf8_decoder()
+        try:
+            while chunk := await stream.read(READ_CHUNK_SIZE):
+                buffer.write(chunk)
+                self._emit(decoder, chunk)
+            self._emit(decoder, b"", final=True)
+        except (OSError, ValueError) as e:
+            logging.debug(f"Ngừng đọc đầu ra tiến trình con: {e}")
+
+    async def join(self, timeout: float | None = None):
+        """Chờ đọc hết đầu ra (sau khi tiến trình con đóng pipe)."""
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
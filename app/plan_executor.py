@@ -0,0 +1,170 @@
+# app/plan_executor.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import code_patch
+
+# --- Cấu hình ---
+DEFAULT_MAX_CONCURRENCY = 3  # Số lời gọi LLM sinh mã chạy đồng thời trong một đợt
+
+
+def normalize_plan(steps: list[dict]) -> list[dict]:
+    """
+    Chuẩn hóa kế hoạch của Planner thành một DAG: mỗi bước có "id" và
+    "depends_on". Bước không khai báo "depends_on" được coi là phụ thuộc vào bước
+    liền trước (giữ hành vi tuần tự cũ). Phụ thuộc không tồn tại bị bỏ qua; nếu
+    có chu trình thì quay về thứ tự tuần tự.
+    """
+    normalized = []
+    seen_ids = set()
+    for i, step in enumerate(steps):
+        step_id = str(step.get("id") or f"step-{i + 1}")
+        if step_id in seen_ids:
+            step_id = f"{step_id}-{i + 1}"
+        seen_ids.add(step_id)
+        normalized.append({**step, "id": step_id})
+
+    ids = [s["id"] for s in normalized]
+    for i, step in enumerate(normalized):
+        if "depends_on" not in step or step["depends_on"] is None:
+            deps = [ids[i - 1]] if i else []
+        else:
+            raw = step["depends_on"] if isinstance(step["depends_on"], list) else [step["depends_on"]]
+            deps = [str(d) for d in raw]
+            unknown = [d for d in deps if d not in ids or d == step["id"]]
+            if unknown:
+                logging.warning(f"Bước '{step['id']}' phụ thuộc vào bước không tồn tại {unknown}; bỏ qua.")
+            deps = [d for d in deps if d not in unknown]
+        step["depends_on"] = deps
+
+    if _has_cycle(normalized):
+        logging.warning("Kế hoạch có phụ thuộc vòng; thực hiện tuần tự theo thứ tự đã liệt kê.")
+        for i, step in enumerate(normalized):
+            step["depends_on"] = [ids[i - 1]] if i else []
+    return normalized
+
+
+def _has_cycle(steps: list[dict]) -> bool:
+    remaining = {s["id"]: set(s["depends_on"]) for s in steps}
+    while remaining:
+        ready = [sid for sid, deps in remaining.items() if not deps & remaining.keys()]
+        if not ready:
+            return True
+        for sid in ready:
+            del remaining[sid]
+    return False
+
+
+def critical_path_length(steps: list[dict]) -> int:
+    """Số đợt tối thiểu cần để hoàn thành kế hoạch (độ dài đường găng)."""
+    depth = {}
+    for step in steps:  # normalize_plan đảm bảo không có chu trình; tính đệ quy có nhớ
+        _depth(step["id"], {s["id"]: s for s in steps}, depth)
+    return max(depth.values(), default=0)
+
+
+def _depth(step_id: str, by_id: dict, memo: dict) -> int:
+    if step_id not in memo:
+        memo[step_id] = 1 + max((_depth(d, by_id, memo) for d in by_id[step_id]["depends_on"]), default=0)
+    return memo[step_id]
+
+
+def _touched_symbols(change: dict) -> set[str]:
+    """Các ký hiệu cấp cao nhất mà thay đổi thay thế hoặc xóa theo tên."""
+    edits = change.get("edits")
+    if not isinstance(edits, list):
+        return set()  # Sai dạng: build_new_source sẽ ném PatchError khi gộp
+    return {str(edit.get("name", "")).split(".")[0] for edit in edits
+            if isinstance(edit, dict) and edit.get("type") in ("replace_symbol", "delete_symbol")}
+
+
+def merge_changes(base: str, changes: list[tuple[dict, dict]]) -> tuple[str, list[tuple[dict, dict]], list[dict]]:
+    """
+    Gộp các thay đổi được sinh song song trên cùng mã `base`. Thay đổi xung đột
+    (sửa cùng ký hiệu, viết lại toàn bộ tệp, hoặc không áp dụng được lên kết quả
+    đã gộp) bị hoãn sang đợt sau để được sinh lại trên mã mới.
+    Trả về (mã đã gộp, các (bước, thay đổi) đã gộp, các bước bị hoãn).
+    """
+    source = base
+    merged: list[tuple[dict, dict]] = []
+    deferred: list[dict] = []
+    claimed: set[str] = set()
+    full_merged = False
+    for step, change in changes:
+        touched = _touched_symbols(change)
+        is_full = not change.get("edits") and not change.get("patch")
+        # Diff tự bảo vệ bằng các dòng ngữ cảnh; chỉ viết lại toàn bộ tệp và sửa trùng ký hiệu là xung đột chắc chắn
+        if merged and (is_full or full_merged or touched & claimed):
+            deferred.append(step)
+            continue
+        try:
+            new_source, _ = code_patch.build_new_source(source, change)
+            code_patch.validate_source(new_source)
+        except code_patch.PatchError as e:
+            if not merged:
+                raise
+            logging.warning(f"Không gộp được bước '{step['id']}' ({e}); sẽ sinh lại ở đợt sau.")
+            deferred.append(step)
+            continue
+        source = new_source
+        merged.append((step, change))
+        claimed |= touched
+        full_merged = full_merged or is_full
+    return source, merged, deferred
+
+
+def run_plan(steps: list[dict], generate, commit, done: set[str] | None = None,
+             max_concurrency: int = DEFAULT_MAX_CONCURRENCY, read_base=None) -> bool:
+    """
+    Thực thi kế hoạch theo từng đợt: mọi bước đã đủ phụ thuộc được sinh đồng thời
+    (`generate(step) -> thay đổi`, tối đa `max_concurrency` lời gọi), gộp lại, rồi
+    `commit(source, merged) -> bool` kiểm tra và ghi cả đợt một lần. Tổng thời gian
+    tỉ lệ với độ dài đường găng thay vì tổng số bước. Trả về True khi hoàn thành.
+    """
+    done = set(done or ())
+    pending = [s for s in steps if s["id"] not in done]
+    retried: set[str] = set()
+    wave = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="plan-step") as pool:
+        while pending:
+            ready = [s for s in pending if all(d in done for d in s["depends_on"])]
+            if not ready:
+                logging.critical("Không còn bước nào đủ điều kiện thực hiện; kế hoạch bị kẹt.")
+                return False
+            # Bước bị hoãn ở đợt trước được xếp đầu để chắc chắn được gộp
+            ready.sort(key=lambda s: s["id"] not in retried)
+            wave += 1
+            logging.info(f"--- Đợt {wave}: sinh song song {len(ready)} bước: {[s['id'] for s in ready]} ---")
+            futures = [(step, pool.submit(generate, step)) for step in ready]
+            changes, failed = [], []
+            for step, future in futures:
+                try:
+                    changes.append((step, future.result()))
+                except Exception as e:
+                    logging.critical(f"❌ LỖI KHI SINH BƯỚC '{step['id']}'. Lỗi: {e}")
+                    failed.append(step)
+            if not changes:
+                return False
+            base = read_base() if read_base else changes[0][1]["base"]
+            # Chỉ gộp những thay đổi được sinh trên đúng mã nguồn hiện tại (tệp có thể vừa được supervisor sửa)
+            stale = [step for step, change in changes if change.get("base", base) != base]
+            changes = [(step, change) for step, change in changes if change.get("base", base) == base]
+            if not changes:
+                logging.critical("Mã nguồn đã thay đổi trong lúc sinh các bước; dừng để tránh ghi đè.")
+                return False
+            try:
+                source, merged, deferred = merge_changes(base, changes)
+            except code_patch.PatchError as e:
+                logging.critical(f"❌ Không áp dụng được thay đổi của bước '{changes[0][0]['id']}'. Lỗi: {e}")
+                return False
+            deferred += stale
+            if deferred:
+                logging.info(f"Hoãn sang đợt sau (sinh lại trên mã đã gộp): {[s['id'] for s in deferred]}")
+            if not commit(source, merged):
+                return False
+            done.update(step["id"] for step, _ in merged)
+            retried = {s["id"] for s in deferred}
+            pending = [s for s in pending if s["id"] not in done]
+            if failed:
+                return False
+    return True
@@ -0,0 +1,153 @@
+# app/prefork.py
+import json
+import time
+import socket
+import logging
+from pathlib import Path
+
+# --- Cấu hình mặc định ---
+DEFAULT_RESTART_BACKOFF = 1.0  # Thời gian chờ sau lần khởi động lại thất bại đầu tiên (giây), nhân đôi mỗi lần
+DEFAULT_RESTART_BACKOFF_MAX = 60.0
+
+
+def create_listen_socket(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """Tạo socket lắng nghe dùng chung, có thể kế thừa bởi các tiến trình worker."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerPool:
+    """
+    Quản lý N tiến trình worker cùng chấp nhận kết nối trên một socket.
+
+    `spawn(slot)` khởi chạy worker cho ô `slot` và trả về một đối tượng có
+    thuộc tính `process`; `stop(process)` dừng nó; `wait_ready(instance)` trả
+    về True khi worker mới đã sẵn sàng phục vụ.
+
+    Mỗi ô đếm số lần khởi động lại thất bại liên tiếp với cùng một phiên bản
+    (`failures`) và chỉ được thử lại sau `backoff * 2**(failures-1)` giây.
+    """
+
+    def __init__(self, size: int, spawn, stop, wait_ready, status_file: Path | None = None,
+                 backoff: float = DEFAULT_RESTART_BACKOFF, backoff_max: float = DEFAULT_RESTART_BACKOFF_MAX):
+        self.size = size
+        self.spawn = spawn
+        self.stop = stop
+        self.wait_ready = wait_ready
+        self.status_file = Path(status_file) if status_file else None
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.workers: dict[int, object] = {}
+        self.status: dict[int, dict] = {
+            slot: {"pid": None, "state": "stopped", "version": None, "started_at": None, "restarts": 0,
+                   "failures": 0, "retry_at": None}
+            for slot in range(size)
+        }
+
+    def _launch(self, slot: int, version: str | None):
+        instance = self.spawn(slot)
+        self.workers[slot] = instance
+        self.status[slot].update(pid=instance.process.pid, state="starting", version=version, started_at=time.time())
+        return instance
+
+    def start_all(self, version: str | None = None):
+        for slot in range(self.size):
+            self._launch(slot, version)
+        for slot, instance in list(self.workers.items()):
+            self.status[slot]["state"] = "running" if self.wait_ready(instance) else "crashed"
+        self.write_status()
+
+    def alive_count(self) -> int:
+        return sum(1 for w in self.workers.values() if w.process.poll() is None)
+
+    def reap(self) -> list[tuple[int, object]]:
+        """Trả về các worker đã thoát (slot, instance) và đánh dấu trạng thái của chúng."""
+        dead = []
+        for slot, instance in list(self.workers.items()):
+            if instance.process.poll() is not None and self.status[slot]["state"] != "exited":
+                self.status[slot].update(state="exited", exit_code=instance.process.returncode)
+                dead.append((slot, instance))
+        if dead:
+            self.write_status()
+        return dead
+
+    def failed_slots(self) -> list[int]:
+        """Các ô có worker đã thoát hoặc khởi động lại thất bại và đã hết thời gian chờ backoff."""
+        now = time.time()
+        return [slot for slot, st in self.status.items()
+                if st["state"] in ("exited", "crashed") and (st["retry_at"] is None or st["retry_at"] <= now)]
+
+    def restart(self, slot: int, version: str | None = None) -> bool:
+        """Khởi động lại một worker đã chết; chờ nó sẵn sàng trước khi trả về."""
+        st = self.status[slot]
+        # Chỉ tính các lần thất bại liên tiếp của cùng một phiên bản
+        previous_failures = st["failures"] if st["version"] == version else 0
+        st["restarts"] += 1
+        instance = self._launch(slot, version)
+        ready = self.wait_ready(instance)
+        if ready:
+            st.update(state="running", failures=0, retry_at=None)
+        else:
+            failures = previous_failures + 1
+            delay = min(self.backoff * 2 ** (failures - 1), self.backoff_max)
+            st.update(state="crashed", failures=failures, retry_at=time.time() + delay)
+        self.write_status()
+        logging.info(f"Worker {slot} (PID {instance.process.pid}) khởi động lại: {'OK' if ready else 'THẤT BẠI'}.")
+        return ready
+
+    def reset_failures(self):
+        """Xóa bộ đếm thất bại và backoff của mọi ô (sau khi mã nguồn đã được sửa/phục hồi)."""
+        for st in self.status.values():
+            st.update(failures=0, retry_at=None)
+        self.write_status()
+
+    def rolling_reload(self, version: str | None = None):
+        """
+        Thay lần lượt từng worker bằng phiên bản mới: khởi chạy worker mới,
+        chờ sẵn sàng rồi mới dừng worker cũ. Dừng lại ở worker mới đầu tiên
+        không khởi động được và trả về nó (các worker cũ còn lại vẫn phục vụ);
+        trả về None nếu thành công.
+        """
+        for slot in range(self.size):
+            old = self.workers.get(slot)
+            old_status = dict(self.status[slot])
+            new = self._launch(slot, version)
+            try:
+                ready = self.wait_ready(new)
+            except BaseException:
+                # Bị ngắt khi đang chờ: worker cũ không còn trong self.workers nên stop_all sẽ bỏ sót nó
+                if old:
+                    self.stop(old.process)
+                raise
+            if not ready:
+                self.stop(new.process)
+                self.workers[slot] = old
+                self.status[slot] = old_status
+                self.write_status()
+                logging.error(f"Rolling reload dừng tại worker {slot}: phiên bản mới không khởi động được.")
+                return new
+            self.status[slot]["state"] = "running"
+            if old:
+                self.stop(old.process)
+            self.write_status()
+            logging.info(f"Rolling reload: worker {slot} đã chuyển sang phiên bản mới (PID {new.process.pid}).")
+        return None
+
+    def stop_all(self):
+        for slot, instance in self.workers.items():
+            self.stop(instance.process)
+            self.status[slot]["state"] = "stopped"
+        self.write_status()
+
+    def write_status(self):
+        """Ghi trạng thái từng worker ra tệp JSON để theo dõi từ bên ngoài."""
+        if not self.status_file:
+            return
+        snapshot = {"updated_at": time.time(), "workers": self.status}
+        tmp = self.status_file.with_name(f".{self.status_file.name}.tmp")
+        tmp.write_text(json.dumps(snapshot, indent=2), encoding="utf-8")
+        tmp.replace(self.status_file)
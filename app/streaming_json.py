@@ -0,0 +1,188 @@
+# app/streaming_json.py
+import json
+
+# Giới hạn kích thước phản hồi để không giữ mãi một luồng hỏng
+DEFAULT_MAX_CHARS = 2_000_000
+_IN_TOKEN = ("in_key", "in_value", "in_literal")
+
+
+class StreamAbort(ValueError):
+    """Phản hồi đang stream chắc chắn không phải envelope JSON hợp lệ."""
+
+
+class EnvelopeParser:
+    """
+    Bộ phân tích tăng dần cho một đối tượng JSON cấp cao nhất (có thể được bọc
+    trong ```json ... ```), nhận từng mảnh văn bản khi chúng đến.
+
+    - Ném StreamAbort ngay khi cấu trúc chắc chắn sai: ký tự đầu tiên không phải
+      '{', khóa không phải chuỗi, thiếu ':'/',', khóa lạ (khi `allowed_keys` được
+      đặt), hoặc phản hồi quá dài.
+    - Gọi `on_field(key, value)` ngay khi giá trị của một khóa cấp cao nhất hoàn
+      tất, trước khi phần còn lại của phản hồi tới.
+
+    Mỗi mảnh chỉ được quét một lần: sau khi đã gặp '{', `_buf` chỉ giữ mảnh hiện
+    tại và phần đầu của token đang dở được gom trong `_token_parts`, nên tổng chi
+    phí tuyến tính theo độ dài phản hồi.
+    """
+
+    def __init__(self, allowed_keys: set[str] | None = None, on_field=None, max_chars: int = DEFAULT_MAX_CHARS):
+        self.allowed_keys = allowed_keys
+        self.on_field = on_field
+        self.max_chars = max_chars
+        self.fields: dict = {}
+        self.done = False
+        self._chunks: list[str] = []  # Toàn bộ văn bản đã nhận, chỉ ghép lại khi đọc `text`
+        self._length = 0
+        self._buf = ""  # Mảnh đang quét (trước '{': toàn bộ phần mở đầu)
+        self._offset = 0  # Vị trí của _buf[0] trong toàn bộ phản hồi, dùng cho thông báo lỗi
+        self._pos = 0
+        self._token_parts: list[str] = []  # Phần của token đang dở nằm ở các mảnh trước
+        self._started = False  # Đã gặp '{' mở đầu
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._expect = "key"
+        self._key = None
+        self._token_start = 0
+
+    @property
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str):
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        if self._length > self.max_chars:
+            raise StreamAbort(f"Phản hồi vượt quá {self.max_chars} ký tự.")
+        if self._started:
+            self._offset += len(self._buf)
+            self._buf, self._pos = chunk, 0
+        else:
+            self._buf += chunk  # Phần mở đầu (khoảng trắng, hàng rào ```json) luôn ngắn
+            if not self._skip_prefix():
+                return
+        self._scan()
+
+    def close(self) -> dict:
+        """Kết thúc luồng; trả về các trường đã phân tích hoặc ném StreamAbort nếu chưa đủ."""
+        if not self.done:
+            raise StreamAbort("Phản hồi kết thúc khi đối tượng JSON chưa đóng.")
+        return self.fields
+
+    # --- Nội bộ ---
+    def _skip_prefix(self) -> bool:
+        """Bỏ qua khoảng trắng và hàng rào ```json; trả về True khi đã gặp '{'."""
+        i = self._pos
+        buf = self._buf
+        while i < len(buf):
+            ch = buf[i]
+            if ch.isspace():
+                i += 1
+            elif buf.startswith("```", i) or "```".startswith(buf[i:]):
+                newline = buf.find("\n", i)
+                if newline < 0:
+                    self._pos = i
+                    return False  # Chờ hết dòng mở hàng rào
+                i = newline + 1
+            elif ch == "{":
+                self._started = True
+                self._depth = 1
+                self._pos = i + 1
+                return True
+            else:
+                raise StreamAbort(f"Phản hồi không bắt đầu bằng đối tượng JSON (gặp {ch!r}).")
+        self._pos = i
+        return False
+
+    def _token(self, end: int) -> str:
+        """Văn bản của token kết thúc tại `end` trong mảnh hiện tại (kể cả phần ở các mảnh trước)."""
+        raw = "".join(self._token_parts) + self._buf[self._token_start:end]
+        self._token_parts = []
+        return raw
+
+    def _complete_value(self, end: int):
+        raw = self._token(end)
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise StreamAbort(f"Giá trị của khóa '{self._key}' không hợp lệ: {e}") from e
+        self.fields[self._key] = value
+        self._expect = "comma_or_end"
+        if self.on_field:
+            self.on_field(self._key, value)
+
+    def _scan(self):
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.done:
+                if not ch.isspace() and ch != "`":
+                    raise StreamAbort("Có nội dung thừa sau đối tượng JSON.")
+                i += 1
+                continue
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        if self._expect == "in_key":
+                            self._key = json.loads(self._token(i + 1))
+                            if self.allowed_keys is not None and self._key not in self.allowed_keys:
+                                raise StreamAbort(f"Khóa không mong đợi: '{self._key}'.")
+                            self._expect = "colon"
+                        elif self._expect == "in_value":
+                            self._complete_value(i + 1)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_str = True
+                if self._depth == 1:
+                    if self._expect == "key":
+                        self._expect, self._token_start = "in_key", i
+                    elif self._expect == "value":
+                        self._expect, self._token_start = "in_value", i
+                    else:
+                        raise StreamAbort(f"Chuỗi không mong đợi ở vị trí {self._offset + i}.")
+            elif ch in "{[":
+                if self._depth == 1:
+                    if self._expect != "value":
+                        raise StreamAbort(f"Ký tự {ch!r} không mong đợi ở vị trí {self._offset + i}.")
+                    self._expect, self._token_start = "in_value", i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 1:
+                    if ch != "}" or self._expect not in ("key", "comma_or_end", "in_literal"):
+                        raise StreamAbort(f"Đóng đối tượng không hợp lệ ở vị trí {self._offset + i}.")
+                    if self._expect == "in_literal":
+                        self._complete_value(i)
+                    self._depth = 0
+                    self.done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 1 and self._expect == "in_value":
+                        self._complete_value(i + 1)
+            elif self._depth == 1 and not ch.isspace():
+                if self._expect == "colon" and ch == ":":
+                    self._expect = "value"
+                elif self._expect in ("comma_or_end", "in_literal") and ch == ",":
+                    if self._expect == "in_literal":
+                        self._complete_value(i)
+                    self._expect = "key"
+                elif self._expect == "value":
+                    self._expect, self._token_start = "in_literal", i
+                elif self._expect != "in_literal":
+                    raise StreamAbort(f"Ký tự {ch!r} không mong đợi ở vị trí {self._offset + i}.")
+            i += 1
+        self._pos = i
+        if self._expect in _IN_TOKEN and not self.done:
+            # Token chưa kết thúc trong mảnh này: giữ phần đã có, mảnh sau tiếp tục từ đầu
+            self._token_parts.append(buf[self._token_start:])
+            self._token_start = 0
@@ -0,0 +1,129 @@
+# app/test_gate.py
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Cấu hình ---
+TEST_CACHE_FILE = Path("app/logs/test_cache.json")
+TEST_TIMEOUT = 120  # Thời gian tối đa cho một nhóm test (giây)
+MAX_PARALLEL = os.cpu_count() or 2
+MAX_CACHE_ENTRIES = 200
+
+_cache_lock = threading.Lock()  # Nhiều luồng (ví dụ supervisor quản lý nhiều ứng dụng) cùng ghi cache
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def discover_test_classes(source: str) -> list[str]:
+    """Tìm các lớp unittest.TestCase có ít nhất một phương thức test_* bằng ast (không import)."""
+    classes = []
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [ast.unparse(b) for b in node.bases]
+        if not any(b.endswith("TestCase") for b in bases):
+            continue
+        if any(isinstance(n, ast.FunctionDef) and n.name.startswith("test") for n in node.body):
+            classes.append(node.name)
+    return classes
+
+
+def _run_in_sandbox(app_file: Path, source: bytes, test_id: str, timeout: float) -> dict:
+    """Chạy một nhóm test trong thư mục tạm riêng để không chạm vào thư mục làm việc thật."""
+    with tempfile.TemporaryDirectory(prefix="test_gate_") as scratch:
+        (Path(scratch) / app_file.name).write_bytes(source)
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(app_file.parent.resolve()), os.environ.get("PYTHONPATH")]))}
+        env.pop("APP_LISTEN_FD", None)
+        started = time.monotonic()
+        try:
+            result = subprocess.run(
+                [sys.executable, "-m", "unittest", f"{app_file.stem}.{test_id}"],
+                cwd=scratch, env=env, capture_output=True, text=True, timeout=timeout,
+            )
+            passed, output = result.returncode == 0, result.stderr[-4000:]
+        except subprocess.TimeoutExpired:
+            passed, output = False, f"Quá thời gian {timeout}s khi chạy {test_id}."
+        return {"test": test_id, "passed": passed, "duration": time.monotonic() - started, "output": output}
+
+
+def run_tests(app_file: Path, source: bytes | None = None, timeout: float = TEST_TIMEOUT) -> dict:
+    """
+    Chạy song song từng lớp test của `app_file` (hoặc của nội dung `source` nếu
+    được truyền vào), mỗi lớp trong một thư mục tạm riêng.
+    """
+    app_file = Path(app_file)
+    source = app_file.read_bytes() if source is None else source
+    started = time.monotonic()
+    try:
+        test_classes = discover_test_classes(source.decode("utf-8"))
+    except SyntaxError as e:
+        return {"passed": False, "duration": 0.0, "results": [], "output": f"SyntaxError: {e}"}
+    if not test_classes:
+        return {"passed": True, "duration": 0.0, "results": [], "output": ""}
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(test_classes))) as pool:
+        results = list(pool.map(lambda t: _run_in_sandbox(app_file, source, t, timeout), test_classes))
+    failures = [r for r in results if not r["passed"]]
+    return {
+        "passed": not failures,
+        "duration": time.monotonic() - started,
+        "results": results,
+        "output": "\n".join(r["output"] for r in failures),
+    }
+
+
+def _load_cache() -> dict:
+    try:
+        return json.loads(TEST_CACHE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_cache(cache: dict):
+    entries = sorted(cache.items(), key=lambda kv: kv[1]["timestamp"])[-MAX_CACHE_ENTRIES:]
+    TEST_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    # Tên tệp tạm riêng cho từng tiến trình/luồng: supervisor và orchestrator cùng ghi cache này
+    tmp = TEST_CACHE_FILE.with_name(f".{TEST_CACHE_FILE.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(json.dumps(dict(entries), indent=2), encoding="utf-8")
+        tmp.replace(TEST_CACHE_FILE)
+    finally:
+        tmp.unlink(missing_ok=True)  # Chỉ còn tồn tại nếu ghi thất bại
+
+
+def check(app_file: Path, source: bytes | None = None) -> dict:
+    """
+    Cổng test có cache: nếu đúng nội dung này (theo SHA-256) đã từng qua test thì
+    trả về ngay, nếu không thì chạy test và chỉ ghi nhớ kết quả khi đạt.
+    Truyền `source` để kiểm tra một nội dung chưa được ghi ra `app_file`.
+    """
+    source = Path(app_file).read_bytes() if source is None else source
+    file_hash = _sha256(source)
+    cache = _load_cache()
+    if file_hash in cache:
+        return {**cache[file_hash], "cached": True}
+
+    result = run_tests(app_file, source)
+    logging.info(f"Test gate cho {file_hash[:12]}: {'ĐẠT' if result['passed'] else 'KHÔNG ĐẠT'} ({result['duration']:.2f}s).")
+    if result["passed"]:
+        with _cache_lock:
+            # Đọc lại: cache có thể đã được luồng khác cập nhật trong lúc chạy test
+            cache = _load_cache()
+            cache[file_hash] = {"passed": True, "timestamp": time.time(), "duration": result["duration"]}
+            try:
+                _save_cache(cache)
+            except OSError as e:
+                # Cache chỉ giúp tăng tốc: lỗi ghi không được làm dừng supervisor
+                logging.warning(f"Không ghi được cache test '{TEST_CACHE_FILE}': {e}")
+    return {**result, "cached": False}
@@ -0,0 +1,116 @@
+# app/traffic_proxy.py
+import socket
+import logging
+import threading
+import time
+from collections import Counter
+
+# --- Cấu hình ---
+BUFFER_SIZE = 64 * 1024
+CONNECT_TIMEOUT = 5.0
+DRAIN_POLL_INTERVAL = 0.1
+
+
+class TrafficProxy:
+    """
+    Proxy TCP đơn giản đứng trước cổng công khai. Mỗi kết nối mới được chuyển
+    tới backend đang hoạt động; `switch_to` đổi backend một cách nguyên tử mà
+    không cắt các kết nối đang phục vụ, và `wait_drained` chờ backend cũ rảnh.
+    """
+
+    def __init__(self, listen_port: int, host: str = "127.0.0.1"):
+        self.host = host
+        self.listen_port = listen_port
+        self._backend_port: int | None = None
+        self._active = Counter()
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+        self._closed = threading.Event()
+
+    @property
+    def backend_port(self) -> int | None:
+        return self._backend_port
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.listen_port))
+        self._sock.listen(128)
+        threading.Thread(target=self._accept_loop, name="proxy-accept", daemon=True).start()
+        logging.info(f"Proxy đang lắng nghe tại {self.host}:{self.listen_port}.")
+
+    def switch_to(self, backend_port: int):
+        """Chuyển các kết nối mới sang backend `backend_port`."""
+        with self._lock:
+            old = self._backend_port
+            self._backend_port = backend_port
+        logging.info(f"Proxy chuyển lưu lượng: {old} -> {backend_port}.")
+
+    def active_connections(self, backend_port: int) -> int:
+        with self._lock:
+            return self._active[backend_port]
+
+    def wait_drained(self, backend_port: int, timeout: float) -> bool:
+        """Chờ tới khi backend không còn kết nối nào. Trả về False nếu hết thời gian."""
+        deadline = time.monotonic() + timeout
+        while self.active_connections(backend_port) > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(DRAIN_POLL_INTERVAL)
+        return True
+
+    def close(self):
+        self._closed.set()
+        if self._sock:
+            self._sock.close()
+
+    def _accept_loop(self):
+        while not self._closed.is_set():
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                if self._closed.is_set():
+                    return
+                continue
+            with self._lock:
+                backend_port = self._backend_port
+                if backend_port is not None:
+                    self._active[backend_port] += 1
+            if backend_port is None:
+                client.close()
+                continue
+            threading.Thread(target=self._handle, args=(client, backend_port), daemon=True).start()
+
+    def _handle(self, client: socket.socket, backend_port: int):
+        try:
+            upstream = socket.create_connection((self.host, backend_port), timeout=CONNECT_TIMEOUT)
+            upstream.settimeout(None)
+        except OSError as e:
+            logging.error(f"Proxy không kết nối được tới backend {backend_port}: {e}")
+            client.close()
+            self._release(backend_port)
+            return
+        reverse = threading.Thread(target=self._pipe, args=(upstream, client), daemon=True)
+        reverse.start()
+        self._pipe(client, upstream)
+        reverse.join()
+        client.close()
+        upstream.close()
+        self._release(backend_port)
+
+    def _release(self, backend_port: int):
+        with self._lock:
+            self._active[backend_port] -= 1
+
+    @staticmethod
+    def _pipe(src: socket.socket, dst: socket.socket):
+        try:
+            while data := src.recv(BUFFER_SIZE):
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
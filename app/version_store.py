@@ -0,0 +1,145 @@
+# app/version_store.py
+import os
+import json
+import zlib
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+# --- Cấu hình ---
+DEFAULT_MAX_VERSIONS = 20  # Số phiên bản "known-good" khác nhau được giữ lại cho mỗi tệp
+COMPRESSION_LEVEL = 6
+OBJECTS_DIRNAME = "objects"
+REFS_DIRNAME = "refs"
+
+
+def _atomic_write(path: Path, data: bytes):
+    """Ghi tệp nguyên tử: ghi ra tệp tạm cùng thư mục rồi os.replace."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class VersionStore:
+    """
+    Kho phiên bản đánh địa chỉ theo nội dung (SHA-256).
+
+    Cấu trúc thư mục:
+      objects/<sha256>.z     - nội dung tệp đã nén zlib, mỗi nội dung chỉ lưu một lần
+      <name>.index.jsonl     - nhật ký chỉ-ghi-thêm các phiên bản "known-good" kèm thời điểm
+      refs/<name>            - hash của phiên bản tốt gần nhất, cho phép phục hồi O(1)
+    """
+
+    def __init__(self, root: Path, max_versions: int = DEFAULT_MAX_VERSIONS):
+        self.root = Path(root)
+        self.max_versions = max_versions
+        self.objects_dir = self.root / OBJECTS_DIRNAME
+        self.refs_dir = self.root / REFS_DIRNAME
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.refs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    # --- Đường dẫn ---
+    def _object_path(self, file_hash: str) -> Path:
+        return self.objects_dir / f"{file_hash}.z"
+
+    def _index_path(self, name: str) -> Path:
+        return self.root / f"{name}.index.jsonl"
+
+    def _ref_path(self, name: str) -> Path:
+        return self.refs_dir / name
+
+    # --- API công khai ---
+    def head(self, name: str) -> str | None:
+        """Hash của phiên bản tốt gần nhất của `name`, hoặc None."""
+        try:
+            return self._ref_path(name).read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    def put(self, source: Path, file_hash: str | None = None) -> str:
+        """Ghi nhận nội dung hiện tại của `source` là phiên bản tốt. Trả về hash."""
+        source = Path(source)
+        data = source.read_bytes()
+        stored_hash = self.put_bytes(source.name, data)
+        if file_hash and file_hash != stored_hash:
+            # Tệp đã đổi giữa lúc tính hash và lúc đọc; tin vào nội dung thực sự đọc được
+            logging.warning(f"Hash của '{source}' đã thay đổi trong lúc sao lưu.")
+        return stored_hash
+
+    def put_bytes(self, name: str, data: bytes) -> str:
+        """Lưu `data` (một lần cho mỗi nội dung) và đặt nó làm phiên bản tốt mới nhất của `name`."""
+        file_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            obj = self._object_path(file_hash)
+            if not obj.exists():
+                _atomic_write(obj, zlib.compress(data, COMPRESSION_LEVEL))
+            if self.head(name) == file_hash:
+                return file_hash  # Trùng với phiên bản tốt gần nhất, không cần ghi thêm
+            entry = {"hash": file_hash, "timestamp": time.time(), "size": len(data)}
+            with open(self._index_path(name), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+            _atomic_write(self._ref_path(name), file_hash.encode("utf-8"))
+            self._enforce_retention(name)
+        return file_hash
+
+    def get(self, file_hash: str) -> bytes:
+        return zlib.decompress(self._object_path(file_hash).read_bytes())
+
+    def restore_last(self, target: Path) -> str | None:
+        """Phục hồi phiên bản tốt gần nhất vào `target`. Trả về hash đã phục hồi."""
+        target = Path(target)
+        file_hash = self.head(target.name)
+        if not file_hash:
+            return None
+        _atomic_write(target, self.get(file_hash))
+        return file_hash
+
+    def history(self, name: str) -> list[dict]:
+        """Toàn bộ các mục trong index của `name`, cũ nhất trước."""
+        try:
+            with open(self._index_path(name), 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def import_legacy_backups(self, name: str) -> int:
+        """Nhập các tệp '<name>.<epoch>.bak' kiểu cũ (nếu có) theo thứ tự thời gian rồi xóa chúng."""
+        legacy = sorted(self.root.glob(f"{name}.*.bak"), key=os.path.getmtime)
+        for bak in legacy:
+            self.put_bytes(name, bak.read_bytes())
+            bak.unlink()
+        return len(legacy)
+
+    # --- Nội bộ ---
+    def _enforce_retention(self, name: str):
+        """
+        Nén index khi quá dài và xóa các blob không còn được tham chiếu. Mỗi hash chỉ
+        giữ mục mới nhất, để `max_versions` là số phiên bản khác nhau (A→B→A không tốn hai chỗ).
+        """
+        entries = self.history(name)
+        if len(entries) <= self.max_versions * 2:
+            return
+        latest = {}
+        for entry in entries:
+            latest.pop(entry["hash"], None)  # Đưa hash về cuối theo lần xuất hiện mới nhất
+            latest[entry["hash"]] = entry
+        kept = list(latest.values())[-self.max_versions:]
+        index = self._index_path(name)
+        _atomic_write(index, "".join(json.dumps(e) + "\n" for e in kept).encode("utf-8"))
+
+        referenced = set()
+        for idx in self.root.glob("*.index.jsonl"):
+            with open(idx, 'r', encoding='utf-8') as f:
+                referenced.update(json.loads(line)["hash"] for line in f if line.strip())
+        evicted = 0
+        for obj in self.objects_dir.glob("*.z"):
+            if obj.stem not in referenced:
+                obj.unlink(missing_ok=True)
+                evicted += 1
+        logging.info(f"Đã nén index '{index.name}' còn {len(kept)} mục, loại bỏ {evicted} blob.")
@@ -0,0 +1,223 @@
+# app/watcher.py
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import hashlib
+import logging
+from pathlib import Path
+
+# --- Cấu hình ---
+POLL_INTERVAL = 0.5  # Chu kỳ stat() khi không có inotify (giây)
+DEBOUNCE_SECONDS = 0.05  # Gom các sự kiện ghi liên tiếp của cùng một lần lưu
+
+# Các hằng số của inotify (xem <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def hash_file(filepath: Path) -> str:
+    """Tính toán hash SHA-256 của một tệp; chuỗi rỗng nếu tệp không tồn tại. Dùng làm mã phiên bản ở mọi supervisor."""
+    if not filepath.exists():
+        return ""
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(8192):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_key(filepath: Path) -> tuple[int, int] | None:
+    """Trả về (st_mtime_ns, st_size) hoặc None nếu tệp không tồn tại."""
+    try:
+        st = filepath.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _Inotify:
+    """Lớp bọc tối thiểu quanh inotify của Linux thông qua ctypes."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs: dict[int, Path] = {}
+
+    def add_watch(self, directory: Path):
+        import ctypes
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(directory))
+        self._dirs[wd] = directory
+
+    def read_events(self) -> tuple[set[Path], bool]:
+        """Đọc tất cả sự kiện đang chờ. Trả về (các đường dẫn bị chạm tới, overflow)."""
+        touched: set[Path] = set()
+        overflow = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is not None and name:
+                    touched.add(directory / os.fsdecode(name))
+        return touched, overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FileWatcher:
+    """
+    Theo dõi một tập tệp và chỉ báo thay đổi khi nội dung (SHA-256) thực sự khác.
+    Trên Linux dùng inotify để thức dậy ngay khi tệp được ghi; nơi khác quay về
+    polling bằng stat(). Trong cả hai trường hợp, tệp chỉ bị băm lại khi
+    (st_mtime_ns, st_size) thay đổi.
+    """
+
+    def __init__(self, paths: list[Path], hash_func=hash_file, poll_interval: float = POLL_INTERVAL,
+                 use_inotify: bool | None = None):
+        self.paths = [Path(p) for p in paths]
+        self.hash_func = hash_func
+        self.poll_interval = poll_interval
+        self._state: dict[Path, tuple[tuple[int, int] | None, str]] = {}
+        self._inotify = None
+
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+                for directory in {self._key(p).parent for p in self.paths}:
+                    self._inotify.add_watch(directory)
+                logging.info("FileWatcher đang dùng inotify.")
+            except (OSError, AttributeError) as e:
+                logging.warning(f"Không thể dùng inotify ({e}). Chuyển sang polling mỗi {poll_interval}s.")
+                if self._inotify:
+                    self._inotify.close()
+                self._inotify = None
+
+        self.rebase()
+
+    @staticmethod
+    def _key(path: Path) -> Path:
+        return Path(os.path.abspath(path))
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify else "polling"
+
+    def current_hash(self, path: Path) -> str:
+        """Hash đã biết gần nhất của tệp (không đọc lại đĩa)."""
+        return self._state[self._key(path)][1]
+
+    def rebase(self, paths: list[Path] | None = None):
+        """Ghi nhận trạng thái hiện tại làm mốc, ví dụ sau khi chính supervisor ghi tệp."""
+        for p in paths or self.paths:
+            key = self._key(p)
+            self._state[key] = (_stat_key(key), self.hash_func(key))
+
+    def _check(self, key: Path) -> bool:
+        """So sánh stat trước, chỉ băm khi metadata thay đổi."""
+        old_stat, old_hash = self._state[key]
+        new_stat = _stat_key(key)
+        if new_stat == old_stat:
+            return False
+        new_hash = self.hash_func(key)
+        self._state[key] = (new_stat, new_hash)
+        return new_hash != old_hash
+
+    def check(self) -> list[Path]:
+        """Kiểm tra ngay lập tức tất cả tệp đang theo dõi."""
+        return [p for p in self.paths if self._check(self._key(p))]
+
+    def fileno(self) -> int | None:
+        """Descriptor inotify để đăng ký vào một vòng lặp sự kiện (None khi đang polling)."""
+        return self._inotify.fd if self._inotify else None
+
+    def poll_changes(self) -> list[Path]:
+        """
+        Không chặn: xử lý các sự kiện inotify đang chờ (hoặc stat lại mọi tệp khi
+        polling) và trả về các tệp đã đổi nội dung.
+        """
+        if not self._inotify:
+            return self.check()
+        touched, overflow = self._inotify.read_events()
+        if overflow:
+            return self.check()
+        return [p for p in self.paths if self._key(p) in touched and self._check(self._key(p))]
+
+    def wait_for_change(self, timeout: float | None = None) -> list[Path]:
+        """
+        Chờ tối đa `timeout` giây cho tới khi có tệp thay đổi nội dung.
+        Trả về danh sách tệp đã thay đổi (rỗng nếu hết thời gian).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._inotify:
+            return self._wait_inotify(deadline)
+        return self._wait_polling(deadline)
+
+    def _remaining(self, deadline: float | None) -> float | None:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def _wait_inotify(self, deadline: float | None) -> list[Path]:
+        while True:
+            try:
+                ready, _, _ = select.select([self._inotify.fd], [], [], self._remaining(deadline))
+            except InterruptedError:
+                continue
+            if not ready:
+                return []
+            time.sleep(DEBOUNCE_SECONDS)
+            changed = self.poll_changes()
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+
+    def _wait_polling(self, deadline: float | None) -> list[Path]:
+        while True:
+            changed = self.check()
+            if changed:
+                return changed
+            remaining = self._remaining(deadline)
+            if remaining is not None and remaining <= 0:
+                return []
+            time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
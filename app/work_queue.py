@@ -0,0 +1,116 @@
+# app/work_queue.py
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Cấu hình mặc định ---
+DEFAULT_MAX_SIZE = 1000  # Số payload tối đa đang chờ; vượt quá thì từ chối (backpressure)
+DEFAULT_WORKERS = 2
+DEFAULT_BATCH_SIZE = 16  # Số payload tối đa gửi cho handler trong một lần gọi
+DEFAULT_BATCH_WAIT = 0.05  # Thời gian tối đa chờ gom thêm payload vào cùng một lô (giây)
+
+
+class WorkQueue:
+    """
+    Hàng đợi công việc có giới hạn, được tiêu thụ bởi một nhóm worker.
+
+    Mỗi worker lấy tối đa `batch_size` payload (chờ tối đa `batch_wait` giây
+    để gom lô) rồi gọi `handler(batch)`. Với `use_processes=True`, handler
+    được chạy trong ProcessPoolExecutor (handler phải pickle được).
+    """
+
+    def __init__(self, handler, max_size: int = DEFAULT_MAX_SIZE, workers: int = DEFAULT_WORKERS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, batch_wait: float = DEFAULT_BATCH_WAIT,
+                 use_processes: bool = False):
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.use_processes = use_processes
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._accepting = True
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._pool = None
+
+    def start(self):
+        if self._threads:
+            return
+        if self.use_processes:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"work-queue-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logging.info(f"WorkQueue đã khởi động {self.workers} worker ({'process' if self.use_processes else 'thread'}).")
+
+    def submit(self, item) -> bool:
+        """Xếp một payload vào hàng đợi. Trả về False nếu hàng đợi đầy hoặc đang dừng."""
+        if not self._accepting:
+            return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def has_capacity(self) -> bool:
+        """Hàng đợi còn chỗ và đang nhận việc (kiểm tra trước khi ghi, không giữ chỗ)."""
+        return self._accepting and not self._queue.full()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def drain(self, timeout: float) -> bool:
+        """Ngừng nhận việc mới, xử lý nốt hàng đợi rồi dừng worker. Trả về False nếu hết thời gian."""
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        drained = True
+        if self._threads:
+            while self._queue.unfinished_tasks:
+                if time.monotonic() >= deadline:
+                    drained = False
+                    break
+                time.sleep(0.05)
+        self._stop.set()
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        if self._pool:
+            self._pool.shutdown(wait=drained, cancel_futures=not drained)
+        if not drained:
+            logging.warning(f"WorkQueue dừng khi còn {self._queue.qsize()} payload chưa xử lý.")
+        return drained
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                if self._pool:
+                    self._pool.submit(self.handler, batch).result()
+                else:
+                    self.handler(batch)
+            except Exception as e:
+                logging.exception(f"Lỗi khi xử lý lô {len(batch)} payload: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,376 @@
+# benchmarks/bench_self_healing.py
+"""
+Benchmark đầu-cuối cho vòng lặp tự chữa lành, chạy hoàn toàn ngoại tuyến.
+
+Sao chép thư mục app/ sang một thư mục tạm, thay Gemini bằng backend stub của
+llm_client (kịch bản JSON sinh tự động), khởi chạy supervisor thật (main.py, chế
+độ restart) rồi đo:
+
+  - change_to_restart: từ lúc ghi một thay đổi vào application.py tới khi phiên
+    bản mới được supervisor ghi nhận "healthy" (gồm cả chạy test trong sandbox).
+  - crash_to_recovery: từ lúc chèn một lỗi làm sập ứng dụng tới khi bản sửa
+    (AI stub hoặc bản sửa đã biết) được khởi chạy và "healthy".
+  - http_post / http_get_data: thông lượng và độ trễ của POST / và GET /data.
+  - plan_step: thời gian mỗi bước của `orchestrator.py --goal` với kế hoạch giả lập.
+
+Kết quả là một tệp JSON (phân vị p50/p90/p99 và thông lượng) để so sánh giữa các commit:
+
+    python benchmarks/bench_self_healing.py --output bench.json
+    python benchmarks/bench_self_healing.py --compare bench.json --max-regression 20
+"""
+import argparse
+import ast
+import difflib
+import hashlib
+import http.client
+import json
+import logging
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "app"))
+
+from health_channel import EventChannel, HEALTHY_EVENTS, FAILURE_EVENTS  # noqa: E402
+from watcher import hash_file  # noqa: E402
+
+# --- Cấu hình ---
+APP_FILE = Path("app/application.py")  # Tương đối so với thư mục làm việc tạm
+EVENTS_FILE = Path("app/logs/supervisor_events.jsonl")
+STATUS_FILE = Path("app/logs/supervisor_status.json")
+STUB_SCRIPT_FILE = "bench_stub_script.json"
+COPY_IGNORE = shutil.ignore_patterns("logs", "versions", "__pycache__", "data_log", "data.json")
+EVENT_TIMEOUT = float(os.getenv("BENCH_EVENT_TIMEOUT", "180"))  # Thời gian tối đa chờ một sự kiện của supervisor
+PERCENTILES = (50, 90, 99)
+
+
+def summarize(samples: list[float], duration: float | None = None) -> dict:
+    """Phân vị (nearest-rank), trung bình, min/max theo mili giây; kèm số yêu cầu/giây nếu có `duration`."""
+    result = {"count": len(samples)}
+    if samples:
+        ordered = sorted(samples)
+        for p in PERCENTILES:
+            rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+            result[f"p{p}_ms"] = round(ordered[rank] * 1000, 3)
+        result["mean_ms"] = round(sum(ordered) / len(ordered) * 1000, 3)
+        result["min_ms"] = round(ordered[0] * 1000, 3)
+        result["max_ms"] = round(ordered[-1] * 1000, 3)
+    if duration:
+        result["throughput_rps"] = round(len(samples) / duration, 2)
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def inject_crash(source: str, marker: str = "bench crash") -> str:
+    """
+    Chèn `raise RuntimeError(...)` ở cấp module, ngay trước khối `if __name__ == "__main__"`:
+    ứng dụng sập khi khởi động với một traceback đầy đủ (để kho tri thức lỗi nhận diện được).
+    """
+    guard = [n for n in ast.parse(source).body if isinstance(n, ast.If)][-1]
+    lines = source.splitlines(keepends=True)
+    lines.insert(guard.lineno - 1, f'raise RuntimeError("{marker}")\n\n')
+    return "".join(lines)
+
+
+class Workspace:
+    """Bản sao độc lập của dự án trong thư mục tạm, với kịch bản stub cho LLM."""
+
+    def __init__(self, plan_steps: int, plan_shape: str, keep: bool = False):
+        self.root = Path(tempfile.mkdtemp(prefix="bench-self-healing-"))
+        self.keep = keep
+        shutil.copytree(REPO_ROOT / "app", self.root / "app", ignore=COPY_IGNORE)
+        self.original = (self.root / APP_FILE).read_text(encoding="utf-8")
+        self.port = _free_port()
+        self.plan_steps = plan_steps
+        self.plan_shape = plan_shape
+        (self.root / STUB_SCRIPT_FILE).write_text(json.dumps(self._stub_script(), ensure_ascii=False, indent=2),
+                                                  encoding="utf-8")
+        self.events = EventChannel(self.root / EVENTS_FILE, self.root / STATUS_FILE)
+
+    def _stub_script(self) -> dict:
+        fix_diff = "\n".join(difflib.unified_diff(inject_crash(self.original).splitlines(), self.original.splitlines(),
+                                                  "a/app/application.py", "b/app/application.py", lineterm=""))
+        rules = [
+            # Sửa lỗi: xóa đúng dòng raise đã chèn bằng một diff nhỏ
+            {"match": "Bạn là một chuyên gia gỡ lỗi Python",
+             "response": {"description": "Xóa lệnh raise gây sập ứng dụng khi khởi động.",
+                          "edits": [{"type": "diff", "diff": fix_diff}]}},
+            {"match": "LẬP KẾ HOẠCH", "response": {"plan": self._plan()}},
+        ]
+        # Bước k được nhận diện qua dòng yêu cầu trong prompt (`"mô tả"` rồi xuống dòng); lịch sử dạng JSON không khớp
+        for k in range(self.plan_steps, 0, -1):
+            rules.append({"match": f'"bench step {k}"\n',
+                          "response": {"description": f"Thêm hàm bench_step_{k}.",
+                                       "edits": [{"type": "insert_symbol", "before": "run_app",
+                                                  "code": f"def bench_step_{k}():\n    return {k}\n"}]}})
+        return {"rules": rules}
+
+    def _plan(self) -> list[dict]:
+        plan = []
+        for k in range(1, self.plan_steps + 1):
+            deps = [f"s{k - 1}"] if self.plan_shape == "chain" and k > 1 else []
+            plan.append({"id": f"s{k}", "description": f"bench step {k}", "depends_on": deps})
+        return plan
+
+    def env(self) -> dict:
+        return {**os.environ, "LLM_BACKEND": "stub", "LLM_STUB_SCRIPT": str(self.root / STUB_SCRIPT_FILE),
+                "SUPERVISOR_MODE": "restart", "APP_PORT": str(self.port), "PYTHONUNBUFFERED": "1"}
+
+    def write_app(self, source: str):
+        # Ghi thay thế nguyên tử để supervisor không bao giờ đọc phải tệp ghi dở
+        path = self.root / APP_FILE
+        tmp = path.with_name(f".{path.name}.bench.tmp")
+        tmp.write_text(source, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def cleanup(self):
+        if self.keep:
+            logging.info(f"Giữ lại thư mục làm việc: {self.root}")
+        else:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+class Supervisor:
+    """main.py chạy trong thư mục làm việc tạm, trong một nhóm tiến trình riêng để dọn dẹp trọn vẹn."""
+
+    def __init__(self, ws: Workspace):
+        self.ws = ws
+        self.log = open(ws.root / "supervisor.out", "wb")
+        self.process = subprocess.Popen([sys.executable, "app/main.py"], cwd=ws.root, env=ws.env(),
+                                        stdout=self.log, stderr=subprocess.STDOUT, start_new_session=True)
+
+    def wait_healthy(self, version: str | None, since: float, timeout: float = EVENT_TIMEOUT) -> dict:
+        event = self.ws.events.wait_for(version, since, timeout, HEALTHY_EVENTS + FAILURE_EVENTS)
+        if event is None or event["event"] not in HEALTHY_EVENTS:
+            raise RuntimeError(f"Supervisor không báo healthy (sự kiện: {event}); xem {self.ws.root / 'supervisor.out'}")
+        return event
+
+    def stop(self):
+        if self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGINT)
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)  # Tiến trình ứng dụng còn sót lại
+        except ProcessLookupError:
+            pass
+        self.log.close()
+
+
+def _version(ws: Workspace) -> str:
+    # Cùng mã phiên bản mà supervisor công bố trong các sự kiện
+    return hash_file(ws.root / APP_FILE)
+
+
+def _events_since(ws: Workspace, since: float) -> list[dict]:
+    try:
+        lines = (ws.root / EVENTS_FILE).read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+    return [e for e in map(json.loads, filter(None, lines)) if e["ts"] >= since]
+
+
+def bench_change_to_restart(ws: Workspace, supervisor: Supervisor, iterations: int) -> dict:
+    samples, detect = [], []
+    for i in range(iterations):
+        source = ws.original + f"\n# bench edit {i} {time.time()}\n"
+        since = time.time()
+        ws.write_app(source)
+        version = _version(ws)
+        event = supervisor.wait_healthy(version, since)
+        samples.append(time.time() - since)
+        restart = ws.events.wait_for(version, since, 0, ("restart",))
+        if restart:
+            detect.append(restart["ts"] - since)
+        logging.info(f"change_to_restart #{i + 1}: {samples[-1]:.3f}s (pid {event.get('pid')})")
+    return {**summarize(samples), "detect": summarize(detect)}
+
+
+def bench_crash_to_recovery(ws: Workspace, supervisor: Supervisor, iterations: int) -> dict:
+    samples, by_source = [], {}
+    recovered = hashlib.sha256(ws.original.encode("utf-8")).hexdigest()
+    for i in range(iterations):
+        since = time.time()
+        ws.write_app(inject_crash(ws.original))
+        fix = ws.events.wait_for(None, since, EVENT_TIMEOUT, ("fix_applied", "gave_up"))
+        if fix is None or fix["event"] != "fix_applied":
+            raise RuntimeError(f"Supervisor không sửa được lỗi (sự kiện: {fix}).")
+        supervisor.wait_healthy(fix["version"], fix["ts"])
+        elapsed = time.time() - since
+        samples.append(elapsed)
+        by_source.setdefault(fix.get("source", "unknown"), []).append(elapsed)
+        logging.info(f"crash_to_recovery #{i + 1}: {elapsed:.3f}s (nguồn sửa: {fix.get('source')})")
+        if fix["version"] != recovered:
+            logging.warning("Bản sửa không khôi phục đúng mã nguồn gốc; các lần đo sau có thể không so sánh được.")
+            ws.write_app(ws.original)
+            supervisor.wait_healthy(recovered, time.time())
+    return {**summarize(samples), "by_fix_source": {k: summarize(v) for k, v in by_source.items()}}
+
+
+def bench_http(port: int, method: str, path: str, duration: float, concurrency: int) -> dict:
+    """Tải HTTP từ `concurrency` luồng, mỗi luồng một kết nối keep-alive, trong `duration` giây."""
+    samples, errors, lock = [], {}, threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(n: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local, seq = [], 0
+        while time.monotonic() < deadline:
+            seq += 1
+            body = json.dumps({"bench": n, "seq": seq}) if method == "POST" else None
+            headers = {"Content-Type": "application/json"} if body else {}
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                status = type(e).__name__
+                conn.close()
+            if status in (200, 201, 202, 304):
+                local.append(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result = summarize(samples, time.monotonic() - start)
+    result["errors"] = errors
+    result["concurrency"] = concurrency
+    logging.info(f"{method} {path}: {result.get('throughput_rps')} req/s, p99 {result.get('p99_ms')} ms, lỗi {errors}")
+    return result
+
+
+def bench_plan(ws: Workspace) -> dict:
+    """Chạy `orchestrator.py --goal` với kế hoạch giả lập; thời gian mỗi đợt lấy từ các sự kiện healthy liên tiếp."""
+    since = time.time()
+    result = subprocess.run([sys.executable, "app/orchestrator.py", "--goal", "bench goal"], cwd=ws.root,
+                            env=ws.env(), capture_output=True, text=True, timeout=EVENT_TIMEOUT * (ws.plan_steps + 1))
+    total = time.time() - since
+    if result.returncode != 0:
+        raise RuntimeError(f"Orchestrator thất bại:\n{result.stderr[-4000:]}")
+    applied = sum(f"def bench_step_{k}(" in (ws.root / APP_FILE).read_text(encoding="utf-8")
+                  for k in range(1, ws.plan_steps + 1))
+    healthy = [e["ts"] for e in _events_since(ws, since) if e["event"] in HEALTHY_EVENTS]
+    waves = [b - a for a, b in zip([since] + healthy, healthy)]
+    logging.info(f"plan: {applied}/{ws.plan_steps} bước trong {total:.3f}s, {len(waves)} đợt")
+    return {"steps": ws.plan_steps, "applied_steps": applied, "shape": ws.plan_shape, "total_s": round(total, 3),
+            "per_step_ms": round(total / max(1, applied) * 1000, 3), "waves": summarize(waves)}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, max_regression: float | None) -> bool:
+    """In chênh lệch so với kết quả cũ. Trả về False nếu có chỉ số xấu đi quá `max_regression` phần trăm."""
+    ok = True
+    print(f"So sánh với {baseline.get('meta', {}).get('commit')} -> {current['meta'].get('commit')}")
+    for scenario, result in current["results"].items():
+        base = baseline.get("results", {}).get(scenario)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p99_ms", "throughput_rps", "per_step_ms"):
+            if metric not in result or not base.get(metric):
+                continue
+            change = (result[metric] - base[metric]) / base[metric] * 100
+            worse = -change if metric == "throughput_rps" else change
+            flag = ""
+            if max_regression is not None and worse > max_regression:
+                flag, ok = "  <-- XẤU ĐI", False
+            print(f"  {scenario:<20} {metric:<15} {base[metric]:>12} -> {result[metric]:>12} ({change:+.1f}%){flag}")
+    return ok
+
+
+def run(args) -> dict:
+    ws = Workspace(args.plan_steps, args.plan_shape, keep=args.keep)
+    supervisor = None
+    results = {}
+    try:
+        supervisor = Supervisor(ws)
+        supervisor.wait_healthy(None, 0)
+        logging.info(f"Supervisor đã sẵn sàng trong {ws.root} (cổng {ws.port}).")
+        if "restart" in args.scenarios:
+            results["change_to_restart"] = bench_change_to_restart(ws, supervisor, args.iterations)
+        if "crash" in args.scenarios:
+            results["crash_to_recovery"] = bench_crash_to_recovery(ws, supervisor, args.iterations)
+        if "http" in args.scenarios:
+            # POST trước để /data có dữ liệu cho bài đo GET
+            results["http_post"] = bench_http(ws.port, "POST", "/", args.duration, args.concurrency)
+            results["http_get_data"] = bench_http(ws.port, "GET", "/data", args.duration, args.concurrency)
+        if "plan" in args.scenarios:
+            results["plan_step"] = bench_plan(ws)
+    finally:
+        if supervisor:
+            supervisor.stop()
+        ws.cleanup()
+    return {
+        "meta": {"commit": _git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "iterations": args.iterations, "duration_s": args.duration, "concurrency": args.concurrency},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ngoại tuyến cho vòng lặp tự chữa lành.")
+    parser.add_argument("--scenarios", nargs="+", default=["restart", "crash", "http", "plan"],
+                        choices=["restart", "crash", "http", "plan"])
+    parser.add_argument("--iterations", type=int, default=5, help="Số lần đo cho mỗi kịch bản restart/crash")
+    parser.add_argument("--duration", type=float, default=10.0, help="Thời gian tải HTTP cho mỗi route (giây)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số kết nối HTTP đồng thời")
+    parser.add_argument("--plan-steps", type=int, default=4)
+    parser.add_argument("--plan-shape", choices=["chain", "parallel"], default="chain",
+                        help="chain: mỗi bước phụ thuộc bước trước; parallel: các bước độc lập")
+    parser.add_argument("--output", type=Path, help="Ghi kết quả JSON vào tệp này (mặc định: stdout)")
+    parser.add_argument("--compare", type=Path, help="Tệp kết quả JSON cũ để so sánh")
+    parser.add_argument("--max-regression", type=float, help="Thoát với mã 1 nếu chỉ số xấu đi quá số phần trăm này")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại thư mục làm việc tạm để xem log")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [BENCH] [%(levelname)s] - %(message)s",
+                        stream=sys.stderr)
+    report = run(args)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+        logging.info(f"Đã ghi kết quả vào '{args.output}'.")
+    else:
+        print(output)
+    if args.compare:
+        if not compare(report, json.loads(args.compare.read_text(encoding="utf-8")), args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# tests/test_code_patch.py
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import code_patch  # noqa: E402
+from code_patch import PatchError  # noqa: E402
+
+SOURCE = '''import os
+
+
+def first():
+    return 1
+
+
+class Greeter:
+    def hello(self):
+        return "hello"
+
+    def bye(self):
+        return "bye"
+
+
+def last():
+    return 3
+
+
+if __name__ == "__main__":
+    print(first())
+'''
+
+
+class TestUnifiedDiff(unittest.TestCase):
+    def test_hunk_applies_despite_wrong_line_numbers(self):
+        # Tiêu đề @@ lệch 5 dòng so với vị trí thật; ngữ cảnh vẫn khớp
+        diff = '''--- a/app.py
++++ b/app.py
+@@ -12,3 +12,3 @@
+ def last():
+-    return 3
++    return 4
+
+'''
+        patched = code_patch.apply_unified_diff(SOURCE, diff)
+        self.assertIn("    return 4\n", patched)
+        self.assertNotIn("    return 3\n", patched)
+        self.assertEqual(len(patched.splitlines()), len(SOURCE.splitlines()))
+
+    def test_multiple_hunks_shift_following_positions(self):
+        diff = '''@@ -4,2 +4,3 @@
+ def first():
++    # bình luận mới
+     return 1
+@@ -17,2 +18,2 @@
+ def last():
+-    return 3
++    return 5
+'''
+        patched = code_patch.apply_unified_diff(SOURCE, diff)
+        self.assertIn("    # bình luận mới\n    return 1", patched)
+        self.assertIn("    return 5", patched)
+
+    def test_missing_context_raises(self):
+        diff = '''@@ -1,1 +1,1 @@
+-import sys
++import json
+'''
+        with self.assertRaises(PatchError):
+            code_patch.apply_unified_diff(SOURCE, diff)
+
+    def test_diff_without_hunks_raises(self):
+        with self.assertRaises(PatchError):
+            code_patch.apply_unified_diff(SOURCE, "không phải diff")
+
+
+class TestSymbolEdits(unittest.TestCase):
+    def test_replace_method_keeps_indentation(self):
+        patched = code_patch.replace_symbol(SOURCE, "Greeter.hello", 'def hello(self):\n    return "hi"')
+        self.assertIn('    def hello(self):\n        return "hi"\n', patched)
+        code_patch.validate_source(patched)
+
+    def test_insert_before_symbol_and_before_main_guard(self):
+        patched = code_patch.insert_symbol(SOURCE, "def middle():\n    return 2", before="last")
+        self.assertLess(patched.index("def middle"), patched.index("def last"))
+        patched = code_patch.insert_symbol(SOURCE, "def tail():\n    return 9")
+        self.assertLess(patched.index("def tail"), patched.index('if __name__ == "__main__"'))
+        code_patch.validate_source(patched)
+
+    def test_delete_symbol(self):
+        patched = code_patch.delete_symbol(SOURCE, "Greeter.bye")
+        self.assertNotIn("def bye", patched)
+        self.assertIn("def hello", patched)
+
+    def test_unknown_anchor_raises(self):
+        with self.assertRaises(PatchError):
+            code_patch.replace_symbol(SOURCE, "missing", "def missing(): pass")
+        with self.assertRaises(PatchError):
+            code_patch.insert_symbol(SOURCE, "def x(): pass", before="missing")
+        with self.assertRaises(PatchError):
+            code_patch.delete_symbol(SOURCE, "Greeter.missing")
+
+    def test_apply_edits_in_order(self):
+        patched = code_patch.apply_edits(SOURCE, [
+            {"type": "replace_symbol", "name": "first", "code": "def first():\n    return 10"},
+            {"type": "delete_symbol", "name": "last"},
+        ])
+        self.assertIn("return 10", patched)
+        self.assertNotIn("def last", patched)
+
+    def test_malformed_edits_raise_patch_error(self):
+        for edits in (["replace"], {"type": "diff"}, [{"type": "replace_symbol", "name": "first"}],
+                      [{"type": "delete_symbol", "name": 3}], [{"type": "unknown"}],
+                      [{"type": "insert_symbol", "code": "x = 1", "before": ["first"]}]):
+            with self.subTest(edits=edits), self.assertRaises(PatchError):
+                code_patch.apply_edits(SOURCE, edits)
+
+
+class TestApplyToFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "app.py"
+        self.path.write_text(SOURCE, encoding="utf-8")
+
+    def test_prefers_edits_over_new_code(self):
+        mode = code_patch.apply_to_file(self.path, {
+            "edits": [{"type": "delete_symbol", "name": "last"}],
+            "new_code": "x = 1\n",
+        })
+        self.assertEqual(mode, "edits")
+        self.assertNotIn("def last", self.path.read_text(encoding="utf-8"))
+
+    def test_syntax_error_leaves_file_untouched(self):
+        with self.assertRaises(PatchError):
+            code_patch.apply_to_file(self.path, {"new_code": "def broken(:\n"})
+        self.assertEqual(self.path.read_text(encoding="utf-8"), SOURCE)
+
+    def test_empty_reply_raises(self):
+        with self.assertRaises(PatchError):
+            code_patch.build_new_source(SOURCE, {"description": "không có mã"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_context_engine.py
+import os
+import sys
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from context_engine import CHARS_PER_TOKEN, ProjectIndex  # noqa: E402
+
+
+class TestProjectIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name) / "app"
+        self.root.mkdir()
+        self.cache = Path(self.tmp.name) / "index.json"
+        self.write("a.py", "def handler():\n    return alpha\n")
+        self.write("b.py", "def handler():\n    return beta\n")
+        self.write("c.py", "def caller():\n    return handler()\n")
+
+    def write(self, name: str, text: str) -> Path:
+        path = self.root / name
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def key(self, name: str) -> str:
+        return (self.root / name).as_posix()
+
+    def test_unchanged_files_not_read_again(self):
+        index = ProjectIndex(self.root, self.cache)
+        self.assertEqual(index.refresh(), 3)
+        with unittest.mock.patch.object(Path, "read_text", side_effect=AssertionError("đọc lại tệp không đổi")):
+            self.assertEqual(index.refresh(), 0)
+        # Chỉ mục nạp từ cache trong tiến trình khác: không phân tích lại, nguồn được đọc khi cần
+        reloaded = ProjectIndex(self.root, self.cache)
+        self.assertEqual(reloaded.refresh(), 0)
+        self.assertIn("return alpha", reloaded.source(self.key("a.py")))
+
+    def test_changed_content_reindexed(self):
+        index = ProjectIndex(self.root, self.cache)
+        index.refresh()
+        self.write("a.py", "def handler():\n    return alpha\n\n\ndef extra():\n    pass\n")
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual([s["name"] for s in index.files[self.key("a.py")]["symbols"]], ["handler", "extra"])
+
+    def test_touch_without_content_change_not_reparsed(self):
+        index = ProjectIndex(self.root, self.cache)
+        index.refresh()
+        path = self.root / "a.py"
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(index.refresh(), 0)
+        self.assertEqual(index.files[self.key("a.py")]["stat"][0], st.st_mtime_ns + 10**9)
+
+    def test_removed_file_dropped(self):
+        index = ProjectIndex(self.root, self.cache)
+        index.refresh()
+        (self.root / "b.py").unlink()
+        index.refresh()
+        self.assertNotIn(self.key("b.py"), index.files)
+
+    def test_propagated_score_sums_same_name_across_files(self):
+        index = ProjectIndex(self.root, None)
+        index.refresh()
+        scores = index._score("alpha beta")
+        self.assertEqual(scores[(self.key("a.py"), "handler")], 0.5)
+        self.assertEqual(scores[(self.key("b.py"), "handler")], 0.5)
+        # caller gọi "handler": nhận phần lan truyền từ cả hai định nghĩa
+        self.assertEqual(scores[(self.key("c.py"), "caller")], (0.5 + 0.5) * 0.25)
+
+    def test_traceback_frame_selects_symbol_within_budget(self):
+        self.write("big.py", "import os\n\n\n" + "".join(
+            f"def filler_{i}():\n    return {i}\n\n\n" for i in range(200)) + "def target():\n    raise KeyError\n")
+        index = ProjectIndex(self.root, None)
+        query = f'File "{self.key("big.py")}", line 804, in target\nKeyError'
+        context = index.build_context(query, budget_tokens=200)
+        self.assertIn("def target():\n    raise KeyError", context)
+        self.assertLessEqual(len(context), 200 * CHARS_PER_TOKEN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# tests/test_error_knowledge.py
+import sys
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from error_knowledge import ErrorKnowledge, fingerprint, symbol_edits  # noqa: E402
+
+BROKEN = '''import os
+
+
+def load(data):
+    return data["missing"]
+
+
+def other():
+    return 1
+'''
+FIXED = BROKEN.replace('return data["missing"]', 'return data.get("missing")')
+# Cùng lỗi nhưng hàm bị đẩy xuống dưới do có mã mới phía trên
+SHIFTED = BROKEN.replace("import os\n", "import os\nimport sys\n\n\ndef helper():\n    return sys.argv\n")
+
+
+def traceback_for(source: str, key: str = "missing", address: str = "0x7f00aa") -> str:
+    line = next(i for i, l in enumerate(source.splitlines(), 1) if 'data["missing"]' in l)
+    return (
+        "Traceback (most recent call last):\n"
+        f'  File "/srv/app/application.py", line {line}, in load\n'
+        '    return data["missing"]\n'
+        f"KeyError: '{key}' at {address}\n"
+    )
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_stable_across_line_number_changes(self):
+        a = fingerprint(traceback_for(BROKEN), BROKEN, "application.py")
+        b = fingerprint(traceback_for(SHIFTED), SHIFTED, "application.py")
+        self.assertIsNotNone(a)
+        self.assertEqual(a["key"], b["key"])
+        self.assertEqual(a["location"], "application.py:load")
+
+    def test_volatile_values_ignored(self):
+        a = fingerprint(traceback_for(BROKEN, "a", "0x1"), BROKEN, "application.py")
+        b = fingerprint(traceback_for(BROKEN, "b", "0xdeadbeef"), BROKEN, "application.py")
+        self.assertEqual(a["key"], b["key"])
+
+    def test_changed_code_changes_fingerprint(self):
+        edited = BROKEN.replace("def load(data):", "def load(data):\n    data = dict(data)")
+        a = fingerprint(traceback_for(BROKEN), BROKEN, "application.py")
+        b = fingerprint(traceback_for(edited), edited, "application.py")
+        self.assertNotEqual(a["key"], b["key"])
+
+    def test_no_exception_line(self):
+        self.assertIsNone(fingerprint("chỉ là log bình thường\n", BROKEN, "application.py"))
+
+    def test_symbol_edits_only_for_contained_changes(self):
+        edits = symbol_edits(BROKEN, FIXED)
+        self.assertEqual([e["name"] for e in edits], ["load"])
+        self.assertIsNone(symbol_edits(BROKEN, BROKEN.replace("import os", "import json")))
+
+
+class TestErrorKnowledge(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.store_file = self.root / "knowledge.json"
+        self.app_file = self.root / "application.py"
+
+    def learn_fix(self) -> ErrorKnowledge:
+        knowledge = ErrorKnowledge(self.store_file)
+        knowledge.observe(traceback_for(BROKEN), BROKEN, FIXED, "application.py", "dùng get")
+        knowledge.confirm(sha256(FIXED))
+        return knowledge
+
+    def test_unconfirmed_fix_not_remembered(self):
+        knowledge = ErrorKnowledge(self.store_file)
+        knowledge.observe(traceback_for(BROKEN), BROKEN, FIXED, "application.py")
+        knowledge.confirm(sha256("phiên bản khác"))
+        self.assertEqual(knowledge.entries, {})
+        self.assertFalse(self.store_file.exists())
+
+    def test_replay_after_confirm_on_shifted_code(self):
+        self.learn_fix()
+        self.app_file.write_text(SHIFTED, encoding="utf-8")
+        knowledge = ErrorKnowledge(self.store_file)  # Nạp lại từ đĩa
+        self.assertTrue(knowledge.replay(traceback_for(SHIFTED), self.app_file))
+        patched = self.app_file.read_text(encoding="utf-8")
+        self.assertIn('return data.get("missing")', patched)
+        self.assertIn("def helper", patched)
+
+    def test_confirmed_replay_counts_hits(self):
+        self.learn_fix()
+        knowledge = ErrorKnowledge(self.store_file)
+        self.app_file.write_text(BROKEN, encoding="utf-8")
+        self.assertTrue(knowledge.replay(traceback_for(BROKEN), self.app_file))
+        knowledge.confirm(sha256(self.app_file.read_text(encoding="utf-8")))
+        (entry,) = knowledge.entries.values()
+        self.assertEqual(entry["fixes"][0]["hits"], 2)
+
+    def test_failed_replay_is_discarded(self):
+        self.learn_fix()
+        knowledge = ErrorKnowledge(self.store_file)
+        self.app_file.write_text(BROKEN, encoding="utf-8")
+        self.assertTrue(knowledge.replay(traceback_for(BROKEN), self.app_file))
+        # Lỗi mới xuất hiện trước khi bản sửa được xác nhận: bản sửa bị loại
+        self.app_file.write_text(BROKEN, encoding="utf-8")
+        self.assertFalse(knowledge.replay(traceback_for(BROKEN), self.app_file))
+        self.assertEqual(knowledge.entries, {})
+        self.assertEqual(ErrorKnowledge(self.store_file).entries, {})
+
+    def test_unknown_error_not_replayed(self):
+        self.learn_fix()
+        self.app_file.write_text(BROKEN, encoding="utf-8")
+        error = traceback_for(BROKEN).replace("KeyError", "ValueError")
+        self.assertFalse(ErrorKnowledge(self.store_file).replay(error, self.app_file))
+        self.assertEqual(self.app_file.read_text(encoding="utf-8"), BROKEN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# tests/test_ingest_log.py
+import os
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from ingest_log import IngestLog  # noqa: E402
+
+
+class TestIngestLogWriters(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_second_writer_on_same_directory_is_rejected(self):
+        first = IngestLog(self.root / "log", self.root / "data.json")
+        self.addCleanup(first.close)
+        with self.assertRaises(RuntimeError):
+            IngestLog(self.root / "log", self.root / "data.json")
+        self.assertEqual(first.append({"n": 1}), 1)
+
+    def test_directory_reusable_after_close(self):
+        first = IngestLog(self.root / "log", self.root / "data.json")
+        first.append({"n": 1})
+        first.close()
+        second = IngestLog(self.root / "log", self.root / "data.json")
+        self.addCleanup(second.close)
+        # Tiếp tục số thứ tự của người ghi trước, không bắt đầu lại từ 1
+        self.assertEqual(second.append({"n": 2}), 2)
+
+    def test_separate_directories_share_snapshot(self):
+        a = IngestLog(self.root / "worker-0-0", self.root / "data.json")
+        b = IngestLog(self.root / "worker-0-1", self.root / "data.json")
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        self.assertEqual(a.append({"from": "a"}), 1)
+        self.assertEqual(b.append({"from": "b"}), 1)
+        self.assertEqual((self.root / "data.json").read_text(), '{"from": "b"}')
+
+
+class TestIngestLogRecovery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.addCleanup(self.tmp.cleanup)
+        self.log_dir = self.root / "log"
+        self.snapshot = self.root / "data.json"
+
+    def write_records(self, *records):
+        log = IngestLog(self.log_dir, self.snapshot)
+        for record in records:
+            log.append(record)
+        log.close()
+
+    def test_torn_last_line_is_truncated(self):
+        self.write_records({"n": 1}, {"n": 2})
+        segment = sorted(self.log_dir.glob("*.jsonl"))[-1]
+        with open(segment, 'ab') as f:
+            f.write(b'{"seq": 3, "ts": 1, "da')  # Sập giữa lúc ghi
+        log = IngestLog(self.log_dir, self.snapshot)
+        self.addCleanup(log.close)
+        self.assertTrue(segment.read_bytes().endswith(b"\n"))
+        self.assertEqual(log.append({"n": 3}), 3)
+        log.close()
+        records = [json.loads(line) for seg in sorted(self.log_dir.glob("*.jsonl")) for line in seg.read_text().splitlines()]
+        self.assertEqual([r["seq"] for r in records], [1, 2, 3])
+
+    def test_snapshot_older_than_log_is_rebuilt(self):
+        self.write_records({"n": 1}, {"n": 2})
+        self.snapshot.write_text('{"n": 1}')
+        os.utime(self.snapshot, (0, 0))  # Lần ghi snapshot sau fsync đã bị mất
+        IngestLog(self.log_dir, self.snapshot).close()
+        self.assertEqual(json.loads(self.snapshot.read_text()), {"n": 2})
+
+    def test_missing_or_corrupt_snapshot_is_rebuilt(self):
+        self.write_records({"n": 1})
+        self.snapshot.unlink()
+        IngestLog(self.log_dir, self.snapshot).close()
+        self.assertEqual(json.loads(self.snapshot.read_text()), {"n": 1})
+        self.snapshot.write_text('{"n": ')
+        IngestLog(self.log_dir, self.snapshot).close()
+        self.assertEqual(json.loads(self.snapshot.read_text()), {"n": 1})
+
+    def test_newer_snapshot_from_other_writer_is_kept(self):
+        self.write_records({"worker": 0})
+        # Worker khác (thư mục log khác) ghi data.json sau đó
+        self.snapshot.write_text('{"worker": 1}')
+        IngestLog(self.log_dir, self.snapshot).close()
+        self.assertEqual(json.loads(self.snapshot.read_text()), {"worker": 1})
+
+    def test_compaction_keeps_newest_segments(self):
+        log = IngestLog(self.log_dir, self.snapshot, segment_max_bytes=200, max_segments=2, commit_interval=0)
+        for i in range(40):
+            log.append({"n": i, "pad": "x" * 50})
+        log.close()
+        segments = sorted(self.log_dir.glob("*.jsonl"))
+        # Tối đa `max_segments` segment đã đóng cộng segment đang ghi
+        self.assertLessEqual(len(segments), 3)
+        last = json.loads(segments[-1].read_text().splitlines()[-1])
+        self.assertEqual(last["seq"], 40)
+        reopened = IngestLog(self.log_dir, self.snapshot)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.append({"n": 40}), 41)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+# tests/test_llm_client.py
+import os
+import sys
+import time
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from llm_client import LLMClient, ResponseCache, StubBackend, TokenBucket  # noqa: E402
+
+
+def flaky(failures: int, error: type[Exception] = ConnectionError, reply: str = "ok"):
+    """Handler cho StubBackend: ném `error` `failures` lần đầu rồi trả `reply`."""
+    state = {"left": failures}
+
+    def handler(prompt, config):
+        if state["left"] > 0:
+            state["left"] -= 1
+            raise error("lỗi mạng giả")
+        return reply
+    return handler
+
+
+class BrokenStream(StubBackend):
+    """Backend trả một mảnh rồi ném lỗi giữa luồng."""
+
+    def stream(self, model, prompt, config, timeout):
+        yield "mảnh đầu"
+        raise ConnectionError("mất kết nối giữa luồng")
+
+
+def client(backend, **options) -> LLMClient:
+    return LLMClient(backend, rate_per_minute=0, **{"max_retries": 3, **options})
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        sleep = unittest.mock.patch("llm_client.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_retryable_error_retried_with_full_jitter(self):
+        backend = StubBackend(handler=flaky(2))
+        llm = client(backend)
+        with unittest.mock.patch("llm_client.random.uniform", return_value=0.25) as uniform:
+            self.assertEqual(llm.generate("p"), "ok")
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(llm.stats["retries"], 2)
+        # Khoảng jitter tăng lũy thừa: [0, 1] rồi [0, 2]
+        self.assertEqual([c.args for c in uniform.call_args_list], [(0, 1.0), (0, 2.0)])
+        self.assertEqual([c.args for c in self.sleep.call_args_list], [(0.25,), (0.25,)])
+
+    def test_retry_delay_capped(self):
+        llm = client(StubBackend(handler=flaky(3)))
+        with unittest.mock.patch("llm_client.RETRY_MAX_DELAY", 1.5), \
+                unittest.mock.patch("llm_client.random.uniform", return_value=0) as uniform:
+            llm.generate("p")
+        self.assertEqual([c.args[1] for c in uniform.call_args_list], [1.0, 1.5, 1.5])
+
+    def test_gives_up_after_max_retries(self):
+        backend = StubBackend(handler=flaky(10))
+        with self.assertRaises(ConnectionError):
+            client(backend, max_retries=2).generate("p")
+        self.assertEqual(backend.calls, 3)
+
+    def test_non_retryable_error_raised_immediately(self):
+        backend = StubBackend(handler=flaky(1, ValueError))
+        with self.assertRaises(ValueError):
+            client(backend).generate("p")
+        self.assertEqual(backend.calls, 1)
+        self.sleep.assert_not_called()
+
+    def test_stream_retried_only_before_first_chunk(self):
+        llm = client(StubBackend(handler=flaky(1)))
+        self.assertEqual("".join(llm.stream("p")), "ok")
+        self.assertEqual(llm.stats["retries"], 1)
+        llm = client(BrokenStream())
+        with self.assertRaises(ConnectionError):
+            list(llm.stream("p"))
+        self.assertEqual(llm.stats["requests"], 1)  # Đã nhận mảnh: không thử lại
+
+
+class TestStreamSlots(unittest.TestCase):
+    def assert_slot_free(self, llm: LLMClient):
+        self.assertTrue(llm._slots.acquire(blocking=False), "lượt đồng thời không được trả lại")
+        llm._slots.release()
+
+    def test_slot_released_on_error_mid_stream(self):
+        llm = client(BrokenStream(), max_concurrency=1)
+        stream = llm.stream("p")
+        self.assertEqual(next(stream), "mảnh đầu")
+        self.assertFalse(llm._slots.acquire(blocking=False))  # Đang giữ lượt duy nhất
+        with self.assertRaises(ConnectionError):
+            next(stream)
+        self.assert_slot_free(llm)
+
+    def test_slot_released_when_closed_early(self):
+        llm = client(StubBackend(responses=["x" * 100], chunk_size=10), max_concurrency=1)
+        stream = llm.stream("p")
+        next(stream)
+        stream.close()
+        self.assert_slot_free(llm)
+
+    def test_slot_released_on_backend_error(self):
+        with unittest.mock.patch("llm_client.time.sleep"):
+            llm = client(StubBackend(handler=flaky(10)), max_concurrency=1, max_retries=1)
+            with self.assertRaises(ConnectionError):
+                list(llm.stream("p"))
+        self.assert_slot_free(llm)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_refill(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        with unittest.mock.patch("llm_client.time.monotonic", side_effect=lambda: now[0]), \
+                unittest.mock.patch("llm_client.time.sleep", side_effect=sleep):
+            bucket = TokenBucket(rate=2.0, capacity=3)
+            for _ in range(3):
+                bucket.acquire()
+            self.assertEqual(sleeps, [])
+            bucket.acquire()
+            self.assertEqual(sleeps, [0.5])
+            now[0] += 10  # Để lâu: số token không vượt quá capacity
+            for _ in range(3):
+                bucket.acquire()
+            self.assertEqual(sleeps, [0.5])
+            bucket.acquire()
+            self.assertEqual(len(sleeps), 2)
+
+    def test_zero_rate_disables_limit(self):
+        with unittest.mock.patch("llm_client.time.sleep", side_effect=AssertionError("không được chờ")):
+            bucket = TokenBucket(rate=0, capacity=1)
+            for _ in range(10):
+                bucket.acquire()
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = ResponseCache(Path(self.tmp.name), max_entries=2)
+
+    def age(self, key: str, mtime: float):
+        os.utime(self.cache._path(key), (mtime, mtime))
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put("a", "A")
+        self.cache.put("b", "B")
+        self.age("a", time.time() - 100)
+        self.age("b", time.time() - 50)
+        self.assertEqual(self.cache.get("a"), "A")  # "a" thành mục vừa dùng
+        self.cache.put("c", "C")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "A")
+        self.assertEqual(self.cache.get("c"), "C")
+
+    def test_corrupt_entry_is_miss(self):
+        self.cache.put("a", "A")
+        self.cache._path("a").write_text("{hỏng", encoding="utf-8")
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_client_caches_and_invalidates(self):
+        backend = StubBackend(responses=["một", "hai"])
+        llm = client(backend, cache=self.cache)
+        self.assertEqual(llm.generate("p"), "một")
+        self.assertEqual(llm.generate("p"), "một")
+        self.assertEqual(llm.stats["cache_hits"], 1)
+        llm.invalidate("p")
+        self.assertEqual(llm.generate("p"), "hai")
+        self.assertEqual(backend.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
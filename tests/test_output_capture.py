@@ -0,0 +1,87 @@
+# tests/test_output_capture.py
+import io
+import sys
+import logging
+import asyncio
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from output_capture import AsyncOutputCapture, OutputCapture  # noqa: E402
+
+TEXT = "Lỗi: không đọc được tệp “dữ liệu” ✓\n"
+
+
+def split_inside_characters(data: bytes) -> list[bytes]:
+    """Cắt thành từng byte: mọi ký tự nhiều byte đều bị tách qua nhiều lần đọc."""
+    return [data[i:i + 1] for i in range(len(data))]
+
+
+class ChunkedStream:
+    """Pipe giả trả lần lượt các mảnh cho trước."""
+
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = list(chunks)
+        self.closed = False
+
+    def read1(self, size: int) -> bytes:
+        return self.chunks.pop(0) if self.chunks else b""
+
+    read = read1
+
+    def close(self):
+        self.closed = True
+
+
+class TestOutputCapture(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.tee_file = Path(self.tmp.name) / "app_output.log"
+        self.addCleanup(self.close_tee)
+
+    def close_tee(self):
+        logger = logging.getLogger(f"output_capture.{self.tee_file}")
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+    def test_multibyte_characters_split_across_reads(self):
+        chunks = split_inside_characters(TEXT.encode("utf-8"))
+        process = SimpleNamespace(stdout=ChunkedStream(chunks), stderr=None)
+        echo = io.StringIO()
+        with unittest.mock.patch("sys.stdout", echo):
+            capture = OutputCapture(process, tee_file=self.tee_file)
+            capture.join(5)
+        self.assertEqual(echo.getvalue(), TEXT)
+        self.assertEqual(self.tee_file.read_text(encoding="utf-8"), TEXT)
+        self.assertEqual(capture.stdout.tail(), TEXT)
+
+    def test_truncated_character_at_end_replaced(self):
+        data = TEXT.encode("utf-8") + "✓".encode("utf-8")[:2]
+        process = SimpleNamespace(stdout=ChunkedStream(split_inside_characters(data)), stderr=None)
+        echo = io.StringIO()
+        with unittest.mock.patch("sys.stdout", echo):
+            OutputCapture(process).join(5)
+        self.assertEqual(echo.getvalue(), TEXT + "�")
+
+    def test_async_multibyte_characters_split_across_reads(self):
+        async def run():
+            stdout = asyncio.StreamReader()
+            capture = AsyncOutputCapture(SimpleNamespace(stdout=stdout, stderr=None), tee_file=self.tee_file)
+            for chunk in split_inside_characters(TEXT.encode("utf-8")):
+                stdout.feed_data(chunk)
+                await asyncio.sleep(0)  # Để task đọc từng mảnh riêng
+            stdout.feed_eof()
+            await capture.join(5)
+
+        asyncio.run(run())
+        self.assertEqual(self.tee_file.read_text(encoding="utf-8"), TEXT)
+
+
+if __name__ == "__main__":
+    unittest.main()
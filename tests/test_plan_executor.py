@@ -0,0 +1,103 @@
+# tests/test_plan_executor.py
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import code_patch  # noqa: E402
+from plan_executor import critical_path_length, merge_changes, normalize_plan, run_plan  # noqa: E402
+
+BASE = '''def a():
+    return 1
+
+
+def b():
+    return 2
+'''
+
+
+def replace(name: str, value: int) -> dict:
+    return {"edits": [{"type": "replace_symbol", "name": name, "code": f"def {name}():\n    return {value}"}]}
+
+
+class TestNormalizePlan(unittest.TestCase):
+    def test_missing_depends_on_is_sequential(self):
+        steps = normalize_plan([{"task": "x"}, {"task": "y"}, {"task": "z"}])
+        self.assertEqual([s["id"] for s in steps], ["step-1", "step-2", "step-3"])
+        self.assertEqual([s["depends_on"] for s in steps], [[], ["step-1"], ["step-2"]])
+        self.assertEqual(critical_path_length(steps), 3)
+
+    def test_explicit_parallel_steps(self):
+        steps = normalize_plan([{"id": "a", "depends_on": []}, {"id": "b", "depends_on": []},
+                                {"id": "c", "depends_on": ["a", "b"]}])
+        self.assertEqual(critical_path_length(steps), 2)
+
+    def test_unknown_and_self_dependencies_dropped(self):
+        steps = normalize_plan([{"id": "a", "depends_on": ["a", "ghost"]}, {"id": "b", "depends_on": "a"}])
+        self.assertEqual(steps[0]["depends_on"], [])
+        self.assertEqual(steps[1]["depends_on"], ["a"])
+
+    def test_duplicate_ids_renamed(self):
+        steps = normalize_plan([{"id": "a"}, {"id": "a"}])
+        self.assertEqual([s["id"] for s in steps], ["a", "a-2"])
+
+    def test_cycle_falls_back_to_listed_order(self):
+        steps = normalize_plan([{"id": "a", "depends_on": ["c"]}, {"id": "b", "depends_on": ["a"]},
+                                {"id": "c", "depends_on": ["b"]}])
+        self.assertEqual([s["depends_on"] for s in steps], [[], ["a"], ["b"]])
+
+
+class TestMergeChanges(unittest.TestCase):
+    def test_disjoint_symbol_edits_merge(self):
+        source, merged, deferred = merge_changes(BASE, [({"id": "s1"}, replace("a", 10)), ({"id": "s2"}, replace("b", 20))])
+        self.assertIn("return 10", source)
+        self.assertIn("return 20", source)
+        self.assertEqual([s["id"] for s, _ in merged], ["s1", "s2"])
+        self.assertEqual(deferred, [])
+
+    def test_same_symbol_deferred(self):
+        source, merged, deferred = merge_changes(BASE, [({"id": "s1"}, replace("a", 10)), ({"id": "s2"}, replace("a", 30))])
+        self.assertIn("return 10", source)
+        self.assertEqual([s["id"] for s in deferred], ["s2"])
+
+    def test_full_rewrite_deferred_after_first(self):
+        _, merged, deferred = merge_changes(BASE, [({"id": "s1"}, replace("a", 10)), ({"id": "s2"}, {"new_code": "x = 1\n"})])
+        self.assertEqual([s["id"] for s, _ in merged], ["s1"])
+        self.assertEqual([s["id"] for s in deferred], ["s2"])
+
+    def test_unappliable_change_deferred_unless_first(self):
+        bad = {"patch": "@@ -1,1 +1,1 @@\n-def missing():\n+def found():\n"}
+        _, _, deferred = merge_changes(BASE, [({"id": "s1"}, replace("a", 10)), ({"id": "s2"}, bad)])
+        self.assertEqual([s["id"] for s in deferred], ["s2"])
+        with self.assertRaises(code_patch.PatchError):
+            merge_changes(BASE, [({"id": "s1"}, bad)])
+
+    def test_malformed_edits_deferred(self):
+        _, _, deferred = merge_changes(BASE, [({"id": "s1"}, replace("a", 10)), ({"id": "s2"}, {"edits": ["a"]})])
+        self.assertEqual([s["id"] for s in deferred], ["s2"])
+
+
+class TestRunPlan(unittest.TestCase):
+    def test_deferred_step_regenerated_on_merged_source(self):
+        state = {"source": BASE}
+        steps = normalize_plan([{"id": "s1", "depends_on": []}, {"id": "s2", "depends_on": []}])
+        values = {"s1": 10, "s2": 30}
+
+        def generate(step):
+            return {**replace("a", values[step["id"]]), "base": state["source"]}
+
+        commits = []
+
+        def commit(source, merged):
+            state["source"] = source
+            commits.append([s["id"] for s, _ in merged])
+            return True
+
+        self.assertTrue(run_plan(steps, generate, commit, read_base=lambda: state["source"]))
+        self.assertEqual(commits, [["s1"], ["s2"]])
+        self.assertIn("return 30", state["source"])
+
+
+if __name__ == "__main__":
+    unittest.main()
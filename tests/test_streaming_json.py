@@ -0,0 +1,87 @@
+# tests/test_streaming_json.py
+import sys
+import json
+import random
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from streaming_json import EnvelopeParser, StreamAbort  # noqa: E402
+
+ENVELOPE = {
+    "description": "Sửa lỗi \"KeyError\" trong receive_data {ngoặc} [mảng]",
+    "edits": [{"type": "replace_symbol", "name": "f", "code": "def f():\n    return {'a': [1, 2]}\n"}],
+    "confidence": 0.75,
+    "done": True,
+    "notes": None,
+}
+
+
+def random_chunks(text: str, rng: random.Random, max_size: int = 12) -> list[str]:
+    chunks, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, max_size)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+
+def parse(chunks: list[str], **kwargs) -> tuple[dict, list, EnvelopeParser]:
+    seen = []
+    parser = EnvelopeParser(on_field=lambda k, v: seen.append((k, v)), **kwargs)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close(), seen, parser
+
+
+class TestEnvelopeParser(unittest.TestCase):
+    def test_random_chunk_boundaries(self):
+        rng = random.Random(1234)
+        for text in (json.dumps(ENVELOPE, ensure_ascii=False),
+                     json.dumps(ENVELOPE, ensure_ascii=False, indent=2),
+                     "```json\n" + json.dumps(ENVELOPE) + "\n```"):
+            for _ in range(100):
+                chunks = random_chunks(text, rng)
+                with self.subTest(chunks=chunks):
+                    fields, seen, parser = parse(chunks)
+                    self.assertEqual(fields, ENVELOPE)
+                    self.assertEqual([k for k, _ in seen], list(ENVELOPE))
+                    self.assertEqual(parser.text, text)
+
+    def test_field_reported_before_stream_ends(self):
+        seen = []
+        parser = EnvelopeParser(on_field=lambda k, v: seen.append(k))
+        parser.feed('{"description": "x", "new_code": "print(1)"')
+        self.assertEqual(seen, ["description", "new_code"])
+        parser.feed("}")
+        self.assertTrue(parser.done)
+
+    def test_invalid_input_aborts_at_any_split(self):
+        rng = random.Random(99)
+        for text in ('def f(): pass', '{"a" 1}', '{"a": 1 "b": 2}', '{"a": [1, 2}', '{"a": tru}',
+                     '{"a": 1} extra', '{1: 2}'):
+            for _ in range(30):
+                with self.subTest(text=text), self.assertRaises(StreamAbort):
+                    parse(random_chunks(text, rng, 4))
+
+    def test_unknown_key_aborts_early(self):
+        parser = EnvelopeParser(allowed_keys={"description"})
+        with self.assertRaises(StreamAbort):
+            parser.feed('{"unexpected": ')
+
+    def test_unclosed_object_fails_on_close(self):
+        parser = EnvelopeParser()
+        parser.feed('{"description": "x"')
+        with self.assertRaises(StreamAbort):
+            parser.close()
+
+    def test_max_chars(self):
+        parser = EnvelopeParser(max_chars=10)
+        with self.assertRaises(StreamAbort):
+            for chunk in random_chunks('{"description": "' + "x" * 20 + '"}', random.Random(0)):
+                parser.feed(chunk)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# tests/test_version_store.py
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from version_store import VersionStore  # noqa: E402
+
+
+class TestVersionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.addCleanup(self.tmp.cleanup)
+        self.store = VersionStore(self.root / "versions", max_versions=3)
+
+    def blobs(self) -> list[Path]:
+        return list(self.store.objects_dir.glob("*.z"))
+
+    def test_same_content_stored_once(self):
+        first = self.store.put_bytes("app.py", b"print(1)\n")
+        second = self.store.put_bytes("app.py", b"print(1)\n")
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.blobs()), 1)
+        # Trùng với phiên bản tốt gần nhất: không thêm mục index
+        self.assertEqual(len(self.store.history("app.py")), 1)
+        self.assertEqual(self.store.get(first), b"print(1)\n")
+
+    def test_put_reads_file_and_sets_head(self):
+        source = self.root / "app.py"
+        source.write_bytes(b"x = 1\n")
+        file_hash = self.store.put(source)
+        self.assertEqual(self.store.head("app.py"), file_hash)
+
+    def test_retention_evicts_old_blobs_and_keeps_restore(self):
+        for i in range(10):
+            self.store.put_bytes("app.py", f"v = {i}\n".encode())
+        self.assertLessEqual(len(self.store.history("app.py")), 2 * self.store.max_versions)
+        self.assertLess(len(self.blobs()), 10)
+        target = self.root / "app.py"
+        target.write_bytes(b"broken\n")
+        restored = self.store.restore_last(target)
+        self.assertEqual(restored, self.store.head("app.py"))
+        self.assertEqual(target.read_bytes(), b"v = 9\n")
+
+    def test_retention_counts_distinct_versions(self):
+        # C, rồi A/B luân phiên: 7 mục index nhưng chỉ 3 phiên bản khác nhau (max_versions=3)
+        for content in (b"C\n", b"A\n", b"B\n", b"A\n", b"B\n", b"A\n", b"B\n"):
+            self.store.put_bytes("app.py", content)
+        history = self.store.history("app.py")
+        self.assertEqual([self.store.get(e["hash"]) for e in history], [b"C\n", b"A\n", b"B\n"])
+        self.assertEqual(len(self.blobs()), 3)
+
+    def test_restore_without_ref_returns_none(self):
+        target = self.root / "app.py"
+        target.write_bytes(b"current\n")
+        self.assertIsNone(self.store.restore_last(target))
+        self.assertEqual(target.read_bytes(), b"current\n")
+
+    def test_legacy_backups_imported_in_order(self):
+        (self.store.root / "app.py.1.bak").write_bytes(b"old\n")
+        self.assertEqual(self.store.import_legacy_backups("app.py"), 1)
+        self.assertEqual(self.store.get(self.store.head("app.py")), b"old\n")
+        self.assertFalse((self.store.root / "app.py.1.bak").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()